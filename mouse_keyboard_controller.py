@@ -5,10 +5,110 @@
 """
 
 import pyautogui
+import ctypes
+import sys
 import time
+import numpy as np
 from typing import Tuple, Optional
 from dataclasses import dataclass
 
+# ========== Windows SendInput 底层输入 ==========
+# 直接调用 user32.SendInput，一次系统调用提交整批鼠标/键盘事件，
+# 绕过 pyautogui 每个动作的多层封装和 PAUSE 等待；非 Windows 平台回退到 pyautogui
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+MOUSEEVENTF_ABSOLUTE = 0x8000
+KEYEVENTF_KEYUP = 0x0002
+VK_CONTROL = 0x11
+VK_SPACE = 0x20
+VK_F = 0x46
+
+_MOUSE_BUTTON_FLAGS = {
+    'left': (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+    'right': (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+    'middle': (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP),
+}
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", ctypes.c_int32),
+                ("dy", ctypes.c_int32),
+                ("mouseData", ctypes.c_uint32),
+                ("dwFlags", ctypes.c_uint32),
+                ("time", ctypes.c_uint32),
+                ("dwExtraInfo", ctypes.c_size_t)]
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", ctypes.c_uint16),
+                ("wScan", ctypes.c_uint16),
+                ("dwFlags", ctypes.c_uint32),
+                ("time", ctypes.c_uint32),
+                ("dwExtraInfo", ctypes.c_size_t)]
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [("uMsg", ctypes.c_uint32),
+                ("wParamL", ctypes.c_uint16),
+                ("wParamH", ctypes.c_uint16)]
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT),
+                ("ki", KEYBDINPUT),
+                ("hi", HARDWAREINPUT)]
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_uint32),
+                ("union", _INPUTUNION)]
+
+if sys.platform == 'win32':
+    _user32 = ctypes.WinDLL('user32', use_last_error=True)
+    SENDINPUT_AVAILABLE = True
+else:
+    _user32 = None
+    SENDINPUT_AVAILABLE = False
+
+def _mouse_input(flags: int, dx: int = 0, dy: int = 0) -> INPUT:
+    """构造鼠标事件"""
+    event = INPUT(type=INPUT_MOUSE)
+    event.union.mi = MOUSEINPUT(dx=dx, dy=dy, dwFlags=flags)
+    return event
+
+def _mouse_move_input(x: int, y: int) -> INPUT:
+    """构造移动到屏幕绝对坐标的鼠标事件（主显示器，坐标归一化到 0-65535）"""
+    screen_w = _user32.GetSystemMetrics(0)  # SM_CXSCREEN
+    screen_h = _user32.GetSystemMetrics(1)  # SM_CYSCREEN
+    dx = int(round(x * 65535 / max(1, screen_w - 1)))
+    dy = int(round(y * 65535 / max(1, screen_h - 1)))
+    return _mouse_input(MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE, dx, dy)
+
+def _key_input(vk: int, key_up: bool = False) -> INPUT:
+    """构造键盘事件"""
+    event = INPUT(type=INPUT_KEYBOARD)
+    event.union.ki = KEYBDINPUT(wVk=vk, dwFlags=KEYEVENTF_KEYUP if key_up else 0)
+    return event
+
+def _build_input_array(events):
+    """将事件列表打包为可直接传给 SendInput 的 INPUT 数组"""
+    return (INPUT * len(events))(*events)
+
+def _send_input_array(input_array) -> None:
+    """一次系统调用提交整批输入事件"""
+    pyautogui.failSafeCheck()  # 绕过 pyautogui 时仍保留左上角紧急停止
+    count = len(input_array)
+    sent = _user32.SendInput(count, input_array, ctypes.sizeof(INPUT))
+    if sent != count:
+        raise OSError(f"SendInput 仅提交了 {sent}/{count} 个事件 (错误码: {ctypes.get_last_error()})")
+
+def _send_inputs(*events: INPUT) -> None:
+    """打包并提交一批输入事件"""
+    _send_input_array(_build_input_array(events))
+
 @dataclass
 class ClickResult:
     """点击操作结果"""
@@ -24,7 +124,14 @@ class MouseKeyboardController:
     def __init__(self):
         # 设置pyautogui安全参数
         pyautogui.FAILSAFE = True  # 鼠标移到左上角时停止
-        pyautogui.PAUSE = 0.01     # 每次操作间隔10ms
+        pyautogui.PAUSE = 0        # 不再给每个动作追加固定等待，节奏由调用方控制
+        
+        # 随机移动位置批量预生成，调用时按游标依次取出
+        self.move_position_batch_size = 1024
+        self._rng = np.random.default_rng()
+        self._move_positions = []
+        self._move_position_index = 0
+        self._move_position_screen = None  # 生成当前批次时使用的屏幕尺寸
         
     def click_position(self, x: int, y: int, button: str = 'left', clicks: int = 1, 
                       interval: float = 0.0) -> ClickResult:
@@ -41,12 +148,25 @@ class MouseKeyboardController:
         Returns:
             ClickResult: 点击结果
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
-            pyautogui.click(x, y, clicks=clicks, interval=interval, button=button)
+            if SENDINPUT_AVAILABLE and button in _MOUSE_BUTTON_FLAGS:
+                down, up = _MOUSE_BUTTON_FLAGS[button]
+                if interval > 0 and clicks > 1:
+                    _send_inputs(_mouse_move_input(x, y))
+                    click_events = _build_input_array([_mouse_input(down), _mouse_input(up)])
+                    for i in range(clicks):
+                        if i:
+                            time.sleep(interval)
+                        _send_input_array(click_events)
+                else:
+                    _send_inputs(_mouse_move_input(x, y),
+                                 *[_mouse_input(flag) for _ in range(clicks) for flag in (down, up)])
+            else:
+                pyautogui.click(x, y, clicks=clicks, interval=interval, button=button)
             
-            click_time = (time.time() - start_time) * 1000  # 转换为毫秒
+            click_time = (time.perf_counter_ns() - start_ns) / 1e6  # 转换为毫秒
             
             return ClickResult(
                 success=True,
@@ -56,7 +176,7 @@ class MouseKeyboardController:
             )
             
         except Exception as e:
-            click_time = (time.time() - start_time) * 1000
+            click_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ClickResult(
                 success=False,
                 x=x,
@@ -92,12 +212,12 @@ class MouseKeyboardController:
         Returns:
             ClickResult: 操作结果
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
             pyautogui.drag(start_x, start_y, end_x - start_x, end_y - start_y, duration=duration)
             
-            drag_time = (time.time() - start_time) * 1000
+            drag_time = (time.perf_counter_ns() - start_ns) / 1e6
             
             return ClickResult(
                 success=True,
@@ -107,7 +227,7 @@ class MouseKeyboardController:
             )
             
         except Exception as e:
-            drag_time = (time.time() - start_time) * 1000
+            drag_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ClickResult(
                 success=False,
                 x=end_x,
@@ -229,28 +349,41 @@ class MouseKeyboardController:
         Returns:
             ClickResult: 移动结果
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
-            # 按下Ctrl键
-            pyautogui.keyDown('ctrl')
-            
-            # 移动到目标位置
-            pyautogui.moveTo(x, y)
-            
-            # 按下左键并持续
-            pyautogui.mouseDown(x, y, button='left')
-            
-            # 持续移动指定时间
-            time.sleep(duration)
-            
-            # 释放左键
-            pyautogui.mouseUp(x, y, button='left')
-            
-            # 释放Ctrl键
-            pyautogui.keyUp('ctrl')
+            if SENDINPUT_AVAILABLE:
+                # 按下Ctrl、移动到目标位置、按下左键 —— 一次提交
+                _send_inputs(_key_input(VK_CONTROL),
+                             _mouse_move_input(x, y),
+                             _mouse_input(MOUSEEVENTF_LEFTDOWN))
+                
+                # 持续移动指定时间
+                time.sleep(duration)
+                
+                # 释放左键和Ctrl键 —— 一次提交
+                _send_inputs(_mouse_input(MOUSEEVENTF_LEFTUP),
+                             _key_input(VK_CONTROL, key_up=True))
+            else:
+                # 按下Ctrl键
+                pyautogui.keyDown('ctrl')
+                
+                # 移动到目标位置
+                pyautogui.moveTo(x, y)
+                
+                # 按下左键并持续
+                pyautogui.mouseDown(x, y, button='left')
+                
+                # 持续移动指定时间
+                time.sleep(duration)
+                
+                # 释放左键
+                pyautogui.mouseUp(x, y, button='left')
+                
+                # 释放Ctrl键
+                pyautogui.keyUp('ctrl')
             
-            move_time = (time.time() - start_time) * 1000
+            move_time = (time.perf_counter_ns() - start_ns) / 1e6
             
             return ClickResult(
                 success=True,
@@ -267,7 +400,7 @@ class MouseKeyboardController:
             except:
                 pass
                 
-            move_time = (time.time() - start_time) * 1000
+            move_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ClickResult(
                 success=False,
                 x=x,
@@ -287,13 +420,13 @@ class MouseKeyboardController:
         Returns:
             ClickResult: 攻击结果
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
             # 右键点击放技能
             pyautogui.click(x, y, button='right')
             
-            attack_time = (time.time() - start_time) * 1000
+            attack_time = (time.perf_counter_ns() - start_ns) / 1e6
             
             return ClickResult(
                 success=True,
@@ -303,7 +436,7 @@ class MouseKeyboardController:
             )
             
         except Exception as e:
-            attack_time = (time.time() - start_time) * 1000
+            attack_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ClickResult(
                 success=False,
                 x=x,
@@ -312,6 +445,40 @@ class MouseKeyboardController:
                 click_time=attack_time
             )
     
+    @staticmethod
+    def _repeat_until(action, period_ns: int, deadline_ns: int) -> int:
+        """
+        按固定周期重复执行动作，直到截止时间
+        
+        下一次执行时间按计划时刻累加，不受动作本身耗时影响；
+        等待期间直接睡到下一个计划时刻，不做忙等。
+        落后超过一个周期时（动作或系统卡顿）跳过错过的时刻，不连续补发。
+        
+        Args:
+            action: 无参数的动作函数
+            period_ns: 执行周期（纳秒）
+            deadline_ns: 截止时间（time.perf_counter_ns() 时间轴）
+            
+        Returns:
+            int: 实际执行次数
+        """
+        count = 0
+        next_ns = time.perf_counter_ns()
+        while True:
+            now = time.perf_counter_ns()
+            if now >= deadline_ns:
+                break
+            if now < next_ns:
+                time.sleep((min(next_ns, deadline_ns) - now) / 1e9)
+                continue
+            action()
+            count += 1
+            next_ns += period_ns
+            behind_ns = time.perf_counter_ns() - next_ns
+            if behind_ns >= period_ns:
+                next_ns += behind_ns // period_ns * period_ns
+        return count
+    
     def pickup_equipment(self, x: int, y: int, pickup_duration: float = 2.0, method: str = "click") -> ClickResult:
         """
         增强版捡装备功能：支持多种拾取方式
@@ -325,7 +492,7 @@ class MouseKeyboardController:
         Returns:
             ClickResult: 拾取结果
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
             print(f"[PICKUP] 开始拾取装备 位置:({x},{y}) 方式:{method} 时长:{pickup_duration}s")
@@ -341,29 +508,39 @@ class MouseKeyboardController:
             print(f"[PICKUP] 已移动到装备位置")
             
             # 第二步：根据方式执行拾取
-            end_time = time.time() + pickup_duration
+            deadline_ns = time.perf_counter_ns() + int(pickup_duration * 1e9)
             action_count = 0
             
+            # 鼠标已在装备位置，预先打包好每种拾取动作（按下+抬起），循环中只需提交
+            if SENDINPUT_AVAILABLE:
+                click_events = _build_input_array([_mouse_input(MOUSEEVENTF_LEFTDOWN),
+                                                   _mouse_input(MOUSEEVENTF_LEFTUP)])
+                f_events = _build_input_array([_key_input(VK_F), _key_input(VK_F, key_up=True)])
+                space_events = _build_input_array([_key_input(VK_SPACE),
+                                                   _key_input(VK_SPACE, key_up=True)])
+                actions = {
+                    "click": lambda: _send_input_array(click_events),
+                    "key_f": lambda: _send_input_array(f_events),
+                    "key_space": lambda: _send_input_array(space_events),
+                }
+            else:
+                actions = {
+                    "click": lambda: pyautogui.click(x, y, button='left'),
+                    "key_f": lambda: pyautogui.press('f'),
+                    "key_space": lambda: pyautogui.press('space'),
+                }
+            
             if method == "click":
                 # 方式1: 持续左键点击
-                while time.time() < end_time:
-                    pyautogui.click(x, y, button='left')
-                    action_count += 1
-                    time.sleep(0.1)
+                action_count += self._repeat_until(actions["click"], 100_000_000, deadline_ns)
                     
             elif method == "key_f":
                 # 方式2: 按F键拾取 (常见于RPG游戏)
-                while time.time() < end_time:
-                    pyautogui.press('f')
-                    action_count += 1
-                    time.sleep(0.2)
+                action_count += self._repeat_until(actions["key_f"], 200_000_000, deadline_ns)
                     
             elif method == "key_space":
                 # 方式3: 按空格键拾取
-                while time.time() < end_time:
-                    pyautogui.press('space')
-                    action_count += 1
-                    time.sleep(0.2)
+                action_count += self._repeat_until(actions["key_space"], 200_000_000, deadline_ns)
                     
             elif method == "auto":
                 # 方式4: 自动尝试多种方式
@@ -371,18 +548,11 @@ class MouseKeyboardController:
                 method_duration = pickup_duration / len(methods)
                 
                 for auto_method in methods:
-                    method_end = time.time() + method_duration
-                    while time.time() < method_end and time.time() < end_time:
-                        if auto_method == "click":
-                            pyautogui.click(x, y, button='left')
-                        elif auto_method == "key_f":
-                            pyautogui.press('f')
-                        elif auto_method == "key_space":
-                            pyautogui.press('space')
-                        action_count += 1
-                        time.sleep(0.15)
-            
-            pickup_time = (time.time() - start_time) * 1000
+                    method_deadline_ns = min(deadline_ns, time.perf_counter_ns() + int(method_duration * 1e9))
+                    action_count += self._repeat_until(actions[auto_method], 150_000_000,
+                                                       method_deadline_ns)
+            
+            pickup_time = (time.perf_counter_ns() - start_ns) / 1e6
             print(f"[PICKUP] 拾取完成 执行{action_count}次操作 耗时:{pickup_time:.1f}ms")
             
             return ClickResult(
@@ -400,7 +570,7 @@ class MouseKeyboardController:
             except:
                 pass
                 
-            pickup_time = (time.time() - start_time) * 1000
+            pickup_time = (time.perf_counter_ns() - start_ns) / 1e6
             print(f"[PICKUP] 拾取异常: {e}")
             return ClickResult(
                 success=False,
@@ -421,20 +591,28 @@ class MouseKeyboardController:
         Returns:
             Tuple[int, int]: 随机位置(x, y)
         """
-        import random
-        
-        # 计算屏幕中心区域（70%范围）
-        center_x = screen_width // 2
-        center_y = screen_height // 2
-        
-        # 70%范围的半径
-        radius_x = int(screen_width * 0.35)  # 70% / 2 = 35%
-        radius_y = int(screen_height * 0.35)
-        
-        # 随机生成位置
-        random_x = random.randint(center_x - radius_x, center_x + radius_x)
-        random_y = random.randint(center_y - radius_y, center_y + radius_y)
+        index = self._move_position_index
+        if (index >= len(self._move_positions) or
+                self._move_position_screen != (screen_width, screen_height)):
+            # 计算屏幕中心区域（70%范围）
+            center_x = screen_width // 2
+            center_y = screen_height // 2
+            
+            # 70%范围的半径
+            radius_x = int(screen_width * 0.35)  # 70% / 2 = 35%
+            radius_y = int(screen_height * 0.35)
+            
+            # 一次生成一整批随机位置（上界 +1 与 random.randint 的闭区间一致）
+            self._move_positions = self._rng.integers(
+                [center_x - radius_x, center_y - radius_y],
+                [center_x + radius_x + 1, center_y + radius_y + 1],
+                size=(self.move_position_batch_size, 2)
+            ).tolist()
+            self._move_position_screen = (screen_width, screen_height)
+            index = 0
         
+        self._move_position_index = index + 1
+        random_x, random_y = self._move_positions[index]
         return random_x, random_y
     
     def combat_mode(self, duration: float = 5.0, screen_width: int = 1920, screen_height: int = 1080) -> ClickResult:
@@ -449,11 +627,11 @@ class MouseKeyboardController:
         Returns:
             ClickResult: 战斗结果
         """
-        start_time = time.time()
-        end_time = start_time + duration
+        start_ns = time.perf_counter_ns()
+        deadline_ns = start_ns + int(duration * 1e9)
         
         try:
-            while time.time() < end_time:
+            while time.perf_counter_ns() < deadline_ns:
                 # 获取随机移动位置
                 move_x, move_y = self.get_random_move_position(screen_width, screen_height)
                 
@@ -466,7 +644,7 @@ class MouseKeyboardController:
                 # 等待一下再继续
                 time.sleep(0.2)
             
-            combat_time = (time.time() - start_time) * 1000
+            combat_time = (time.perf_counter_ns() - start_ns) / 1e6
             
             return ClickResult(
                 success=True,
@@ -484,7 +662,7 @@ class MouseKeyboardController:
             except:
                 pass
                 
-            combat_time = (time.time() - start_time) * 1000
+            combat_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ClickResult(
                 success=False,
                 x=0,
@@ -2,20 +2,37 @@
 非侵入式窗口截图 - 不激活窗口的截图方法
 """
 
+import logging
+import os
+import sys
+import time
 import win32gui
-import win32ui
 import win32con
-import win32api
-from ctypes import windll, c_int, c_uint, c_void_p, c_long, byref, Structure, POINTER
-from ctypes.wintypes import HWND, HDC, RECT, BOOL
+from ctypes import windll, c_int, c_uint, c_ushort, c_ubyte, c_void_p, c_long, byref, sizeof, Structure, POINTER
+from ctypes.wintypes import HWND, HDC, BOOL
 import numpy as np
-from PIL import Image
 import cv2
-import time
+
+# DXGI 桌面复制（可选依赖: pip install dxcam），比GDI截图快一个数量级
+try:
+    import dxcam
+    DXCAM_AVAILABLE = True
+except ImportError:
+    DXCAM_AVAILABLE = False
+
+# 添加项目根目录到Python路径（共用的日志模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from queue_logging import setup_queue_logging
+
+# 入口脚本启用队列日志后，日志只在调用线程中入队，由后台线程统一输出，截图热路径不会被控制台输出阻塞；
+# 逐个截图方法的过程信息为 DEBUG 级别，默认不输出
+log = logging.getLogger('non_intrusive_capture')
+log.setLevel(logging.INFO)
 
 # Windows API 常量
 SRCCOPY = 0x00CC0020
 DIB_RGB_COLORS = 0
+BI_RGB = 0
 
 # 定义Windows结构体
 class BITMAPINFOHEADER(Structure):
@@ -23,8 +40,8 @@ class BITMAPINFOHEADER(Structure):
         ("biSize", c_uint),
         ("biWidth", c_long),
         ("biHeight", c_long),
-        ("biPlanes", c_uint),
-        ("biBitCount", c_uint),
+        ("biPlanes", c_ushort),
+        ("biBitCount", c_ushort),
         ("biCompression", c_uint),
         ("biSizeImage", c_uint),
         ("biXPelsPerMeter", c_long),
@@ -39,328 +56,474 @@ class BITMAPINFO(Structure):
         ("bmiColors", c_uint * 3)
     ]
 
-def capture_window_non_intrusive(hwnd):
+# 截图用到的API在模块加载时绑定一次并声明原型：每帧调用不再经过 windll 属性查找和参数类型推断，
+# CreateDIBSection 返回的句柄和像素指针在64位系统上也不会按默认的 int 截断
+_CreateDIBSection = windll.gdi32.CreateDIBSection
+_CreateDIBSection.argtypes = [HDC, POINTER(BITMAPINFO), c_uint, POINTER(c_void_p), c_void_p, c_uint]
+_CreateDIBSection.restype = c_void_p
+
+_PrintWindow = windll.user32.PrintWindow
+_PrintWindow.argtypes = [HWND, HDC, c_uint]
+_PrintWindow.restype = BOOL
+
+_BitBlt = windll.gdi32.BitBlt
+_BitBlt.argtypes = [HDC, c_int, c_int, c_int, c_int, HDC, c_int, c_int, c_uint]
+_BitBlt.restype = BOOL
+
+_GdiFlush = windll.gdi32.GdiFlush
+_GdiFlush.argtypes = []
+_GdiFlush.restype = BOOL
+
+_dxgi_camera = None  # 模块级复用的 dxcam 实例，D3D11 设备只创建一次
+
+def _get_dxgi_camera():
+    """获取（首次调用时创建）主显示器的 DXGI 桌面复制实例，不可用时返回 None"""
+    global _dxgi_camera, DXCAM_AVAILABLE
+    if _dxgi_camera is None and DXCAM_AVAILABLE:
+        try:
+            _dxgi_camera = dxcam.create(output_idx=0, output_color="BGRA")
+        except Exception as e:
+            log.warning("  DXGI桌面复制初始化失败，改用GDI截图: %s", e)
+            DXCAM_AVAILABLE = False
+    return _dxgi_camera
+
+def _is_window_unobscured(hwnd, rect):
+    """检查窗口是否未最小化且未被其他窗口遮挡（抽查四角和中心点）"""
+    if win32gui.IsIconic(hwnd):
+        return False
+    left, top, right, bottom = rect
+    points = [(left + 1, top + 1), (right - 2, top + 1), (left + 1, bottom - 2),
+              (right - 2, bottom - 2), ((left + right) // 2, (top + bottom) // 2)]
+    for point in points:
+        top_hwnd = win32gui.WindowFromPoint(point)
+        if top_hwnd != hwnd and win32gui.GetAncestor(top_hwnd, win32con.GA_ROOT) != hwnd:
+            return False
+    return True
+
+def _alloc_dib(hdc, width, height):
     """
-    非侵入式窗口截图 - 不激活窗口
+    创建32位自顶向下的DIB位图，PrintWindow/BitBlt 会直接写入它的像素内存
+    
+    Returns:
+        (hBitmap, bits): 位图句柄和像素内存地址，失败时为 (None, None)
     """
-    print(f"[非侵入截图] 开始截图窗口 {hwnd}")
+    # 位图头每次调用单独创建：多个截图器可能在不同线程中同时分配位图，共用一个会互相改写宽高
+    bmi = BITMAPINFO()
+    bmi.bmiHeader.biSize = sizeof(BITMAPINFOHEADER)
+    bmi.bmiHeader.biWidth = width
+    bmi.bmiHeader.biHeight = -height  # 负高度表示自顶向下，行顺序与numpy一致
+    bmi.bmiHeader.biPlanes = 1
+    bmi.bmiHeader.biBitCount = 32
+    bmi.bmiHeader.biCompression = BI_RGB
     
-    if not win32gui.IsWindow(hwnd):
-        print("[错误] 窗口句柄无效")
-        return None
+    bits = c_void_p()
+    hBitmap = _CreateDIBSection(hdc, byref(bmi), DIB_RGB_COLORS, byref(bits), None, 0)
+    if not hBitmap or not bits.value:
+        return None, None
+    return hBitmap, bits.value
+
+class NonIntrusiveCapturer:
+    """
+    非侵入式窗口截图器 - 按窗口缓存GDI资源
     
-    # 获取窗口信息
-    rect = win32gui.GetWindowRect(hwnd)
-    width = rect[2] - rect[0]
-    height = rect[3] - rect[1]
+    窗口DC、内存DC和DIB位图在首次截图时创建并一直保留，之后每帧只需要一次
+    PrintWindow/BitBlt。窗口尺寸变化或窗口销毁时自动重建/释放。
+    各截图方法都先得到BGRA图像，只有最终采用的那一帧才转换为BGR（或按需直接返回BGRA），
+    GDI截图结果写入每个窗口固定的输出缓冲区，同一窗口下一次截图时会被覆盖，
+    需要保留时请自行 copy()。同一个截图器不要在多个线程中同时使用。
+    """
     
-    print(f"[信息] 窗口尺寸: {width}x{height}")
+    # GDI截图方法的尝试顺序
+    CAPTURE_METHODS = ('PrintWindow', 'LayeredWindow', 'DWM', 'WM_PRINT')
     
-    # 方法1: 使用GetWindowDC + PrintWindow (推荐)
-    image = try_getwindowdc_printwindow(hwnd, width, height)
-    if image is not None and not is_blank_image(image):
-        print("[成功] GetWindowDC + PrintWindow 方法成功")
-        return image
+    def __init__(self):
+        self._resources = {}  # hwnd -> {'hwndDC', 'memDC', 'hBitmap', 'bits', 'size', 'bgr', 'bgra'}
+        self._screen_dc = None  # 分层窗口技术使用的屏幕DC
+        self._dxgi_frames = {}  # hwnd -> (rect, 最近一帧DXGI截图)，画面无变化时复用
+        self._printwindow_flags = {}  # hwnd -> 可用的PrintWindow标志，None 表示PrintWindow截图为黑屏，直接用BitBlt
+        # hwnd -> 记为 None 后重新尝试PrintWindow的时间点（窗口可能只是加载中暂时黑屏）
+        self._printwindow_retry_at = {}
+        self.printwindow_retry_interval = 5.0  # 重新尝试PrintWindow的间隔（秒）
+        self._method_cache = {}  # 窗口类名 -> 上次成功的GDI截图方法名，同类窗口直接使用
     
-    # 方法2: 使用UpdateLayeredWindow技术
-    image = try_layered_window_technique(hwnd, width, height)
-    if image is not None and not is_blank_image(image):
-        print("[成功] LayeredWindow 技术成功")
-        return image
+    def _get_resources(self, hwnd, width, height):
+        """获取窗口的缓存GDI资源，不存在或尺寸变化时重新创建"""
+        res = self._resources.get(hwnd)
+        if res is not None:
+            if res['size'] == (width, height):
+                return res
+            log.info("  窗口尺寸变化，重建GDI资源: %s -> %s", res['size'], (width, height))
+            self.release(hwnd)
+        
+        hwndDC = win32gui.GetWindowDC(hwnd)
+        if not hwndDC:
+            log.warning("  获取窗口DC失败")
+            return None
+        
+        memDC = win32gui.CreateCompatibleDC(hwndDC)
+        if not memDC:
+            log.warning("  创建内存DC失败")
+            win32gui.ReleaseDC(hwnd, hwndDC)
+            return None
+        
+        # 创建DIB位图，截图直接写入可访问的像素内存
+        hBitmap, bits = _alloc_dib(hwndDC, width, height)
+        if not hBitmap:
+            log.warning("  创建位图失败")
+            win32gui.DeleteDC(memDC)
+            win32gui.ReleaseDC(hwnd, hwndDC)
+            return None
+        
+        # 选择位图到内存DC
+        win32gui.SelectObject(memDC, hBitmap)
+        
+        res = {
+            'hwndDC': hwndDC,
+            'memDC': memDC,
+            'hBitmap': hBitmap,
+            'bits': bits,
+            'size': (width, height),
+            'bgr': np.empty((height, width, 3), dtype=np.uint8),  # BGR输出缓冲区
+            'bgra': np.empty((height, width, 4), dtype=np.uint8)  # BGRA输出缓冲区
+        }
+        self._resources[hwnd] = res
+        return res
     
-    # 方法3: 使用DwmGetWindowAttribute
-    image = try_dwm_thumbnail(hwnd, width, height)
-    if image is not None and not is_blank_image(image):
-        print("[成功] DWM缩略图方法成功")
-        return image
+    def release(self, hwnd):
+        """释放指定窗口的缓存GDI资源"""
+        self._dxgi_frames.pop(hwnd, None)
+        res = self._resources.pop(hwnd, None)
+        if res is None:
+            return
+        try:
+            win32gui.DeleteDC(res['memDC'])
+            win32gui.DeleteObject(res['hBitmap'])
+            win32gui.ReleaseDC(hwnd, res['hwndDC'])
+        except Exception as e:
+            log.warning("  释放GDI资源失败: %s", e)
     
-    # 方法4: 使用WM_PRINT消息
-    image = try_wm_print_message(hwnd, width, height)
-    if image is not None and not is_blank_image(image):
-        print("[成功] WM_PRINT消息方法成功")
-        return image
+    def close(self):
+        """释放所有缓存的GDI资源"""
+        for hwnd in list(self._resources):
+            self.release(hwnd)
+        self._printwindow_flags.clear()
+        self._printwindow_retry_at.clear()
+        self._method_cache.clear()
+        if self._screen_dc:
+            win32gui.ReleaseDC(0, self._screen_dc)
+            self._screen_dc = None
     
-    print("[失败] 所有非侵入方法都失败了")
-    return None
-
-def try_getwindowdc_printwindow(hwnd, width, height):
-    """使用GetWindowDC + PrintWindow的改进方法"""
-    try:
-        print("[方法1] 尝试GetWindowDC + PrintWindow...")
+    def capture(self, hwnd, bgra=False):
+        """
+        非侵入式窗口截图 - 不激活窗口
         
-        # 获取窗口DC
-        hwndDC = win32gui.GetWindowDC(hwnd)
-        if not hwndDC:
-            print("  获取窗口DC失败")
+        Args:
+            hwnd: 窗口句柄
+            bgra: 为 True 时返回BGRA图像，省去去除Alpha通道的转换
+                  （后续直接转灰度的调用方可用 COLOR_BGRA2GRAY）；注意GDI截图的Alpha通道通常为0
+        """
+        log.debug("[非侵入截图] 开始截图窗口 %s", hwnd)
+        
+        if not win32gui.IsWindow(hwnd):
+            log.warning("[错误] 窗口句柄无效")
+            self.release(hwnd)
+            self._printwindow_flags.pop(hwnd, None)
+            self._printwindow_retry_at.pop(hwnd, None)
             return None
         
+        # 获取窗口信息
+        rect = win32gui.GetWindowRect(hwnd)
+        width = rect[2] - rect[0]
+        height = rect[3] - rect[1]
+        
+        log.debug("[信息] 窗口尺寸: %sx%s", width, height)
+        
+        # 方法0: DXGI桌面复制（窗口完整显示在主屏且未被遮挡时）
+        image = self.try_dxgi_duplication(hwnd, rect)
+        if image is not None:
+            log.debug("[成功] DXGI桌面复制方法成功")
+            return image if bgra else cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        
+        res = self._get_resources(hwnd, width, height)
+        if res is None:
+            return None
+        
+        # 同一类窗口只有一种GDI方法有效：先直接用该窗口类上次成功的方法，失败才走完整流程
         try:
-            # 创建内存DC
-            memDC = win32gui.CreateCompatibleDC(hwndDC)
-            if not memDC:
-                print("  创建内存DC失败")
-                return None
-            
-            try:
-                # 创建位图
-                hBitmap = win32gui.CreateCompatibleBitmap(hwndDC, width, height)
-                if not hBitmap:
-                    print("  创建位图失败")
-                    return None
-                
-                try:
-                    # 选择位图到内存DC
-                    win32gui.SelectObject(memDC, hBitmap)
-                    
-                    # 尝试不同的PrintWindow参数
-                    success = False
-                    for flag in [0x2, 0x0, 0x1, 0x3]:  # 不同的打印标志
-                        result = windll.user32.PrintWindow(hwnd, memDC, flag)
-                        if result:
-                            print(f"  PrintWindow成功，标志: 0x{flag:x}")
-                            success = True
-                            break
-                    
-                    if not success:
-                        print("  PrintWindow失败，尝试BitBlt...")
-                        # 如果PrintWindow失败，尝试BitBlt
-                        result = windll.gdi32.BitBlt(memDC, 0, 0, width, height, hwndDC, 0, 0, SRCCOPY)
-                        if result:
-                            print("  BitBlt成功")
-                            success = True
-                    
-                    if success:
-                        # 获取位图数据
-                        return get_bitmap_data(hBitmap, width, height)
-                    
-                finally:
-                    win32gui.DeleteObject(hBitmap)
-            finally:
-                win32gui.DeleteDC(memDC)
-        finally:
-            win32gui.ReleaseDC(hwnd, hwndDC)
-            
-    except Exception as e:
-        print(f"  GetWindowDC方法失败: {e}")
+            class_name = win32gui.GetClassName(hwnd)
+        except Exception:
+            class_name = None
+        cached_method = self._method_cache.get(class_name)
+        if cached_method is not None:
+            image = self._try_method(cached_method, hwnd, res, rect)
+            if image is not None and not is_blank_image(image):
+                return self._output_image(image, res, bgra)
+            log.debug("  缓存的截图方法 %s 失败，重新尝试所有方法", cached_method)
+            del self._method_cache[class_name]
+        
+        for method in self.CAPTURE_METHODS:
+            if method == cached_method:
+                continue
+            image = self._try_method(method, hwnd, res, rect)
+            if image is not None and not is_blank_image(image):
+                log.debug("[成功] %s 方法成功", method)
+                if class_name is not None:
+                    self._method_cache[class_name] = method
+                return self._output_image(image, res, bgra)
+        
+        log.warning("[失败] 所有非侵入方法都失败了")
         return None
-
-def try_wm_print_message(hwnd, width, height):
-    """使用WM_PRINT消息方法"""
-    try:
-        print("[方法4] 尝试WM_PRINT消息...")
+    
+    def _try_method(self, method, hwnd, res, rect):
+        """执行一种GDI截图方法，返回BGRA图像或 None"""
+        if method == 'PrintWindow':
+            # 方法1: 使用GetWindowDC + PrintWindow (推荐)
+            return self.try_getwindowdc_printwindow(hwnd, res)
+        if method == 'LayeredWindow':
+            # 方法2: 使用UpdateLayeredWindow技术
+            return self.try_layered_window_technique(hwnd, res, rect)
+        if method == 'DWM':
+            # 方法3: 使用DwmGetWindowAttribute
+            width, height = res['size']
+            return try_dwm_thumbnail(hwnd, width, height)
+        if method == 'WM_PRINT':
+            # 方法4: 使用WM_PRINT消息
+            return self.try_wm_print_message(hwnd, res)
+        return None
+    
+    def _output_image(self, image, res, bgra):
+        """把最终采用的BGRA截图写入窗口的输出缓冲区
         
-        # 获取窗口DC
-        hwndDC = win32gui.GetWindowDC(hwnd)
-        if not hwndDC:
-            return None
+        DIB像素内存在窗口尺寸变化时会被释放，不能直接交给调用方，
+        因此总是拷贝（或转换）到 numpy 自有的缓冲区
+        """
+        if bgra:
+            np.copyto(res['bgra'], image)
+            return res['bgra']
+        # 去掉Alpha通道：cvtColor 一次连续写入，比对 [:, :, :3] 切片拷贝快得多
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR, dst=res['bgr'])
+    
+    def try_dxgi_duplication(self, hwnd, rect):
+        """DXGI桌面复制 - 直接从显示输出取帧，对DirectX/硬件加速窗口也有效
         
+        截取的是屏幕上的画面，窗口超出主屏、最小化或被遮挡时不可用，返回 None 交给GDI方法。
+        """
+        camera = _get_dxgi_camera()
+        if camera is None:
+            return None
         try:
-            # 创建内存DC和位图
-            memDC = win32gui.CreateCompatibleDC(hwndDC)
-            hBitmap = win32gui.CreateCompatibleBitmap(hwndDC, width, height)
-            win32gui.SelectObject(memDC, hBitmap)
+            left, top, right, bottom = rect
+            if left < 0 or top < 0 or right > camera.width or bottom > camera.height:
+                return None
+            if not _is_window_unobscured(hwnd, rect):
+                return None
             
-            # 发送WM_PRINT消息
-            # PRF_CHECKVISIBLE | PRF_CHILDREN | PRF_CLIENT | PRF_ERASEBKGND | PRF_NONCLIENT | PRF_OWNED
-            flags = 0x01 | 0x10 | 0x04 | 0x08 | 0x02 | 0x20
+            log.debug("[方法0] 尝试DXGI桌面复制...")
+            frame = camera.grab(region=(left, top, right, bottom))
+            if frame is None:
+                # 距上次取帧画面没有变化，dxcam 不返回新帧
+                cached = self._dxgi_frames.get(hwnd)
+                return cached[1] if cached is not None and cached[0] == rect else None
             
-            result = win32gui.SendMessage(hwnd, win32con.WM_PRINT, memDC, flags)
-            print(f"  WM_PRINT结果: {result}")
+            self._dxgi_frames[hwnd] = (rect, frame)
+            return frame
             
-            # 获取位图数据
-            image = get_bitmap_data(hBitmap, width, height)
+        except Exception as e:
+            log.warning("  DXGI桌面复制失败: %s", e)
+            return None
+    
+    def try_getwindowdc_printwindow(self, hwnd, res):
+        """使用GetWindowDC + PrintWindow的改进方法
+        
+        第一次截图时依次尝试各PrintWindow标志，记住可用的标志，之后只调用一次；
+        PrintWindow截出黑屏的窗口记为 None，之后直接使用BitBlt，
+        但每隔 printwindow_retry_interval 秒重新尝试一次（BitBlt 截不到被遮挡的窗口）。
+        """
+        try:
+            log.debug("[方法1] 尝试GetWindowDC + PrintWindow...")
+            width, height = res['size']
+            memDC = res['memDC']
             
-            win32gui.DeleteObject(hBitmap)
-            win32gui.DeleteDC(memDC)
+            if (hwnd in self._printwindow_flags and self._printwindow_flags[hwnd] is None and
+                    time.monotonic() >= self._printwindow_retry_at.get(hwnd, 0.0)):
+                # 到了重新尝试的时间，按首次截图处理
+                del self._printwindow_flags[hwnd]
             
-            return image
+            if hwnd in self._printwindow_flags:
+                flags = [self._printwindow_flags[hwnd]]
+            else:
+                flags = [0x2, 0x0, 0x1, 0x3]  # 不同的打印标志
             
-        finally:
-            win32gui.ReleaseDC(hwnd, hwndDC)
+            for flag in flags:
+                if flag is None:
+                    break
+                result = _PrintWindow(hwnd, memDC, flag)
+                if result:
+                    image = get_bitmap_data(res['bits'], width, height)
+                    if image is not None and not is_blank_image(image):
+                        if hwnd not in self._printwindow_flags:
+                            log.debug("  PrintWindow成功，标志: 0x%x", flag)
+                            self._printwindow_flags[hwnd] = flag
+                        return image
+                    log.debug("  PrintWindow截图为黑屏，标志: 0x%x", flag)
+                    break
             
-    except Exception as e:
-        print(f"  WM_PRINT方法失败: {e}")
-        return None
-
-def try_layered_window_technique(hwnd, width, height):
-    """分层窗口技术"""
-    try:
-        print("[方法2] 尝试分层窗口技术...")
-        
-        # 检查窗口扩展样式
-        ex_style = win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE)
-        
-        # 临时设置为分层窗口
-        if not (ex_style & win32con.WS_EX_LAYERED):
-            win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, ex_style | win32con.WS_EX_LAYERED)
-            print("  设置为分层窗口")
-        
-        # 获取屏幕DC
-        screenDC = win32gui.GetDC(0)
-        
+            # PrintWindow不可用或截出黑屏，一段时间内直接使用BitBlt
+            if hwnd not in self._printwindow_flags or self._printwindow_flags[hwnd] is not None:
+                self._printwindow_flags[hwnd] = None
+                self._printwindow_retry_at[hwnd] = time.monotonic() + self.printwindow_retry_interval
+            log.debug("  PrintWindow失败，尝试BitBlt...")
+            result = _BitBlt(memDC, 0, 0, width, height, res['hwndDC'], 0, 0, SRCCOPY)
+            if result:
+                log.debug("  BitBlt成功")
+                # 获取位图数据
+                return get_bitmap_data(res['bits'], width, height)
+            return None
+                
+        except Exception as e:
+            log.warning("  GetWindowDC方法失败: %s", e)
+            return None
+    
+    def try_wm_print_message(self, hwnd, res):
+        """使用WM_PRINT消息方法"""
         try:
-            # 创建内存DC
-            memDC = win32gui.CreateCompatibleDC(screenDC)
-            hBitmap = win32gui.CreateCompatibleBitmap(screenDC, width, height)
-            win32gui.SelectObject(memDC, hBitmap)
+            log.debug("[方法4] 尝试WM_PRINT消息...")
+            width, height = res['size']
             
-            # 获取窗口位置
-            rect = win32gui.GetWindowRect(hwnd)
+            # 发送WM_PRINT消息
+            # PRF_CHECKVISIBLE | PRF_CHILDREN | PRF_CLIENT | PRF_ERASEBKGND | PRF_NONCLIENT | PRF_OWNED
+            flags = 0x01 | 0x10 | 0x04 | 0x08 | 0x02 | 0x20
             
-            # 从屏幕复制窗口区域
-            result = windll.gdi32.BitBlt(memDC, 0, 0, width, height, screenDC, rect[0], rect[1], SRCCOPY)
+            result = win32gui.SendMessage(hwnd, win32con.WM_PRINT, res['memDC'], flags)
+            log.debug("  WM_PRINT结果: %s", result)
             
-            if result:
-                image = get_bitmap_data(hBitmap, width, height)
-            else:
-                image = None
+            # 获取位图数据
+            return get_bitmap_data(res['bits'], width, height)
+                
+        except Exception as e:
+            log.warning("  WM_PRINT方法失败: %s", e)
+            return None
+    
+    def try_layered_window_technique(self, hwnd, res, rect):
+        """分层窗口技术"""
+        try:
+            log.debug("[方法2] 尝试分层窗口技术...")
+            width, height = res['size']
             
-            win32gui.DeleteObject(hBitmap)
-            win32gui.DeleteDC(memDC)
+            # 检查窗口扩展样式
+            ex_style = win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE)
             
-            # 恢复原始样式
+            # 临时设置为分层窗口
             if not (ex_style & win32con.WS_EX_LAYERED):
-                win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, ex_style)
-            
-            return image
-            
-        finally:
-            win32gui.ReleaseDC(0, screenDC)
+                win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, ex_style | win32con.WS_EX_LAYERED)
+                log.debug("  设置为分层窗口")
             
-    except Exception as e:
-        print(f"  分层窗口技术失败: {e}")
-        return None
+            try:
+                # 获取屏幕DC（只获取一次）
+                if not self._screen_dc:
+                    self._screen_dc = win32gui.GetDC(0)
+                
+                # 从屏幕复制窗口区域
+                result = _BitBlt(res['memDC'], 0, 0, width, height,
+                                 self._screen_dc, rect[0], rect[1], SRCCOPY)
+                
+                if result:
+                    return get_bitmap_data(res['bits'], width, height)
+                return None
+                
+            finally:
+                # 恢复原始样式
+                if not (ex_style & win32con.WS_EX_LAYERED):
+                    win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, ex_style)
+                
+        except Exception as e:
+            log.warning("  分层窗口技术失败: %s", e)
+            return None
+
+# 模块级默认截图器，供函数式接口使用
+_default_capturer = NonIntrusiveCapturer()
+
+def capture_window_non_intrusive(hwnd):
+    """
+    非侵入式窗口截图 - 不激活窗口（使用模块级默认截图器，GDI资源跨调用复用）
+    """
+    return _default_capturer.capture(hwnd)
 
 def try_dwm_thumbnail(hwnd, width, height):
     """DWM缩略图方法"""
     try:
-        print("[方法3] 尝试DWM缩略图...")
+        log.debug("[方法3] 尝试DWM缩略图...")
         
         # 这个方法需要更复杂的DWM API调用
         # 暂时返回None，可以后续实现
-        print("  DWM缩略图方法暂未实现")
+        log.debug("  DWM缩略图方法暂未实现")
         return None
         
     except Exception as e:
-        print(f"  DWM缩略图失败: {e}")
+        log.warning("  DWM缩略图失败: %s", e)
         return None
 
-def get_bitmap_data(hBitmap, width, height):
-    """从位图句柄获取图像数据 - 使用win32ui方法"""
-    try:
-        # 使用win32ui的更简单方法
-        bmp = win32ui.CreateBitmapFromHandle(hBitmap)
-        bmp_info = bmp.GetInfo()
-        bmp_str = bmp.GetBitmapBits(True)
-        
-        print(f"  位图信息: {bmp_info}")
-        
-        # 根据位深度处理
-        if bmp_info['bmBitsPixel'] == 32:
-            # 32位BGRA格式
-            img_array = np.frombuffer(bmp_str, dtype=np.uint8)
-            img_array = img_array.reshape((bmp_info['bmHeight'], bmp_info['bmWidth'], 4))
-            img_bgr = img_array[:, :, :3]  # 去掉Alpha通道
-            # 不需要翻转，直接返回
-            return img_bgr
-            
-        elif bmp_info['bmBitsPixel'] == 24:
-            # 24位BGR格式
-            img_array = np.frombuffer(bmp_str, dtype=np.uint8)
-            img_array = img_array.reshape((bmp_info['bmHeight'], bmp_info['bmWidth'], 3))
-            # 不需要翻转，直接返回
-            return img_array
-            
-        else:
-            print(f"  不支持的位深度: {bmp_info['bmBitsPixel']}")
-            return None
-            
-    except Exception as e:
-        print(f"  获取位图数据失败: {e}")
-        # 尝试备用方法
-        return get_bitmap_data_fallback(hBitmap, width, height)
-
-def get_bitmap_data_fallback(hBitmap, width, height):
-    """备用的位图数据获取方法"""
+def get_bitmap_data(bits, width, height):
+    """从DIB像素内存获取图像数据（32位BGRA，自顶向下）
+    
+    返回直接包装DIB像素内存的视图（不拷贝），只在位图释放前有效
+    """
     try:
-        print("  尝试备用方法获取位图数据...")
+        # 确保GDI批处理中的绘制已写入像素内存
+        _GdiFlush()
         
-        # 创建设备上下文
-        screenDC = win32gui.GetDC(0)
-        memDC = win32gui.CreateCompatibleDC(screenDC)
+        buffer = (c_ubyte * (width * height * 4)).from_address(bits)
+        return np.frombuffer(buffer, dtype=np.uint8).reshape((height, width, 4))
         
-        try:
-            # 选择位图
-            win32gui.SelectObject(memDC, hBitmap)
-            
-            # 创建新的兼容位图用于数据提取
-            newBitmap = win32gui.CreateCompatibleBitmap(screenDC, width, height)
-            newMemDC = win32gui.CreateCompatibleDC(screenDC)
-            win32gui.SelectObject(newMemDC, newBitmap)
-            
-            # 复制位图数据
-            windll.gdi32.BitBlt(newMemDC, 0, 0, width, height, memDC, 0, 0, SRCCOPY)
-            
-            # 使用win32ui获取数据
-            bmp = win32ui.CreateBitmapFromHandle(newBitmap)
-            bmp_info = bmp.GetInfo()
-            bmp_str = bmp.GetBitmapBits(True)
-            
-            if bmp_info['bmBitsPixel'] == 32:
-                img_array = np.frombuffer(bmp_str, dtype=np.uint8)
-                img_array = img_array.reshape((height, width, 4))
-                img_bgr = img_array[:, :, :3]
-                # 不需要翻转，直接返回
-                return img_bgr
-            elif bmp_info['bmBitsPixel'] == 24:
-                img_array = np.frombuffer(bmp_str, dtype=np.uint8)
-                img_array = img_array.reshape((height, width, 3))
-                # 不需要翻转，直接返回
-                return img_array
-            
-            win32gui.DeleteObject(newBitmap)
-            win32gui.DeleteDC(newMemDC)
-            
-        finally:
-            win32gui.DeleteDC(memDC)
-            win32gui.ReleaseDC(0, screenDC)
-            
     except Exception as e:
-        print(f"  备用方法也失败: {e}")
+        log.warning("  获取位图数据失败: %s", e)
         return None
 
-def is_blank_image(image, threshold=10):
-    """检查图像是否为空白"""
+def is_blank_image(image, threshold=10, step=16):
+    """检查图像是否为空白
+    
+    只是决定是否换用下一种截图方法，按 step 间隔抽样即可，不必遍历整帧
+    """
     if image is None:
         return True
     
-    std_dev = np.std(image)
+    sample = image[::step, ::step, :3]  # BGRA图像不计Alpha通道
+    if np.ptp(sample) < threshold:
+        log.debug("  图像可能为空白 (纯色)")
+        return True
+    
+    std_dev = np.std(sample)
     if std_dev < threshold:
-        print(f"  图像可能为空白 (标准差: {std_dev:.2f})")
+        log.debug("  图像可能为空白 (标准差: %.2f)", std_dev)
         return True
     
     return False
 
 def test_non_intrusive_capture():
     """测试非侵入式截图"""
+    setup_queue_logging('non_intrusive_capture')
     print("=== 非侵入式窗口截图测试 ===")
+    log.setLevel(logging.DEBUG)  # 测试时输出每种截图方法的过程信息
     
     # 查找窗口
     def find_windows():
         windows = []
         def enum_callback(hwnd, windows):
-            if win32gui.IsWindowVisible(hwnd):
-                title = win32gui.GetWindowText(hwnd)
-                if title and len(title) > 0:
-                    rect = win32gui.GetWindowRect(hwnd)
-                    width = rect[2] - rect[0]
-                    height = rect[3] - rect[1]
-                    if width > 200 and height > 200:
-                        windows.append({
-                            'handle': hwnd,
-                            'title': title,
-                            'size': (width, height)
-                        })
+            # 先用可见性和尺寸过滤（大部分顶层窗口在这里被排除），最后才取标题
+            if not win32gui.IsWindowVisible(hwnd):
+                return
+            rect = win32gui.GetWindowRect(hwnd)
+            width = rect[2] - rect[0]
+            height = rect[3] - rect[1]
+            if width <= 200 or height <= 200:
+                return
+            title = win32gui.GetWindowText(hwnd)
+            if title:
+                windows.append({
+                    'handle': hwnd,
+                    'title': title,
+                    'size': (width, height)
+                })
         win32gui.EnumWindows(enum_callback, windows)
         return windows
     
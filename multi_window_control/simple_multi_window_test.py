@@ -4,7 +4,6 @@
 
 import win32con
 import win32gui
-import threading
 import time
 
 class WindowController:
@@ -35,25 +34,24 @@ def find_windows():
     """查找可用窗口"""
     windows = []
     def enum_callback(hwnd, windows):
-        if win32gui.IsWindowVisible(hwnd):
-            title = win32gui.GetWindowText(hwnd)
-            if title and len(title) > 0:
-                rect = win32gui.GetWindowRect(hwnd)
-                width = rect[2] - rect[0]
-                height = rect[3] - rect[1]
-                if width > 200 and height > 200:
-                    windows.append({
-                        'handle': hwnd,
-                        'title': title,
-                        'size': (width, height)
-                    })
+        # 先用可见性和尺寸过滤（大部分顶层窗口在这里被排除），最后才取标题
+        if not win32gui.IsWindowVisible(hwnd):
+            return
+        rect = win32gui.GetWindowRect(hwnd)
+        width = rect[2] - rect[0]
+        height = rect[3] - rect[1]
+        if width <= 200 or height <= 200:
+            return
+        title = win32gui.GetWindowText(hwnd)
+        if title:
+            windows.append({
+                'handle': hwnd,
+                'title': title,
+                'size': (width, height)
+            })
     win32gui.EnumWindows(enum_callback, windows)
     return windows
 
-def control_window(controller, x, y):
-    """控制单个窗口"""
-    controller.move_character(x, y)
-
 def test_multi_window_control():
     """测试多窗口同时控制"""
     print("=== 多窗口同时控制测试 ===")
@@ -83,16 +81,6 @@ def test_multi_window_control():
     print("\n准备同时向3个窗口发送右键点击...")
     print("位置:", positions)
     
-    # 创建线程同时执行
-    threads = []
-    for i, (controller, pos) in enumerate(zip(controllers, positions)):
-        thread = threading.Thread(
-            target=control_window, 
-            args=(controller, pos[0], pos[1]),
-            name=f"Window-{i+1}"
-        )
-        threads.append(thread)
-    
     # 倒计时
     for i in range(3, 0, -1):
         print(f"倒计时: {i}")
@@ -100,14 +88,11 @@ def test_multi_window_control():
     
     print("开始同时控制!")
     
-    # 同时启动所有线程
+    # PostMessage 只把消息放进目标窗口的队列，不等待处理，
+    # 在当前线程依次发送即可，无需为每个窗口创建线程
     start_time = time.time()
-    for thread in threads:
-        thread.start()
-    
-    # 等待所有操作完成
-    for thread in threads:
-        thread.join()
+    for controller, pos in zip(controllers, positions):
+        controller.move_character(pos[0], pos[1])
     
     end_time = time.time()
     print(f"多窗口控制完成，耗时: {end_time - start_time:.3f}秒")
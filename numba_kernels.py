@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+数值计算内核 - Numba 加速
+模板匹配峰值查找、装备距离计算等热点函数在此集中实现，安装了 numba 时编译为机器码，
+未安装时退化为普通 Python 函数，行为保持一致
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """numba 未安装时的占位装饰器，直接返回原函数"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+
+# 不使用 parallel=True：多模板匹配已经在线程池中并发调用本内核（nogil），
+# 多个线程同时进入 Numba 并行区域时 workqueue 线程层会直接中止进程
+@njit(cache=True, nogil=True, fastmath=True)
+def _find_peaks_jit(result, threshold, radius_x, radius_y):
+    h, w = result.shape
+    is_peak = np.zeros((h, w), dtype=np.bool_)
+    for y in range(h):
+        y0 = max(0, y - radius_y)
+        y1 = min(h, y + radius_y + 1)
+        for x in range(w):
+            value = result[y, x]
+            if value < threshold:
+                continue
+            x0 = max(0, x - radius_x)
+            x1 = min(w, x + radius_x + 1)
+            peak = True
+            for yy in range(y0, y1):
+                for xx in range(x0, x1):
+                    other = result[yy, xx]
+                    # 邻域内有更大值，或同值但在光栅顺序上更靠前，则不是峰值
+                    if other > value or (other == value and (yy < y or (yy == y and xx < x))):
+                        peak = False
+                        break
+                if not peak:
+                    break
+            is_peak[y, x] = peak
+
+    ys, xs = np.nonzero(is_peak)
+    values = np.empty(ys.shape[0], dtype=np.float32)
+    for i in range(ys.shape[0]):
+        values[i] = result[ys[i], xs[i]]
+    return ys, xs, values
+
+
+def _find_peaks_numpy(result, threshold, radius_x, radius_y):
+    h, w = result.shape
+    candidates_y, candidates_x = np.nonzero(result >= threshold)
+    ys, xs, values = [], [], []
+    for y, x in zip(candidates_y, candidates_x):
+        y0 = max(0, y - radius_y)
+        x0 = max(0, x - radius_x)
+        window = result[y0:min(h, y + radius_y + 1), x0:min(w, x + radius_x + 1)]
+        value = result[y, x]
+        if window.max() > value:
+            continue
+        # 同值时只保留光栅顺序上第一个
+        first = int(np.argmax(window >= value))
+        if (y0 + first // window.shape[1], x0 + first % window.shape[1]) != (y, x):
+            continue
+        ys.append(y)
+        xs.append(x)
+        values.append(value)
+    return (np.array(ys, dtype=np.int64), np.array(xs, dtype=np.int64),
+            np.array(values, dtype=np.float32))
+
+
+def find_peaks(result, threshold, radius_x, radius_y):
+    """在模板匹配结果图中查找峰值
+
+    阈值筛选和邻域非极大值抑制一次完成：只有在 (2*radius_x+1) x (2*radius_y+1)
+    邻域内最大的点才会被保留，同一个目标周围成片的高分点只输出一个。
+
+    Args:
+        result: matchTemplate 输出的二维 float32 结果图
+        threshold: 匹配阈值
+        radius_x: 水平方向抑制半径（像素）
+        radius_y: 垂直方向抑制半径（像素）
+
+    Returns:
+        tuple: (ys, xs, values) 峰值的行坐标、列坐标和匹配分数
+    """
+    if NUMBA_AVAILABLE:
+        return _find_peaks_jit(result, np.float32(threshold), int(radius_x), int(radius_y))
+    return _find_peaks_numpy(result, threshold, int(radius_x), int(radius_y))
+
+
+@njit(cache=True, nogil=True, fastmath=True)
+def rank_equipment(origin_x, origin_y, points, threshold):
+    """批量计算装备到原点（人物位置）的平方距离，并判断是否在阈值范围内
+
+    全程比较平方距离，不做开方。候选装备通常只有几个，单线程循环即可，
+    多线程启动的开销比计算本身还大。
+
+    Args:
+        origin_x: 原点X坐标
+        origin_y: 原点Y坐标
+        points: (N, 2) int64 装备中心坐标数组
+        threshold: 距离阈值（像素）
+
+    Returns:
+        tuple: (squared_distances, within_threshold)
+            int64 平方距离数组和 bool 掩码，均为 (N,)
+    """
+    n = points.shape[0]
+    squared_distances = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        dx = points[i, 0] - origin_x
+        dy = points[i, 1] - origin_y
+        squared_distances[i] = dx * dx + dy * dy
+    return squared_distances, squared_distances <= threshold * threshold
+
+
+@njit("b1(i4[:, ::1], i8, i8, i8)", cache=True, nogil=True, fastmath=True)
+def any_within_distance(points, x, y, threshold):
+    """判断一组点中是否有任意一点与 (x, y) 的距离小于阈值
+
+    比较平方距离，找到第一个满足条件的点即返回。声明了显式签名，
+    导入时即完成编译，首次调用（通常在持锁的检测回调中）没有编译开销。
+
+    Args:
+        points: (N, 2) C 连续的 int32 坐标数组
+        x: 查询点X坐标
+        y: 查询点Y坐标
+        threshold: 距离阈值（像素）
+
+    Returns:
+        bool: 存在距离小于阈值的点时为 True
+    """
+    threshold_sq = threshold * threshold
+    for i in range(points.shape[0]):
+        dx = points[i, 0] - x
+        dy = points[i, 1] - y
+        if dx * dx + dy * dy < threshold_sq:
+            return True
+    return False
@@ -3,28 +3,63 @@
 """
 简洁的OCR客户端 - 通过HTTP调用服务端识别文字
 """
+import json
 import requests
 import time
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+from requests.adapters import HTTPAdapter
 from typing import Dict, List
+from urllib3.util.retry import Retry
+
+# orjson（可选依赖）序列化比标准库 json 快数倍
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 class OCRClient:
     """简洁的OCR客户端"""
     
-    def __init__(self, server_url='http://127.0.0.1:5000'):
+    def __init__(self, server_url='http://127.0.0.1:5000', pool_size=32):
         """
         初始化客户端
         
         Args:
             server_url: OCR服务端地址
+            pool_size: 连接池大小，多窗口并发识别时保持足够的长连接
         """
         self.server_url = server_url.rstrip('/')
         self.session = requests.Session()
+        
+        # 长连接复用 + 服务端瞬时不可用时的快速重试（识别请求可安全重发）
+        retry = Retry(total=2, backoff_factor=0.05, status_forcelist=[502, 503, 504],
+                      allowed_methods=frozenset(['GET', 'POST']))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Connection'] = 'keep-alive'
+    
+    def _post_json(self, path: str, payload: Dict, timeout: float) -> requests.Response:
+        """POST JSON请求，安装了 orjson 时用它序列化"""
+        if ORJSON_AVAILABLE:
+            body = orjson.dumps(payload)
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        return self.session.post(
+            f"{self.server_url}{path}",
+            data=body,
+            headers={'Content-Type': 'application/json'},
+            timeout=timeout
+        )
     
     def is_server_ready(self) -> bool:
-        """检查服务端是否就绪"""
+        """检查服务端是否就绪（已启动且OCR模型加载完成）"""
         try:
             response = self.session.get(f"{self.server_url}/health", timeout=5)
-            return response.status_code == 200
+            return response.status_code == 200 and response.json().get('model_loaded', True)
         except:
             return False
     
@@ -44,18 +79,67 @@ class OCRClient:
                 'error': str  # 仅在失败时存在
             }
         """
+        request_data = {
+            'image_path': image_path,
+            'target_text': target_text,
+            'early_exit': True
+        }
+        return self._request_find(lambda: self._post_json('/find_text', request_data, timeout=60))
+    
+    def find_text_bytes(self, image: np.ndarray, target_text: str) -> Dict:
+        """
+        查找文字 - 直接上传内存中的图像（PNG低压缩编码），服务端不读磁盘
+        
+        Args:
+            image: BGR格式的numpy图像
+            target_text: 目标文字
+            
+        Returns:
+            同 find_text
+        """
+        ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            return {'success': False, 'error': '图像编码失败'}
+        
+        return self._request_find(lambda: self.session.post(
+            f"{self.server_url}/find_text_raw",
+            files={'image': ('frame.png', encoded.tobytes(), 'image/png')},
+            data={'target_text': target_text, 'early_exit': 'true'},
+            timeout=60
+        ))
+    
+    def find_text_shm(self, image: np.ndarray, target_text: str) -> Dict:
+        """
+        查找文字 - 通过共享内存传递原始图像（仅限客户端与服务端在同一台机器）
+        
+        省去编码/解码，共享内存在服务端返回结果后释放
+        
+        Args:
+            image: BGR格式的numpy图像
+            target_text: 目标文字
+            
+        Returns:
+            同 find_text
+        """
+        shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
         try:
+            np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
             request_data = {
-                'image_path': image_path,
+                'shm_name': shm.name,
+                'shape': list(image.shape),
+                'dtype': image.dtype.str,
                 'target_text': target_text,
                 'early_exit': True
             }
-            
-            response = self.session.post(
-                f"{self.server_url}/find_text",
-                json=request_data,
-                timeout=60
-            )
+            return self._request_find(lambda: self._post_json('/find_text_shm', request_data, timeout=60))
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    def _request_find(self, send) -> Dict:
+        """发送查找请求并整理返回结果（各 find_text* 方法共用）"""
+        try:
+            response = send()
             
             if response.status_code == 200:
                 try:
@@ -88,13 +172,15 @@ class OCRClient:
         """查找游戏物品"""
         return self.find_text(screenshot_path, item_name)
     
-    def batch_find(self, image_path: str, target_texts: List[str]) -> Dict:
+    def batch_find(self, image_path: str, target_texts: List[str], separate: bool = False) -> Dict:
         """
         批量查找文字
         
         Args:
             image_path: 图像路径
             target_texts: 目标文字列表
+            separate: 为 True 时服务端对每个目标单独识别（可按区域提前退出，并发执行），
+                      默认整张图只识别一次
             
         Returns:
             批量查找结果
@@ -103,14 +189,11 @@ class OCRClient:
             request_data = {
                 'image_path': image_path,
                 'target_texts': target_texts,
-                'early_exit': True
+                'early_exit': True,
+                'separate': separate
             }
             
-            response = self.session.post(
-                f"{self.server_url}/batch_find",
-                json=request_data,
-                timeout=120
-            )
+            response = self._post_json('/batch_find', request_data, timeout=120)
             
             if response.status_code == 200:
                 return response.json()
@@ -10,57 +10,168 @@ import sys
 import time
 import json
 import base64
-import subprocess
-import platform
+import atexit
+import logging
+import signal
+import socket
+import urllib.request
+import cv2
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
-from ocr_speed_optimized import get_speed_optimized_ocr
+from waitress import serve
+from ocr_speed_optimized import SpeedOptimizedOCR, get_speed_optimized_ocr
 import threading
 
+# 添加项目根目录到Python路径（共用的日志模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from queue_logging import setup_queue_logging
+
+# orjson（可选依赖）比 Flask 默认的 json 编解码快数倍，并能直接序列化 numpy 类型
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 app = Flask(__name__)
 
-# 全局OCR实例
+# Waitress 工作线程只把日志放入队列，由后台线程统一写控制台（启动服务端时启用），避免 print 在线程间串行化
+log = logging.getLogger('ocr')
+log.setLevel(logging.INFO)
+
+# 全局OCR实例（由后台线程加载，加载完成后 ocr_ready 置位）
 ocr_service = None
 server_start_time = None
+ocr_ready = threading.Event()
+ocr_init_error = None
+
+# 批量请求中逐个目标单独识别时使用的线程池（PaddleOCR 推理期间释放GIL，可以重叠执行）。
+# 每次识别从OCR实例池借用独占的实例，线程数与实例数一致，多出的线程只会排队等待实例
+batch_executor = ThreadPoolExecutor(max_workers=SpeedOptimizedOCR.ocr_instance_count,
+                                    thread_name_prefix="BatchFind")
+
+# 记录当前服务端进程号，下次启动时据此结束遗留的服务端
+PID_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_server.pid')
+
+def _json_response(data, status=200):
+    """返回JSON响应，安装了 orjson 时用它序列化"""
+    if ORJSON_AVAILABLE:
+        return app.response_class(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY),
+                                  status=status, mimetype='application/json')
+    return jsonify(data), status
+
+def _request_json():
+    """解析请求体JSON，安装了 orjson 时用它解析"""
+    if ORJSON_AVAILABLE:
+        body = request.get_data()
+        return orjson.loads(body) if body else None
+    return request.get_json()
 
 def init_ocr_service():
-    """初始化OCR服务（服务端启动时调用）"""
-    global ocr_service, server_start_time
+    """初始化OCR服务（服务端启动时在后台线程中调用）
     
-    print("=" * 50)
-    print("速度优化OCR服务端启动中...")
-    print("=" * 50)
+    模型加载期间服务端已经可以响应 /health（model_loaded=False），
+    OCR接口在加载完成前返回503
+    """
+    global ocr_service, server_start_time, ocr_init_error
     
-    server_start_time = time.time()
+    log.info("=" * 50)
+    log.info("速度优化OCR服务端启动中...")
+    log.info("=" * 50)
+    
+    if server_start_time is None:
+        server_start_time = time.time()
     
-    print("预加载OCR模型...")
+    log.info("预加载OCR模型...")
     model_start = time.time()
     
-    # 预加载速度优化模型
-    ocr_service = get_speed_optimized_ocr()
+    # 预加载速度优化模型，完整加载后才发布给请求线程
+    try:
+        service = get_speed_optimized_ocr()
+    except Exception as e:
+        ocr_init_error = str(e)
+        log.error("[ERROR] OCR模型加载失败: %s", ocr_init_error)
+        return
+    ocr_service = service
+    ocr_ready.set()
     
     model_time = time.time() - model_start
     total_time = time.time() - server_start_time
     
-    print(f"[OK] OCR模型加载完成，耗时: {model_time:.2f}秒")
-    print(f"[OK] 服务端启动完成，总耗时: {total_time:.2f}秒")
-    print("服务端已就绪，等待客户端请求...")
-    print("=" * 50)
+    log.info("[OK] OCR模型加载完成，耗时: %.2f秒", model_time)
+    log.info("[OK] 服务端启动完成，总耗时: %.2f秒", total_time)
+    log.info("服务端已就绪，等待客户端请求...")
+    log.info("=" * 50)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
     uptime = time.time() - server_start_time if server_start_time else 0
-    return jsonify({
+    health = {
         'status': 'healthy',
         'uptime': f"{uptime:.1f}秒",
-        'model_loaded': ocr_service is not None
-    })
+        'model_loaded': ocr_ready.is_set(),
+        'pid': os.getpid()  # 下次启动时据此确认占用端口的确实是本服务端
+    }
+    if ocr_init_error:
+        health['error'] = ocr_init_error
+    return jsonify(health)
+
+def _service_unavailable():
+    """OCR模型尚未加载完成（或加载失败）时的503响应"""
+    message = f'OCR模型加载失败: {ocr_init_error}' if ocr_init_error else 'OCR模型加载中，请稍后重试'
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def _run_find_text(image, target_text, early_exit, source_name):
+    """执行文字查找并附加服务端信息（各查找接口共用）
+    
+    Args:
+        image: 图像路径或BGR numpy图像
+        target_text: 目标文字
+        early_exit: 是否提前退出
+        source_name: 日志中显示的图像来源
+    """
+    # 记录请求开始时间
+    request_start = time.time()
+    
+    log.info("[请求] 查找'%s' in %s", target_text, source_name)
+    
+    # 调用速度优化OCR服务
+    result = ocr_service.find_text_speed_optimized(image, target_text, early_exit)
+    
+    request_time = time.time() - request_start
+    
+    # 添加服务端信息
+    if result['success']:
+        result['server_info'] = {
+            'request_time': request_time,
+            'server_uptime': time.time() - server_start_time,
+            'model_preloaded': True
+        }
+        
+        status = "找到" if result['target_found'] else "未找到"
+        early_info = "提前退出" if result.get('early_exit') else "完整处理"
+        processed = result.get('processed_texts', 0)
+        total = result['total_texts']
+        
+        log.info("[OK] 请求完成: %s | %.3fs | %s | %s/%s", status, request_time, early_info, processed, total)
+    else:
+        log.error("[ERROR] 请求失败: %s", result['error'])
+    
+    return result
 
 @app.route('/find_text', methods=['POST'])
 def find_text_api():
     """文字查找API"""
+    if not ocr_ready.is_set():
+        return _service_unavailable()
+    
     try:
-        data = request.get_json()
+        data = _request_json()
         
         if not data:
             return jsonify({'error': '请求数据为空'}), 400
@@ -76,66 +187,125 @@ def find_text_api():
         if not os.path.exists(image_path):
             return jsonify({'error': f'图像文件不存在: {image_path}'}), 400
         
-        # 记录请求开始时间
-        request_start = time.time()
+        result = _run_find_text(image_path, target_text, early_exit, os.path.basename(image_path))
+        return _json_response(result)
         
-        print(f"[请求] 查找'{target_text}' in {os.path.basename(image_path)}")
+    except Exception as e:
+        log.error("[ERROR] 服务端错误: %s", str(e))
+        return jsonify({'error': f'服务端错误: {str(e)}'}), 500
+
+@app.route('/find_text_raw', methods=['POST'])
+def find_text_raw_api():
+    """文字查找API - 图像以编码后的字节上传（multipart字段 image），不经过磁盘"""
+    if not ocr_ready.is_set():
+        return _service_unavailable()
+    
+    try:
+        image_file = request.files.get('image')
+        if image_file is None:
+            return jsonify({'error': '缺少image文件'}), 400
         
-        # 调用速度优化OCR服务
-        result = ocr_service.find_text_speed_optimized(image_path, target_text, early_exit)
+        target_text = request.form.get('target_text', '')
+        early_exit = request.form.get('early_exit', 'true').lower() != 'false'
         
-        request_time = time.time() - request_start
+        image = cv2.imdecode(np.frombuffer(image_file.read(), np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return jsonify({'error': '图像解码失败'}), 400
         
-        # 添加服务端信息
-        if result['success']:
-            result['server_info'] = {
-                'request_time': request_time,
-                'server_uptime': time.time() - server_start_time,
-                'model_preloaded': True
-            }
-            
-            status = "找到" if result['target_found'] else "未找到"
-            early_info = "提前退出" if result.get('early_exit') else "完整处理"
-            processed = result.get('processed_texts', 0)
-            total = result['total_texts']
-            
-            print(f"[OK] 请求完成: {status} | {request_time:.3f}s | {early_info} | {processed}/{total}")
-        else:
-            print(f"[ERROR] 请求失败: {result['error']}")
+        result = _run_find_text(image, target_text, early_exit, '上传图像')
+        return _json_response(result)
+        
+    except Exception as e:
+        log.error("[ERROR] 服务端错误: %s", str(e))
+        return jsonify({'error': f'服务端错误: {str(e)}'}), 500
+
+def _attach_shm(name):
+    """按名称连接客户端创建的共享内存，不登记到本进程的 resource_tracker
+    
+    POSIX 上连接已有的共享内存也会被 resource_tracker 登记，服务端退出时会把
+    仍属于客户端的共享内存 unlink 掉并报泄漏警告；生命周期由客户端负责，这里撤销登记
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix':
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+@app.route('/find_text_shm', methods=['POST'])
+def find_text_shm_api():
+    """文字查找API - 同机客户端通过共享内存传递原始图像，无需编码和拷贝
+    
+    请求: {'shm_name': str, 'shape': [h, w, 3], 'dtype': 'uint8', 'target_text': str, 'early_exit': bool}
+    共享内存由客户端创建和释放，服务端只在处理请求期间读取
+    """
+    if not ocr_ready.is_set():
+        return _service_unavailable()
+    
+    try:
+        data = _request_json()
+        
+        if not data or not data.get('shm_name') or not data.get('shape'):
+            return jsonify({'error': '缺少shm_name或shape参数'}), 400
+        
+        target_text = data.get('target_text', '')
+        early_exit = data.get('early_exit', True)
         
-        return jsonify(result)
+        shm = _attach_shm(data['shm_name'])
+        image = None
+        try:
+            image = np.ndarray(tuple(data['shape']), dtype=np.dtype(data.get('dtype', 'uint8')), buffer=shm.buf)
+            result = _run_find_text(image, target_text, early_exit, f"共享内存 {data['shm_name']}")
+        finally:
+            # 关闭共享内存前释放对缓冲区的引用（出错时也一样），否则 close() 报 BufferError
+            image = None
+            shm.close()
+        
+        return _json_response(result)
         
+    except FileNotFoundError:
+        return jsonify({'error': f"共享内存不存在: {data.get('shm_name')}"}), 400
     except Exception as e:
-        print(f"[ERROR] 服务端错误: {str(e)}")
+        log.error("[ERROR] 服务端错误: %s", str(e))
         return jsonify({'error': f'服务端错误: {str(e)}'}), 500
 
 @app.route('/batch_find', methods=['POST'])
 def batch_find_api():
-    """批量查找API"""
+    """批量查找API
+    
+    默认整张图只识别一次，各目标共用识别结果；
+    请求中 separate=true 时每个目标单独识别（按区域提前退出），并在线程池中并发执行
+    """
+    if not ocr_ready.is_set():
+        return _service_unavailable()
+    
     try:
-        data = request.get_json()
+        data = _request_json()
         
         image_path = data.get('image_path')
         target_texts = data.get('target_texts', [])
+        separate = data.get('separate', False)
         early_exit = data.get('early_exit', True)
         
         if not image_path or not target_texts:
             return jsonify({'error': '缺少必要参数'}), 400
         
-        print(f"[批量] 收到批量请求: {len(target_texts)}个目标文字")
+        log.info("[批量] 收到批量请求: %s个目标文字", len(target_texts))
         
         request_start = time.time()
-        results = {}
         
-        for target_text in target_texts:
-            result = ocr_service.find_text_speed_optimized(image_path, target_text, early_exit)
-            results[target_text] = result
+        if separate:
+            futures = {target_text: batch_executor.submit(ocr_service.find_text_speed_optimized,
+                                                          image_path, target_text, early_exit)
+                       for target_text in target_texts}
+            results = {target_text: future.result() for target_text, future in futures.items()}
+        else:
+            # 整张图只识别一次，各目标文字共用识别结果（不做区域提前退出）
+            results = ocr_service.find_texts_batch(image_path, target_texts)
         
         request_time = time.time() - request_start
         
-        print(f"[OK] 批量请求完成: {request_time:.3f}s")
+        log.info("[OK] 批量请求完成: %.3fs", request_time)
         
-        return jsonify({
+        return _json_response({
             'success': True,
             'results': results,
             'batch_info': {
@@ -145,124 +315,138 @@ def batch_find_api():
         })
         
     except Exception as e:
-        print(f"[ERROR] 批量请求错误: {str(e)}")
+        log.error("[ERROR] 批量请求错误: %s", str(e))
         return jsonify({'error': f'批量请求错误: {str(e)}'}), 500
 
-def cleanup_existing_servers(port=5000):
+def _port_in_use(host, port):
+    """检查端口是否已有服务在监听"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.2)
+        return sock.connect_ex((host, port)) == 0
+
+def _port_owner_pid(host, port):
+    """通过 /health 询问占用端口的服务端进程号，不是本服务端（或无法识别）时返回 None"""
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/health", timeout=1.0) as response:
+            pid = json.loads(response.read()).get('pid')
+        return pid if isinstance(pid, int) else None
+    except Exception:
+        return None
+
+def _write_pid_file():
+    """写入当前进程号，进程退出时删除"""
+    try:
+        with open(PID_FILE, 'w') as f:
+            f.write(str(os.getpid()))
+    except OSError as e:
+        log.warning("警告: 无法写入PID文件: %s", e)
+        return
+    
+    def remove_pid_file():
+        try:
+            with open(PID_FILE) as f:
+                if f.read().strip() == str(os.getpid()):
+                    os.remove(PID_FILE)
+        except OSError:
+            pass
+    atexit.register(remove_pid_file)
+
+def cleanup_existing_servers(port=5000, host='127.0.0.1', wait_timeout=3.0):
     """
     清理已存在的OCR服务进程
     
+    通过连接探测端口是否被占用；被占用时按PID文件结束上一次启动的服务端，
+    并等待端口释放。不再调用 netstat/taskkill/lsof 等外部命令。
+    
     Args:
         port: 要清理的端口号
+        host: 服务地址
+        wait_timeout: 等待端口释放的最长时间（秒）
     """
     try:
-        print(f"正在检查端口 {port} 是否被占用...")
-        
-        if platform.system().lower() == 'windows':
-            # Windows系统
-            result = subprocess.run(
-                ['netstat', '-ano'], 
-                capture_output=True, 
-                text=True, 
-                encoding='gbk'  # Windows中文系统编码
-            )
-            
-            if result.returncode == 0:
-                lines = result.stdout.split('\n')
-                pids_to_kill = set()
-                
-                for line in lines:
-                    if f':{port}' in line and 'LISTENING' in line:
-                        parts = line.split()
-                        if len(parts) >= 5:
-                            pid = parts[-1]
-                            if pid.isdigit() and pid != '0':
-                                pids_to_kill.add(pid)
-                
-                if pids_to_kill:
-                    print(f"发现 {len(pids_to_kill)} 个进程占用端口 {port}: {', '.join(pids_to_kill)}")
-                    
-                    for pid in pids_to_kill:
-                        try:
-                            subprocess.run(
-                                ['taskkill', '/F', '/PID', pid], 
-                                capture_output=True, 
-                                check=True
-                            )
-                            print(f"已终止进程 PID: {pid}")
-                        except subprocess.CalledProcessError:
-                            print(f"警告: 无法终止进程 PID: {pid}")
-                    
-                    # 等待进程完全终止
-                    time.sleep(2)
-                    print(f"端口 {port} 清理完成")
-                else:
-                    print(f"端口 {port} 未被占用")
-            else:
-                print("警告: 无法检查端口占用情况")
+        log.info("正在检查端口 %s 是否被占用...", port)
         
-        else:
-            # Linux/Mac系统
-            result = subprocess.run(
-                ['lsof', '-ti', f':{port}'], 
-                capture_output=True, 
-                text=True
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                pids = result.stdout.strip().split('\n')
-                print(f"发现 {len(pids)} 个进程占用端口 {port}: {', '.join(pids)}")
-                
-                for pid in pids:
-                    if pid.strip():
-                        try:
-                            subprocess.run(['kill', '-9', pid.strip()], check=True)
-                            print(f"已终止进程 PID: {pid.strip()}")
-                        except subprocess.CalledProcessError:
-                            print(f"警告: 无法终止进程 PID: {pid.strip()}")
-                
-                time.sleep(1)
-                print(f"端口 {port} 清理完成")
-            else:
-                print(f"端口 {port} 未被占用")
+        if not _port_in_use(host, port):
+            log.info("端口 %s 未被占用", port)
+            return
+        
+        try:
+            with open(PID_FILE) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            log.warning("警告: 端口 %s 被占用，但没有找到上次服务端的PID文件，无法自动清理", port)
+            return
+        
+        if pid == os.getpid():
+            return
+        
+        # PID文件可能是过期的（进程号已被其他程序复用），只有端口上的服务端自己报告的
+        # 进程号与之一致时才结束它，否则只删除过期的PID文件
+        owner_pid = _port_owner_pid(host, port)
+        if owner_pid != pid:
+            log.warning("警告: 端口 %s 上的进程不是PID文件记录的服务端 (PID %s)，不自动结束，已删除过期的PID文件",
+                        port, pid)
+            try:
+                os.remove(PID_FILE)
+            except OSError:
+                pass
+            return
+        
+        log.info("发现上次启动的服务端占用端口 %s: PID %s", port, pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+            log.info("已终止进程 PID: %s", pid)
+        except OSError:
+            log.warning("警告: 无法终止进程 PID: %s", pid)
+            return
+        
+        # 每100ms探测一次，等待端口释放
+        deadline = time.time() + wait_timeout
+        while time.time() < deadline:
+            if not _port_in_use(host, port):
+                log.info("端口 %s 清理完成", port)
+                return
+            time.sleep(0.1)
+        log.warning("警告: 端口 %s 仍被占用", port)
                 
     except Exception as e:
-        print(f"警告: 端口清理过程中出现错误: {str(e)}")
-        print("继续启动服务...")
+        log.warning("警告: 端口清理过程中出现错误: %s", str(e))
+        log.info("继续启动服务...")
 
 def run_server(host='127.0.0.1', port=5000, debug=False, use_waitress=True):
     """启动OCR服务端"""
-    print("正在启动OCR服务端...")
+    setup_queue_logging('ocr')
+    log.info("正在启动OCR服务端...")
     
     # 自动清理已存在的服务进程
-    cleanup_existing_servers(port)
+    cleanup_existing_servers(port, host)
+    _write_pid_file()
     
-    print(f"服务地址: http://{host}:{port}")
-    print("可用接口:")
-    print(f"   GET  /health     - 健康检查")
-    print(f"   POST /find_text  - 文字查找")
-    print(f"   POST /batch_find - 批量查找")
-    print()
+    log.info("服务地址: http://%s:%s", host, port)
+    log.info("可用接口:")
+    log.info("   GET  /health     - 健康检查")
+    log.info("   POST /find_text  - 文字查找")
+    log.info("   POST /find_text_raw - 文字查找（上传图像字节）")
+    log.info("   POST /find_text_shm - 文字查找（共享内存图像）")
+    log.info("   POST /batch_find - 批量查找")
+    log.info("")
     
     if use_waitress:
-        try:
-            from waitress import serve
-            print("使用Waitress生产级WSGI服务器...")
-            print("服务端运行中，按 Ctrl+C 停止...")
-            serve(app, host=host, port=port, threads=6)
-        except ImportError:
-            print("警告: Waitress未安装，回退到Flask开发服务器")
-            print("建议安装: pip install waitress")
-            use_waitress = False
-    
-    if not use_waitress:
-        print("使用Flask开发服务器（仅用于开发）...")
-        print("服务端运行中，按 Ctrl+C 停止...")
+        threads = min(os.cpu_count() or 1, 8)
+        log.info("使用Waitress生产级WSGI服务器 (线程数: %s)...", threads)
+        log.info("服务端运行中，按 Ctrl+C 停止...")
+        serve(app, host=host, port=port, threads=threads, channel_timeout=120)
+    else:
+        log.info("使用Flask开发服务器（仅用于开发）...")
+        log.info("服务端运行中，按 Ctrl+C 停止...")
         try:
             app.run(host=host, port=port, debug=debug, threaded=True)
         except KeyboardInterrupt:
-            print("\n服务端已停止")
+            log.info("服务端已停止")
 
 if __name__ == "__main__":
-    init_ocr_service()
+    setup_queue_logging('ocr')
+    # 模型在后台加载，服务端立即开始监听，/health 可以马上响应
+    server_start_time = time.time()
+    threading.Thread(target=init_ocr_service, name="OCRInit", daemon=True).start()
     run_server()
@@ -5,15 +5,63 @@
 """
 
 import cv2
+import os
+import queue
 import time
 import warnings
 import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from paddleocr import PaddleOCR
-import os
+from typing import Union
+
+# Numba（可选依赖）：文字外接矩形计算编译为机器码，未安装时使用numpy实现
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 warnings.filterwarnings('ignore')
 
+if NUMBA_AVAILABLE:
+    # 显式签名：导入时即编译（或从缓存加载），首次识别不再等待JIT编译
+    @njit(["int64[:, :](int64[:, :, :], int64, int64)",
+           "float64[:, :](float64[:, :, :], int64, int64)"],
+          cache=True, nogil=True, fastmath=True)
+    def _polys_to_bboxes_jit(points, offset_x, offset_y):
+        """(N, 点数, 2) 多边形数组 -> (N, 4) 外接矩形数组，单次遍历同时求x/y的最小最大值"""
+        n = points.shape[0]
+        bboxes = np.empty((n, 4), dtype=points.dtype)
+        for i in range(n):
+            x_min = x_max = points[i, 0, 0]
+            y_min = y_max = points[i, 0, 1]
+            for j in range(1, points.shape[1]):
+                x = points[i, j, 0]
+                y = points[i, j, 1]
+                if x < x_min:
+                    x_min = x
+                elif x > x_max:
+                    x_max = x
+                if y < y_min:
+                    y_min = y
+                elif y > y_max:
+                    y_max = y
+            bboxes[i, 0] = x_min + offset_x
+            bboxes[i, 1] = y_min + offset_y
+            bboxes[i, 2] = x_max + offset_x
+            bboxes[i, 3] = y_max + offset_y
+        return bboxes
+
+def _gpu_available() -> bool:
+    """检查 paddle 是否可以使用CUDA设备"""
+    try:
+        import paddle
+        return paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+    except Exception:
+        return False
+
 class SpeedOptimizedOCR:
     """实用优化版OCR服务"""
     _instance = None
@@ -22,6 +70,17 @@ class SpeedOptimizedOCR:
     _model_loaded = False
     _model_load_time = 0.0
     
+    # INT8量化模型目录（PaddleSlim / OpenVINO NNCF 量化导出的移动端模型），需在首次创建实例前设置；
+    # 为 None 时使用FP32模型。CPU不支持VNNI指令时INT8不一定更快，启用前先实测
+    int8_det_model_dir = None
+    int8_rec_model_dir = None
+    # CPU上高性能推理使用的后端：'onnxruntime'（PaddleOCR导出的ONNX模型，图优化级别ORT_ENABLE_ALL），
+    # 为 None 时由PaddleOCR自动选择（Intel CPU上通常为OpenVINO）；GPU上始终自动选择（TensorRT）
+    hpi_backend = 'onnxruntime'
+    # PaddleOCR实例数（需在首次创建实例前设置）。PaddleOCR 没有承诺同一实例可被多线程同时调用，
+    # 并发的调用方（服务端的多个工作线程）各自从实例池借用一个，用完归还；实例用完时后来者等待
+    ocr_instance_count = 2
+    
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
@@ -36,11 +95,28 @@ class SpeedOptimizedOCR:
                     print("*** 初始化速度优化OCR服务 ***")
                     model_start = time.time()
                     
-                    # 使用与成功版本相同的基础配置，但添加速度优化
-                    self.ocr = PaddleOCR(
-                        lang='ch',
-                        use_angle_cls=False,  # 禁用角度分类器，提升速度约20-30%
-                    )
+                    # 文字检测模型输入的最长边，预处理直接缩放到这个尺寸，模型内部不再二次缩放
+                    self.det_limit_side_len = 960
+                    count = max(1, self.ocr_instance_count)
+                    # 推理线程总数取一半核心（另一半留给截图/预处理），平分给各个实例，同时推理也不会超订
+                    cpu_threads = max(1, (os.cpu_count() or 2) // 2 // count)
+                    instances = [self._create_ocr(cpu_threads) for _ in range(count)]
+                    self._ocr_pool = queue.Queue()
+                    for ocr in instances:
+                        self._ocr_pool.put(ocr)
+                    # 保留第一个实例的引用供外部查看配置，识别一律通过 _acquire_ocr 借用
+                    self.ocr = instances[0]
+                    
+                    # CLAHE对象内部保存了中间缓冲区，不能跨线程共用，每个线程缓存一个
+                    self._thread_local = threading.local()
+                    # (宽, 高, 检测最长边) -> 缩放后尺寸（无需缩放时为 None），同一来源的截图尺寸固定
+                    self._resize_cache = {}
+                    
+                    # 感兴趣区域和完整图像并行识别（PaddleOCR推理期间释放GIL），
+                    # 关闭后按区域顺序逐个识别。工作线程同样从实例池借用实例，
+                    # 线程数与实例数一致，不额外加载模型
+                    self.parallel_regions = True
+                    self._region_pool = ThreadPoolExecutor(max_workers=count, thread_name_prefix="OCRRegion")
                     
                     SpeedOptimizedOCR._model_load_time = time.time() - model_start
                     SpeedOptimizedOCR._model_loaded = True
@@ -48,156 +124,236 @@ class SpeedOptimizedOCR:
                     
                     SpeedOptimizedOCR._initialized = True
     
-    def preprocess_image_for_speed(self, image_path: str) -> str:
+    def _create_ocr(self, cpu_threads):
+        """
+        创建PaddleOCR实例
+        
+        优先启用高性能推理（enable_hpi，自动选择 OpenVINO / ONNX Runtime / TensorRT 后端，
+        有GPU时使用FP16）；PaddleOCR版本过旧或未安装高性能推理依赖时退回默认推理后端
+        
+        Args:
+            cpu_threads: 该实例在CPU上推理使用的线程数
+        """
+        use_gpu = _gpu_available()
+        
+        # 使用与成功版本相同的基础配置，但添加速度优化
+        base_kwargs = {
+            'lang': 'ch',
+            'use_angle_cls': False,  # 禁用角度分类器，提升速度约20-30%
+            # 游戏截图文字大而清晰，使用移动端检测/识别模型，CPU上比默认的server模型快3-5倍
+            'text_detection_model_name': 'PP-OCRv5_mobile_det',
+            'text_recognition_model_name': 'PP-OCRv5_mobile_rec',
+            # 检测模型最长边限制与预处理缩放一致（只缩小不放大）
+            'text_det_limit_side_len': self.det_limit_side_len,
+            'text_det_limit_type': 'max',
+        }
+        if self.int8_det_model_dir and self.int8_rec_model_dir:
+            # 模型名称决定前后处理配置，权重从量化模型目录加载
+            base_kwargs['text_detection_model_dir'] = self.int8_det_model_dir
+            base_kwargs['text_recognition_model_dir'] = self.int8_rec_model_dir
+            if not use_gpu:
+                # CPU上的INT8推理依赖MKLDNN(oneDNN)内核
+                base_kwargs['enable_mkldnn'] = True
+                base_kwargs['cpu_threads'] = cpu_threads
+            print(f"[优化] 使用INT8量化模型: {self.int8_det_model_dir}, {self.int8_rec_model_dir}")
+        if not use_gpu:
+            # CPU上识别本来就是逐条串行执行，批大小为1不影响速度；
+            # Paddle推理引擎按批大小分配内存池，默认批大小6会多占用约250MB峰值内存，首次推理也更慢
+            base_kwargs['text_recognition_batch_size'] = 1
+        
+        hpi_kwargs = {'enable_hpi': True}
+        if use_gpu:
+            hpi_kwargs.update(device='gpu', precision='fp16')
+        elif self.hpi_backend:
+            hpi_kwargs['hpi_config'] = {
+                'backend': self.hpi_backend,
+                'backend_config': {'cpu_num_threads': cpu_threads},
+            }
+        
+        try:
+            ocr = PaddleOCR(**base_kwargs, **hpi_kwargs)
+            print(f"[优化] 已启用高性能推理: {hpi_kwargs}")
+            return ocr
+        except Exception as e:
+            print(f"[优化] 高性能推理不可用，使用默认推理后端: {e}")
+            return PaddleOCR(**base_kwargs)
+    
+    @contextmanager
+    def _acquire_ocr(self):
+        """从实例池借用一个PaddleOCR实例，退出时归还"""
+        ocr = self._ocr_pool.get()
+        try:
+            yield ocr
+        finally:
+            self._ocr_pool.put(ocr)
+    
+    def _run_ocr(self, image):
+        """借用一个实例识别图像，返回PaddleOCR原始结果"""
+        with self._acquire_ocr() as ocr:
+            return ocr.ocr(image)
+    
+    def _get_clahe(self):
+        """获取当前线程的CLAHE对象（首次使用时创建）"""
+        clahe = getattr(self._thread_local, 'clahe', None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+            self._thread_local.clahe = clahe
+        return clahe
+    
+    def _get_resize_target(self, width, height):
+        """计算图像缩放后的尺寸，不需要缩放时返回 None（按输入尺寸缓存）"""
+        limit = self.det_limit_side_len
+        key = (width, height, limit)
+        if key in self._resize_cache:
+            return self._resize_cache[key]
+        
+        # 文字检测模型会把最长边缩放到 det_limit_side_len 以内，多出的像素预处理完就被丢弃，
+        # 这里直接按同一比例缩放到该尺寸（保持宽高比，对齐32的倍数交给检测模型自己处理）
+        target_size = None
+        if max(width, height) > limit:
+            scale = limit / max(width, height)
+            target_size = (max(1, int(round(width * scale))),
+                           max(1, int(round(height * scale))))
+            print(f"[优化] 图像缩放: {width}x{height} -> {target_size[0]}x{target_size[1]} (缩放比例: {scale:.2f})")
+        
+        self._resize_cache[key] = target_size
+        return target_size
+    
+    def _downscale(self, img, target_size):
+        """
+        缩小图像到目标尺寸
+        
+        缩小一半以上时先逐级按2倍缩小（INTER_AREA 对整数2倍缩放有专门的快速实现），
+        剩余比例再做一次 INTER_AREA，比直接大比例 INTER_AREA 快2-3倍
+        """
+        target_width, target_height = target_size
+        while img.shape[1] // 2 >= target_width and img.shape[0] // 2 >= target_height:
+            img = cv2.resize(img, (img.shape[1] // 2, img.shape[0] // 2), interpolation=cv2.INTER_AREA)
+        if (img.shape[1], img.shape[0]) != target_size:
+            img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
+        return img
+    
+    def preprocess_image_for_speed(self, image_path: Union[str, np.ndarray],
+                                   need_color: bool = False) -> np.ndarray:
+        """
+        图像预处理（缩放 + 对比度增强），只返回处理后的图像
+        
+        注意: 图像可能被缩小，在结果上识别出的坐标属于缩放后的图像；
+        需要原图坐标时使用 _preprocess_with_scale
+        """
+        return self._preprocess_with_scale(image_path, need_color)[0]
+    
+    def _preprocess_with_scale(self, image_path: Union[str, np.ndarray],
+                               need_color: bool = False):
         """
         优化1: 图像预处理优化
         - 调整图像尺寸减少计算量
         - 增强对比度提高识别准确率
+        
+        预处理结果直接以numpy数组交给PaddleOCR，不再写临时文件再读回
+        
+        Args:
+            image_path: 图像路径，或已在内存中的BGR图像（客户端直接上传时）
+            need_color: 为 False（默认）时全程只处理灰度：图像文件直接按灰度解码，
+                        缩放和增强都在单通道上进行；为 True 时保留颜色，在LAB的L通道上增强
+        
+        Returns:
+            tuple: (处理后的图像, 坐标还原比例 (x比例, y比例))，未缩放时比例为 None
         """
         preprocess_start = time.time()
         
         # 读取图像
-        img = cv2.imread(image_path)
+        if isinstance(image_path, np.ndarray):
+            img = image_path
+        else:
+            img = cv2.imread(image_path, cv2.IMREAD_COLOR if need_color else cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise ValueError(f"无法读取图像: {image_path}")
-        
-        # 获取原始尺寸
-        height, width = img.shape[:2]
-        original_size = width * height
+        if not need_color and img.ndim == 3:
+            # 内存中的彩色图像先转灰度，后面的缩放只需处理单通道
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         
         # 优化策略1: 如果图像过大，适当缩小以提升速度
-        max_pixels = 1920 * 1080  # 最大像素数
-        if original_size > max_pixels:
-            scale = (max_pixels / original_size) ** 0.5
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            print(f"[优化] 图像缩放: {width}x{height} -> {new_width}x{new_height} (缩放比例: {scale:.2f})")
+        height, width = img.shape[:2]
+        target_size = self._get_resize_target(width, height)
+        scale = None
+        if target_size is not None:
+            img = self._downscale(img, target_size)
+            # 识别结果乘以该比例还原到原图坐标（宽高取整后比例略有不同，分别计算）
+            scale = (width / target_size[0], height / target_size[1])
         
         # 优化策略2: 增强对比度提高识别准确率
-        # 转换为LAB色彩空间进行对比度增强
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        
-        # 对L通道进行CLAHE增强
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        
-        # 合并通道并转换回BGR
-        enhanced = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
-        
-        # 保存预处理后的图像到临时文件
-        temp_path = image_path.replace('.png', '_optimized.png')
-        cv2.imwrite(temp_path, enhanced)
+        if need_color:
+            # 在LAB色彩空间的L通道上做CLAHE，保留颜色
+            l, a, b = cv2.split(cv2.cvtColor(img, cv2.COLOR_BGR2LAB))
+            l = self._get_clahe().apply(l)
+            enhanced = cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+        else:
+            # 文字识别只依赖亮度，直接在灰度图上做CLAHE，省去LAB往返转换和通道拆分/合并
+            gray = self._get_clahe().apply(img)
+            # PaddleOCR的预处理按三通道图像处理，最后再扩展为三通道
+            enhanced = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
         
         preprocess_time = time.time() - preprocess_start
         print(f"[优化] 图像预处理完成，耗时: {preprocess_time:.3f}秒")
         
-        return temp_path
+        return enhanced, scale
     
-    def smart_region_detection(self, image_path: str, target_text: str = None):
+    def smart_region_detection(self, img: np.ndarray, target_text: str = None):
         """
         优化2: 智能区域检测
         根据目标文字类型，优先处理可能包含目标的区域
+        
+        按优先级逐个生成区域，调用方提前退出时后面的区域不会再被切出
+        
+        Yields:
+            tuple: (区域名, 区域图像视图, 区域左上角偏移)
         """
         if not target_text:
-            return image_path, []
-        
-        # 读取图像获取尺寸信息
-        img = cv2.imread(image_path)
-        if img is None:
-            return image_path, []
+            return
         
         height, width = img.shape[:2]
-        roi_regions = []
         
         # 针对游戏物品的智能区域检测
         if "宝石" in target_text or "装备" in target_text or "物品" in target_text:
             # 游戏物品通常出现在这些区域：
             
             # 1. 右侧区域（通常是物品栏/背包）
-            right_region = img[:, width*2//3:, :]
-            roi_regions.append(("右侧区域", right_region, (width*2//3, 0)))
+            yield "右侧区域", img[:, width*2//3:, :], (width*2//3, 0)
             
             # 2. 底部区域（通常是快捷栏）
-            bottom_region = img[height*3//4:, :, :]
-            roi_regions.append(("底部区域", bottom_region, (0, height*3//4)))
+            yield "底部区域", img[height*3//4:, :, :], (0, height*3//4)
             
             # 3. 中央区域（可能是对话框或界面）
-            center_region = img[height//4:3*height//4, width//4:3*width//4, :]
-            roi_regions.append(("中央区域", center_region, (width//4, height//4)))
-        
-        return image_path, roi_regions
+            yield "中央区域", img[height//4:3*height//4, width//4:3*width//4, :], (width//4, height//4)
     
-    def find_text_speed_optimized(self, image_path: str, target_text: str = None, early_exit: bool = True):
+    def find_text_speed_optimized(self, image_path: Union[str, np.ndarray], target_text: str = None,
+                                  early_exit: bool = True):
         """
         速度优化版本的文字识别
+        
+        Args:
+            image_path: 图像路径，或BGR格式的numpy图像
         """
         total_start = time.time()
         
         try:
             # 步骤1: 图像预处理优化
-            optimized_image_path = self.preprocess_image_for_speed(image_path)
+            optimized_image, scale = self._preprocess_with_scale(image_path)
             
-            # 步骤2: 智能区域检测
-            final_image_path, roi_regions = self.smart_region_detection(optimized_image_path, target_text)
-            
-            # 步骤3: OCR识别
+            # 步骤2: 智能区域检测 + OCR识别
             ocr_start = time.time()
             
             # 如果有ROI区域，优先处理这些区域
-            if roi_regions and target_text:
-                print(f"[优化] 检测到 {len(roi_regions)} 个感兴趣区域，优先处理...")
-                
-                for region_name, region_img, offset in roi_regions:
-                    print(f"[优化] 处理 {region_name}...")
-                    
-                    # 保存区域图像到临时文件
-                    region_path = final_image_path.replace('.png', f'_{region_name}.png')
-                    cv2.imwrite(region_path, region_img)
-                    
-                    # 对区域进行OCR
-                    result = self.ocr.ocr(region_path)
-                    
-                    # 检查是否找到目标
-                    if self._check_target_in_result(result, target_text):
-                        print(f"[优化] 在 {region_name} 找到目标文字，提前退出！")
-                        
-                        # 清理临时文件
-                        self._cleanup_temp_files([optimized_image_path, region_path])
-                        
-                        # 处理结果
-                        processed_result = self._process_ocr_result(result, target_text, offset)
-                        ocr_time = time.time() - ocr_start
-                        total_time = time.time() - total_start
-                        
-                        processed_result['timing'] = {
-                            'model_load': 0.0,
-                            'ocr': ocr_time,
-                            'process': 0.001,
-                            'total': total_time
-                        }
-                        processed_result['early_exit'] = True
-                        processed_result['region_found'] = region_name
-                        
-                        return processed_result
-                    
-                    # 清理区域临时文件
-                    if os.path.exists(region_path):
-                        os.remove(region_path)
-                
-                print("[优化] 所有感兴趣区域都未找到目标，处理完整图像...")
-            
-            # 处理完整图像
-            result = self.ocr.ocr(final_image_path)
+            regions = self.smart_region_detection(optimized_image, target_text)
+            if self.parallel_regions:
+                result, offset, region_name = self._ocr_regions_parallel(optimized_image, regions, target_text)
+            else:
+                result, offset, region_name = self._ocr_regions_sequential(optimized_image, regions, target_text)
             ocr_time = time.time() - ocr_start
             
-            # 清理临时文件
-            self._cleanup_temp_files([optimized_image_path])
-            
             # 处理结果
-            processed_result = self._process_ocr_result(result, target_text)
+            processed_result = self._process_ocr_result(result, target_text, offset, scale)
             
             total_time = time.time() - total_start
             processed_result['timing'] = {
@@ -206,7 +362,9 @@ class SpeedOptimizedOCR:
                 'process': 0.001,
                 'total': total_time
             }
-            processed_result['early_exit'] = False
+            processed_result['early_exit'] = region_name is not None
+            if region_name is not None:
+                processed_result['region_found'] = region_name
             
             return processed_result
             
@@ -223,6 +381,122 @@ class SpeedOptimizedOCR:
                 }
             }
     
+    def set_parallel_regions(self, enabled: bool):
+        """设置是否并行识别感兴趣区域和完整图像"""
+        self.parallel_regions = enabled
+        print(f"[优化] 区域并行识别: {'开启' if enabled else '关闭'}")
+    
+    def _ocr_regions_sequential(self, image, regions, target_text):
+        """
+        按顺序逐个识别感兴趣区域，找到目标即提前退出，都未找到时识别完整图像
+        
+        Returns:
+            tuple: (PaddleOCR结果, 结果坐标偏移, 找到目标的区域名或 None)
+        """
+        region_count = 0
+        for region_name, region_img, offset in regions:
+            region_count += 1
+            print(f"[优化] 优先处理感兴趣区域: {region_name}...")
+            
+            # 对区域进行OCR（区域图像是预处理结果的视图，直接传入）
+            result = self._run_ocr(region_img)
+            
+            # 检查是否找到目标
+            if self._check_target_in_result(result, target_text):
+                print(f"[优化] 在 {region_name} 找到目标文字，提前退出！")
+                return result, offset, region_name
+        
+        if region_count:
+            print(f"[优化] {region_count} 个感兴趣区域都未找到目标，处理完整图像...")
+        
+        # 处理完整图像
+        return self._run_ocr(image), (0, 0), None
+    
+    def _ocr_regions_parallel(self, image, regions, target_text):
+        """
+        感兴趣区域和完整图像同时提交到线程池识别，最先找到目标的结果直接返回；
+        最坏耗时从各区域耗时之和变为其中最长的一个
+        
+        找到目标后取消尚未开始的任务立即返回，不等待已在执行的任务；
+        它们结束后自行把借用的实例归还实例池
+        
+        Returns:
+            tuple: (PaddleOCR结果, 结果坐标偏移, 找到目标的区域名或 None)
+        """
+        regions = list(regions)
+        if not regions:
+            return self._run_ocr(image), (0, 0), None
+        
+        print(f"[优化] 并行处理 {len(regions)} 个感兴趣区域和完整图像...")
+        futures = {self._region_pool.submit(self._run_ocr, region_img): (region_name, offset)
+                   for region_name, region_img, offset in regions}
+        full_future = self._region_pool.submit(self._run_ocr, image)
+        futures[full_future] = (None, (0, 0))
+        
+        try:
+            for future in as_completed(futures):
+                region_name, offset = futures[future]
+                result = future.result()
+                if self._check_target_in_result(result, target_text):
+                    if region_name is not None:
+                        print(f"[优化] 在 {region_name} 找到目标文字，提前退出！")
+                    return result, offset, region_name
+            
+            # 所有区域都未找到目标，使用完整图像的结果
+            return full_future.result(), (0, 0), None
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def ocr_all_texts(self, image_path: Union[str, np.ndarray]):
+        """对整张图像做一次OCR，返回PaddleOCR原始结果（坐标属于预处理缩放后的图像）"""
+        return self._run_ocr(self.preprocess_image_for_speed(image_path))
+    
+    def find_texts_batch(self, image_path: Union[str, np.ndarray], target_texts):
+        """
+        批量查找多个目标文字，整张图像只做一次OCR
+        
+        逐个目标调用 find_text_speed_optimized 会让同一张图重复推理N次；
+        这里识别一次后对每个目标只做字符串匹配，不再按区域提前退出。
+        
+        Returns:
+            dict: 目标文字 -> 与 find_text_speed_optimized 相同格式的结果
+        """
+        total_start = time.time()
+        
+        try:
+            ocr_start = time.time()
+            image, scale = self._preprocess_with_scale(image_path)
+            result = self._run_ocr(image)
+            ocr_time = time.time() - ocr_start
+            
+            results = {}
+            for target_text in target_texts:
+                processed_result = self._process_ocr_result(result, target_text, scale=scale)
+                processed_result['timing'] = {
+                    'model_load': 0.0,
+                    'ocr': ocr_time,
+                    'process': 0.001,
+                    'total': time.time() - total_start
+                }
+                processed_result['early_exit'] = False
+                results[target_text] = processed_result
+            return results
+            
+        except Exception as e:
+            total_time = time.time() - total_start
+            error_result = {
+                'success': False,
+                'error': f'批量识别过程出错: {str(e)}',
+                'timing': {
+                    'model_load': 0.0,
+                    'ocr': 0.0,
+                    'process': 0.0,
+                    'total': total_time
+                }
+            }
+            return {target_text: dict(error_result) for target_text in target_texts}
+    
     def _check_target_in_result(self, result, target_text):
         """检查OCR结果中是否包含目标文字"""
         if not result or not isinstance(result, list) or len(result) == 0:
@@ -232,15 +506,44 @@ class SpeedOptimizedOCR:
         if not isinstance(ocr_data, dict) or 'rec_texts' not in ocr_data:
             return False
         
-        texts = ocr_data['rec_texts']
-        for text in texts:
-            if target_text in text:
-                return True
+        # 所有文字用\x00连接后做一次C层面的子串查找，\x00分隔可避免跨文字误匹配
+        return target_text in "\x00".join(ocr_data['rec_texts'])
+    
+    def _polys_to_bboxes(self, polys, offset=(0, 0), scale=None):
+        """
+        把文字多边形批量转换为外接矩形 [x1, y1, x2, y2]（加上区域偏移，再按 scale 还原到原图坐标）
         
-        return False
+        所有多边形一次性转为 (N, 点数, 2) 数组，安装了numba时用编译后的内核计算，
+        否则用numpy按轴求最小/最大值
+        """
+        if len(polys) == 0:
+            return []
+        
+        try:
+            points = np.asarray(polys)
+        except ValueError:
+            points = None
+        if points is None or points.ndim != 3:
+            # 各多边形点数不一致时逐个计算
+            return [self._polys_to_bboxes([poly], offset, scale)[0] for poly in polys]
+        
+        if NUMBA_AVAILABLE:
+            # 整数坐标统一为int64（避免int16加偏移溢出），浮点坐标统一为float64，内核只需两种特化
+            dtype = np.int64 if np.issubdtype(points.dtype, np.integer) else np.float64
+            bboxes = _polys_to_bboxes_jit(points.astype(dtype, copy=False), int(offset[0]), int(offset[1]))
+        else:
+            # 整数坐标与偏移相加时提升为int64，避免int16溢出
+            points = points + np.asarray(offset, dtype=np.int64)
+            bboxes = np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+        
+        if scale is not None:
+            scaled = bboxes * np.array([scale[0], scale[1], scale[0], scale[1]])
+            # 整数坐标还原后仍取整为整数
+            bboxes = np.rint(scaled).astype(np.int64) if np.issubdtype(bboxes.dtype, np.integer) else scaled
+        return bboxes.tolist()
     
-    def _process_ocr_result(self, result, target_text=None, offset=(0, 0)):
-        """处理OCR结果"""
+    def _process_ocr_result(self, result, target_text=None, offset=(0, 0), scale=None):
+        """处理OCR结果（scale 为预处理缩放的还原比例，位置统一返回原图坐标）"""
         if not result or not isinstance(result, list) or len(result) == 0:
             return {
                 'success': False,
@@ -259,21 +562,18 @@ class SpeedOptimizedOCR:
         polys = ocr_data.get('rec_polys', [])
         
         found_targets = []
-        offset_x, offset_y = offset
+        bboxes = self._polys_to_bboxes(polys, offset, scale)
+        # 先对连接后的全部文字做一次查找，不包含目标时跳过逐条匹配
+        has_target = bool(target_text) and target_text in "\x00".join(texts)
         
         for i, text in enumerate(texts):
             confidence = scores[i] if i < len(scores) else 0.0
             
-            # 计算位置（考虑偏移）
-            position = None
-            if i < len(polys):
-                poly = polys[i]
-                x_coords = [point[0] + offset_x for point in poly]
-                y_coords = [point[1] + offset_y for point in poly]
-                position = (min(x_coords), min(y_coords), max(x_coords), max(y_coords))
+            # 位置（已考虑偏移和缩放，为原图坐标）
+            position = tuple(bboxes[i]) if i < len(bboxes) else None
             
             # 检查是否是目标文字
-            if target_text and target_text in text:
+            if has_target and target_text in text:
                 found_targets.append({
                     'text': text,
                     'confidence': confidence,
@@ -287,15 +587,6 @@ class SpeedOptimizedOCR:
             'total_texts': len(texts),
             'processed_texts': len(texts)
         }
-    
-    def _cleanup_temp_files(self, file_paths):
-        """清理临时文件"""
-        for file_path in file_paths:
-            if os.path.exists(file_path) and '_optimized' in file_path:
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
 
 # 全局实例
 _speed_optimized_ocr = None
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+后台队列日志 - 各入口脚本共用
+
+调用线程只把日志记录放入队列，由唯一的后台线程统一写控制台，打怪循环、截图、
+OCR请求等热路径不会被控制台输出阻塞。模块导入时只创建日志器，不启动任何线程；
+由入口脚本调用 setup_queue_logging 启用，重复调用只会启动一个后台输出线程。
+"""
+
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+_setup_lock = threading.Lock()
+_queue_handler = None
+
+
+def setup_queue_logging(*names):
+    """
+    为指定名称的日志器启用队列日志（可重复调用）
+
+    第一次调用时创建共用的队列和后台输出线程（进程退出时自动停止），
+    之后只把尚未接入的日志器挂到同一个队列上。
+
+    Args:
+        names: 日志器名称，例如 'start_game'、'ocr'
+    """
+    global _queue_handler
+    with _setup_lock:
+        if _queue_handler is None:
+            log_queue = queue.Queue(-1)
+            listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+            listener.start()
+            atexit.register(listener.stop)
+            _queue_handler = QueueHandler(log_queue)
+
+        for name in names:
+            logger = logging.getLogger(name)
+            if _queue_handler not in logger.handlers:
+                logger.addHandler(_queue_handler)
+                logger.propagate = False
+
+
+def flush_queue_logging():
+    """
+    等待队列中已有的日志全部写到控制台（未启用队列日志时直接返回）
+
+    交互式提示（input）之前调用，保证之前的日志出现在提示之前。
+    """
+    if _queue_handler is not None:
+        _queue_handler.queue.join()
@@ -6,17 +6,21 @@
 
 from template_equipment_detector import TemplateEquipmentDetector, EquipmentMatch
 from mouse_keyboard_controller import get_controller
+from queue_logging import flush_queue_logging, setup_queue_logging
+import logging
 import time
 import os
-import threading
+
+# 检测回调中的报告通过日志输出：每次发现装备只写一次，INFO 关闭时不做任何格式化。
+# 由 main 接入后台队列日志（导入本模块时不添加处理器）；input() 提示前先等队列写完，保证输出顺序
+log = logging.getLogger('realtime_monitor')
+log.setLevel(logging.INFO)
 
 class RealtimeMonitor:
     """实时装备监测器"""
     
     def __init__(self):
         self.detector = TemplateEquipmentDetector()
-        self.is_paused = False
-        self.pause_lock = threading.Lock()
         self.detection_count = 0
         
     def setup_detector(self):
@@ -29,6 +33,9 @@ class RealtimeMonitor:
         # 设置匹配阈值
         self.detector.set_match_threshold(0.7)
         
+        # 截屏与匹配分线程运行，匹配总是取最新一帧；等待用户输入期间截屏不受影响
+        self.detector.set_pipeline_latest_only(True)
+        
         # 加载模板
         loaded_count = 0
         
@@ -46,80 +53,78 @@ class RealtimeMonitor:
         return True
     
     def equipment_detected_callback(self, match: EquipmentMatch):
-        """装备检测回调函数"""
-        with self.pause_lock:
-            if self.is_paused:
-                return  # 如果已经暂停，忽略新检测
-            
-            self.is_paused = True  # 暂停检测
+        """装备检测回调函数（在流水线回调线程中执行）"""
+        # 暂停匹配：等待用户操作期间匹配线程阻塞等待，截屏线程继续刷新最新帧
+        self.detector.pause_detection()
         
         self.detection_count += 1
         x, y, w, h = match.position
         center_x, center_y = x + w//2, y + h//2
         
-        # 注意：这里显示的是从检测开始到发现装备的时间间隔
-        # 实际的单次检测耗时已经在检测器中输出了
-        time_since_detection = (time.time() - match.timestamp) * 1000  # 转换为毫秒
-        
         # 记录最终识别开始时间
         final_recognition_start = time.time()
-
-        print("\n" + "="*60)
-        print(f"🎯 第{self.detection_count}次检测 - 发现目标装备!")
-        print("="*60)
-        print(f"装备名称: {match.equipment_name}")
-        print(f"置信度: {match.confidence:.3f} ({match.confidence*100:.1f}%)")
-        # 检测耗时已经在检测器中实时输出，这里不再重复显示
-        print(f"左上角坐标: ({x}, {y})")
-        print(f"中心坐标: ({center_x}, {center_y})  ← 点击坐标")
-        print(f"右下角坐标: ({x+w}, {y+h})")
-        print(f"装备尺寸: {w}x{h} 像素")
-        print(f"模板缩放: {match.template_scale:.2f}x")
-        print(f"发现时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(match.timestamp))}")
-        print("="*60)
+        
+        if log.isEnabledFor(logging.INFO):
+            # 检测耗时已经在检测器中实时输出，这里不再重复显示
+            log.info("\n%s\n"
+                     "🎯 第%d次检测 - 发现目标装备!\n"
+                     "%s\n"
+                     "装备名称: %s\n"
+                     "置信度: %.3f (%.1f%%)\n"
+                     "左上角坐标: (%d, %d)\n"
+                     "中心坐标: (%d, %d)  ← 点击坐标\n"
+                     "右下角坐标: (%d, %d)\n"
+                     "装备尺寸: %dx%d 像素\n"
+                     "模板缩放: %.2fx\n"
+                     "发现时间: %s\n"
+                     "%s\n"
+                     "🎁 正在自动捡装备: (%d, %d)\n"
+                     "🏃 第一步: 移动到装备位置...\n"
+                     "💆 第二步: 持续2秒左键点击拾取...",
+                     "=" * 60, self.detection_count, "=" * 60,
+                     match.equipment_name, match.confidence, match.confidence * 100,
+                     x, y, center_x, center_y, x + w, y + h, w, h, match.template_scale,
+                     time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(match.timestamp)),
+                     "=" * 60, center_x, center_y)
         
         # 自动捡装备（移动+持续左键点击）
         controller = get_controller()
-        print(f"🎁 正在自动捡装备: ({center_x}, {center_y})")
-        print(f"🏃 第一步: 移动到装备位置...")
-        print(f"💆 第二步: 持续2秒左键点击拾取...")
-        
         pickup_result = controller.pickup_equipment(center_x, center_y, pickup_duration=2.0)
         
         if pickup_result.success:
-            print(f"✅ 自动捡装备成功! 总耗时: {pickup_result.click_time:.2f}ms")
+            log.info("✅ 自动捡装备成功! 总耗时: %.2fms", pickup_result.click_time)
         else:
-            print(f"❌ 自动捡装备失败: {pickup_result.error_message}")
-            print(f"   拾取耗时: {pickup_result.click_time:.2f}ms")
+            log.info("❌ 自动捡装备失败: %s\n   拾取耗时: %.2fms",
+                     pickup_result.error_message, pickup_result.click_time)
         
         # 等待用户输入
         try:
+            flush_queue_logging()
             user_input = input("按 Enter 继续监测，输入 'q' 退出，输入 's' 查看统计: ")
             
             # 记录最终识别结束时间
             final_recognition_end = time.time()
             final_recognition_cost = (final_recognition_end - final_recognition_start) * 1000  # ms
-            print(f"最终识别装备耗时: {final_recognition_cost:.2f}ms")
+            log.info("最终识别装备耗时: %.2fms", final_recognition_cost)
 
             if user_input.lower() == 'q':
-                print("正在退出监测...")
+                log.info("正在退出监测...")
                 self.detector.stop_realtime_detection()
                 return
             elif user_input.lower() == 's':
                 self.show_statistics()
             else:
-                print("继续监测中...")
+                log.info("继续监测中...")
                 
         except KeyboardInterrupt:
-            print("\n用户中断，退出监测...")
+            log.info("\n用户中断，退出监测...")
             self.detector.stop_realtime_detection()
             return
         
-        # 恢复检测
-        with self.pause_lock:
-            self.is_paused = False
+        # 恢复检测（暂停期间积压的检测结果会被丢弃）
+        self.detector.resume_detection()
         
-        print("🔍 监测已恢复...")
+        log.info("🔍 监测已恢复...")
     
     def show_statistics(self):
         """显示统计信息"""
@@ -142,15 +147,15 @@ class RealtimeMonitor:
         print("-" * 60)
         
         try:
-            # 启动实时检测
-            self.detector.start_realtime_detection(
+            # 启动流水线检测（截屏 -> 匹配 -> 回调 各自独立线程）
+            self.detector.run_pipeline(
                 self.equipment_detected_callback, 
                 fps=fps
             )
             
-            # 主循环 - 保持程序运行
-            while True:
-                time.sleep(1)
+            # 主循环 - 保持程序运行，回调中选择退出后结束
+            while self.detector.is_running:
+                time.sleep(0.5)
                 
         except KeyboardInterrupt:
             print("\n\n⏹️  用户手动停止监测")
@@ -162,6 +167,8 @@ class RealtimeMonitor:
             print("监测已结束")
 
 def main():
+    setup_queue_logging('realtime_monitor')
+    
     print("🎮 实时装备监测器")
     print("=" * 50)
     print("功能特点:")
@@ -11,42 +11,116 @@
 4. 捡完装备后，恢复打怪循环
 """
 
+import collections
+import heapq
+import itertools
+import logging
+import signal
 import threading
 import time
 import sys
 import os
 from pathlib import Path
+from typing import NamedTuple, Tuple
 import keyboard
+import numpy as np
+import pyautogui
+
+# 打怪/监控线程只把日志放入队列，由后台线程统一写控制台（main() 中启用），控制台输出不会阻塞打怪循环
+log = logging.getLogger('start_game')
+log.setLevel(logging.INFO)
+
+# 打怪循环状态检查时输出的固定文本
+STATUS_OK = "✅ [系统状态] 装备检测正常 | 自动打怪正常 | 自动拾取就绪"
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+from queue_logging import setup_queue_logging
 from template_equipment_detector import TemplateEquipmentDetector
 from mouse_keyboard_controller import MouseKeyboardController, get_controller
+from numba_kernels import any_within_distance, rank_equipment
+
+
+class EquipmentInfo(NamedTuple):
+    """队列中待拾取的装备"""
+    name: str
+    position: Tuple[int, int]  # 中心坐标 x, y
+    confidence: float
+    size: Tuple[int, int]  # width, height
+    timestamp: float
+    distance_sq: int  # 到屏幕中心的平方距离
 
 
 class GameController:
     """游戏主控制器"""
     
+    # 属性固定，不需要每个实例的 __dict__，打怪循环中的属性访问也更快
+    __slots__ = (
+        'controller', 'detector', 'is_running', 'is_fighting', 'equipment_found',
+        'equipment_position', '_recent_matches', 'recent_match_max_age', 'error_log_interval', '_last_callback_error_time',
+        '_suppressed_callback_errors', 'monitor_thread', 'fight_thread', 'should_stop',
+        '_equipment_event', '_detector_died', 'watchdog_interval', 'status_check_interval', 'shutdown_timeout',
+        'equipment_queue', '_queue_counter', '_queue_positions', '_queue_len',
+        'duplicate_threshold', '_pickup_idle', 'pickup_lock', 'last_pickup_time',
+        'pickup_cooldown', '_verification_enabled', 'screen_width', 'screen_height', 'fight_interval',
+        'move_interval', 'random_move_count', 'max_random_moves', 'pickup_safe_distance',
+        'verbose', 'movement_radius', 'circle_lut_size', '_circle_lut',
+        'screen_center_x', 'screen_center_y', 'movement_mode', 'movement_area',
+        'position_batch_size', '_position_batch', '_position_index',
+        'template_dir', 'template_dir_recheck_interval', '_template_dir_ok', '_template_dir_checked_at',
+    )
+    
     def __init__(self):
         self.controller = get_controller()
         self.detector = None
+        # 模板目录是否存在只在创建时检查一次；不存在时最多每 template_dir_recheck_interval 秒重新检查
+        self.template_dir = project_root / "templates"
+        self.template_dir_recheck_interval = 10.0
+        self._template_dir_ok = self.template_dir.is_dir()
+        self._template_dir_checked_at = time.monotonic()
         self.is_running = False
         self.is_fighting = False  # 是否正在打怪
         self.equipment_found = False  # 是否发现装备
         self.equipment_position = None  # 装备位置
+        # 后台检测线程最近上报的匹配结果（deque 追加是原子操作，不需要加锁），
+        # 智能拾取直接读取，不再自己重新截屏匹配
+        self._recent_matches = collections.deque(maxlen=64)
+        self.recent_match_max_age = 0.3  # 视为当前画面结果的最长时间（秒），约 6 帧 @20FPS
+        # 检测回调以 20FPS 运行，持续出错时限制完整堆栈的输出频率
+        self.error_log_interval = 5.0  # 检测回调/打怪循环两次输出异常堆栈的最小间隔（秒）
+        self._last_callback_error_time = float('-inf')
+        self._suppressed_callback_errors = 0  # 上次输出后被忽略的异常次数
         self.monitor_thread = None
         self.fight_thread = None
-        self.should_stop = False  # Ctrl+Q停止标志
-        self.stop_lock = threading.Lock()  # 停止锁
+        # 线程间通知：等待方阻塞在 wait() 上，set() 时立即唤醒，不再按固定间隔轮询标志。
+        # 停止标志只会从未置位变为置位，用 Event 即可，不需要额外加锁
+        self.should_stop = threading.Event()  # Ctrl+Q停止标志
+        self._equipment_event = threading.Event()  # 发现新装备（停止时也会置位，用于唤醒打怪线程）
+        self._detector_died = threading.Event()  # 检测线程退出（停止时也会置位，用于唤醒监控线程）
+        self.watchdog_interval = 30.0  # 监控线程兜底检查检测器状态的间隔（秒）
+        self.status_check_interval = 10.0  # 打怪循环输出系统状态的间隔（秒），也是空闲时最长的等待时间
+        self.shutdown_timeout = 3.0  # 停止时等待所有后台线程退出的总时间（秒）
         
         # 增强的装备拾取管理
-        self.equipment_queue = []  # 装备队列
-        self.is_picking_up = False  # 是否正在拾取装备
+        # 装备队列：按到屏幕中心平方距离排列的最小堆，元素为 (distance_sq, 序号, EquipmentInfo)，
+        # 序号保证距离相同时不比较装备信息
+        self.equipment_queue = []
+        self._queue_counter = itertools.count()
+        # 队列中装备坐标的镜像：预分配的连续 int32 数组，前 _queue_len 行有效，
+        # 去重时一次比较整块数据，不再逐个遍历字典；满了按两倍扩容
+        self._queue_positions = np.empty((64, 2), dtype=np.int32)
+        self._queue_len = 0
+        self.duplicate_threshold = 30  # 判定为同一装备的距离阈值（像素）
+        # 没有在拾取装备时置位：拾取期间清除，打怪循环阻塞等待它重新置位，而不是轮询标志
+        self._pickup_idle = threading.Event()
+        self._pickup_idle.set()
         self.pickup_lock = threading.Lock()  # 拾取锁
         self.last_pickup_time = 0  # 上次拾取时间
         self.pickup_cooldown = 2.0  # 拾取冷却时间（秒）
+        # 拾取前后的验证目前只是占位实现（总是通过），关闭时直接跳过，不做任何额外工作
+        self._verification_enabled = False
         
         # 游戏参数
         self.screen_width = 1920
@@ -60,7 +134,10 @@ class GameController:
         self.pickup_safe_distance = 50  # 拾取安全距离（像素）
         
         # 现实移动系统参数（基于屏幕坐标）
+        self.verbose = False  # 是否输出每次移动/攻击的详细日志（默认关闭，减少控制台输出）
         self.movement_radius = 150  # 移动半径（像素）
+        self.circle_lut_size = 4096  # 随机移动方向查找表的角度数
+        self._build_circle_lut()
         self.screen_center_x = self.screen_width // 2  # 屏幕中心X（固定）
         self.screen_center_y = self.screen_height // 2  # 屏幕中心Y（固定）
         
@@ -75,195 +152,241 @@ class GameController:
             'max_y': int(self.screen_height * 0.7)   # 屏幕70%位置
         }
         
+        # 随机移动位置批量预生成，打怪循环每次只取一个
+        self.position_batch_size = 1024
+        self._position_batch = []
+        self._position_index = 0
+        
     def equipment_detected_callback(self, match):
-        """装备检测回调函数 - 增强版支持队列管理"""
+        """装备检测回调函数（在检测线程中执行）
+        
+        只做去重并把新装备放入队列，拾取由打怪循环完成，检测线程不会被拾取动作阻塞。
+        同一件装备在拾取前每帧都会被检测到，重复结果直接返回，不创建对象也不输出日志
+        """
         try:
+            self._recent_matches.append(match)
+            
             # 从 position元组中获取坐标和尺寸
             x, y, w, h = match.position
             center_x = x + w // 2
             center_y = y + h // 2
             
-            equipment_info = {
-                'name': match.equipment_name,
-                'position': (center_x, center_y),
-                'confidence': match.confidence,
-                'size': (w, h),
-                'timestamp': time.time(),
-                'distance': self._calculate_distance_to_center(center_x, center_y)
-            }
-            
-            print(f"\n[EQUIPMENT] 发现装备: {equipment_info['name']}")
-            print(f"[EQUIPMENT] 位置: ({center_x}, {center_y}), 置信度: {equipment_info['confidence']:.3f}")
-            print(f"[EQUIPMENT] 距离中心: {equipment_info['distance']:.1f} 像素")
-            
             # 线程安全地添加到装备队列
             with self.pickup_lock:
-                # 检查是否已存在相似位置的装备（避免重复检测）
-                is_duplicate = False
-                for existing_eq in self.equipment_queue:
-                    if self._is_same_equipment(equipment_info, existing_eq):
-                        is_duplicate = True
-                        break
+                # 检查是否已存在相似位置的装备（避免重复检测），比较平方距离无需开方
+                if any_within_distance(self._queue_positions[:self._queue_len],
+                                       center_x, center_y, self.duplicate_threshold):
+                    return
                 
-                if not is_duplicate:
-                    self.equipment_queue.append(equipment_info)
-                    # 按距离排序，优先拾取最近的装备
-                    self.equipment_queue.sort(key=lambda eq: eq['distance'])
-                    
-                    print(f"[EQUIPMENT] 装备已加入队列，当前队列长度: {len(self.equipment_queue)}")
-                    
-                    # 设置装备发现标志
-                    if not self.equipment_found:
-                        self.equipment_found = True
-                        print(f"[EQUIPMENT] 设置装备发现标志，准备暂停战斗")
-                else:
-                    print(f"[EQUIPMENT] 装备重复检测，忽略")
+                equipment_info = EquipmentInfo(
+                    name=match.equipment_name,
+                    position=(center_x, center_y),
+                    confidence=match.confidence,
+                    size=(w, h),
+                    timestamp=time.time(),
+                    distance_sq=self._distance_sq_to_center(center_x, center_y)
+                )
+                heapq.heappush(self.equipment_queue,
+                               (equipment_info.distance_sq, next(self._queue_counter), equipment_info))
+                self._add_queue_position(center_x, center_y)
+                queue_length = len(self.equipment_queue)
+                
+                # 设置装备发现标志
+                self.equipment_found = True
+            
+            # 立即唤醒打怪线程
+            self._equipment_event.set()
+            
+            log.info("[EQUIPMENT] 发现装备: %s 位置: (%s, %s), 置信度: %.3f, 距离中心: %.1f 像素, 当前队列长度: %s",
+                     equipment_info.name, center_x, center_y, equipment_info.confidence,
+                     equipment_info.distance_sq ** 0.5, queue_length)
             
         except Exception as e:
-            print(f"[ERROR] 装备检测回调异常: {e}")
-            import traceback
-            traceback.print_exc()
+            now = time.monotonic()
+            if now - self._last_callback_error_time >= self.error_log_interval:
+                self._last_callback_error_time = now
+                suppressed = self._suppressed_callback_errors
+                self._suppressed_callback_errors = 0
+                log.exception("[ERROR] 装备检测回调异常: %s（此前 %s 次异常未输出）", e, suppressed)
+            else:
+                self._suppressed_callback_errors += 1
+    
+    def _distance_sq_to_center(self, x, y):
+        """计算到屏幕中心的平方距离（仅用于排序比较，无需开方）"""
+        dx = x - self.screen_center_x
+        dy = y - self.screen_center_y
+        return dx * dx + dy * dy
     
-    def _calculate_distance_to_center(self, x, y):
-        """计算到屏幕中心的距离"""
-        center_x = self.screen_width // 2
-        center_y = self.screen_height // 2
-        return ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
+    def _add_queue_position(self, x, y):
+        """向坐标镜像数组追加一个坐标（调用方持有 pickup_lock）"""
+        n = self._queue_len
+        if n == self._queue_positions.shape[0]:
+            grown = np.empty((n * 2, 2), dtype=np.int32)
+            grown[:n] = self._queue_positions
+            self._queue_positions = grown
+        self._queue_positions[n, 0] = x
+        self._queue_positions[n, 1] = y
+        self._queue_len = n + 1
     
-    def _is_same_equipment(self, eq1, eq2, threshold=30):
-        """判断是否是同一个装备（基于位置距离）"""
-        x1, y1 = eq1['position']
-        x2, y2 = eq2['position']
-        distance = ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
-        return distance < threshold
+    def _remove_queue_position(self, position):
+        """从坐标镜像数组中移除一个已出队装备的坐标（调用方持有 pickup_lock）
+        
+        用最后一行覆盖被移除的行，不搬移其余数据（去重不关心顺序）
+        """
+        n = self._queue_len
+        hits = np.flatnonzero((self._queue_positions[:n] == position).all(axis=1))
+        if hits.size:
+            last = n - 1
+            self._queue_positions[hits[0]] = self._queue_positions[last]
+            self._queue_len = last
         
     def setup_keyboard_listener(self):
         """设置键盘监听器"""
-        def on_hotkey():
-            with self.stop_lock:
-                if not self.should_stop:
-                    self.should_stop = True
-                    print("\n\n🛑 检测到 Ctrl+Q 快捷键，正在停止游戏脚本...")
-                    
-                    # 设置停止标志，让所有线程自然退出
-                    self.is_running = False
-                    self.is_fighting = False
-                    
-                    # 在stop方法中统一停止装备检测，而不是在这里立即停止
-                    print("[HOTKEY] 正在停止所有进程...")
-        
-        # 注册Ctrl+Q热键
-        keyboard.add_hotkey('ctrl+q', on_hotkey)
-        print("⌨️  已注册 Ctrl+Q 快捷键 (随时可停止脚本)")
+        # 注册Ctrl+Q热键。回调在 keyboard 库的事件分发线程中执行，只发出停止信号（几次 Event.set），
+        # 日志输出和状态清理都交给主线程中的 stop()，不拖慢其他按键事件
+        keyboard.add_hotkey('ctrl+q', self._signal_stop)
+        log.info("⌨️  已注册 Ctrl+Q 快捷键 (随时可停止脚本)")
         
+    def _signal_stop(self):
+        """通知所有线程停止：唤醒等待中的打怪线程、监控线程和主线程"""
+        self.should_stop.set()
+        self._equipment_event.set()
+        self._detector_died.set()
+    
     def start_equipment_monitor(self):
         """启动装备监控线程"""
-        print(f"[INFO] 启动装备监控...")
+        log.info("[INFO] 启动装备监控...")
         
         try:
-            # 初始化装备检测器
-            print(f"[INFO] 初始化装备检测器...")
-            self.detector = TemplateEquipmentDetector()
-            print(f"[INFO] 装备检测器初始化成功")
-            
-            # 加载装备模板（从 templates 文件夹）
-            template_dir = project_root / "templates"
-            print(f"[INFO] 模板目录: {template_dir}")
-            
-            if template_dir.exists():
-                print(f"[INFO] 正在加载装备模板...")
-                loaded_count = self.detector.load_templates_from_folder(str(template_dir))
-                print(f"[INFO] 成功加载 {loaded_count} 个装备模板")
-                
-                if loaded_count == 0:
-                    print(f"[WARNING] 未加载到任何装备模板！")
-                    return
+            # 再次启动时复用已加载模板的检测器，不再重新读盘、解码和构建模板金字塔
+            if self.detector is not None and self.detector.templates:
+                log.info("[INFO] 复用已加载的 %s 个装备模板", len(self.detector.templates))
             else:
-                print(f"[ERROR] 模板目录不存在: {template_dir}")
-                return
+                self._load_detector()
+                if self.detector is None:
+                    return
             
             # 启动监控线程
-            print(f"[INFO] 创建监控线程...")
+            log.info("[INFO] 创建监控线程...")
             self.monitor_thread = threading.Thread(
                 target=self._equipment_monitor_loop,
                 daemon=True,
                 name="EquipmentMonitor"
             )
             
-            print(f"[INFO] 启动监控线程...")
+            log.info("[INFO] 启动监控线程...")
             self.monitor_thread.start()
             
-            # 等待一下让线程初始化
-            import time
-            time.sleep(0.5)
+            # 等待一下让线程初始化（收到停止信号时立即返回）
+            self.should_stop.wait(0.5)
             
             # 检查线程状态
             thread_alive = self.monitor_thread.is_alive() if self.monitor_thread else False
             detector_running = self.detector.is_running if self.detector else False
             
-            print(f"[INFO] 监控线程状态: {thread_alive}")
-            print(f"[INFO] 检测器状态: {detector_running}")
+            log.info("[INFO] 监控线程状态: %s", thread_alive)
+            log.info("[INFO] 检测器状态: %s", detector_running)
             
             if not thread_alive:
-                print(f"[ERROR] 监控线程启动失败！")
+                log.error("[ERROR] 监控线程启动失败！")
             
         except Exception as e:
-            print(f"[ERROR] 启动装备监控失败: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("[ERROR] 启动装备监控失败: %s", e)
+        
+    def _load_detector(self):
+        """创建装备检测器并从 templates 文件夹加载模板，失败时 self.detector 为 None"""
+        self.detector = None
         
+        # 初始化装备检测器
+        log.info("[INFO] 初始化装备检测器...")
+        detector = TemplateEquipmentDetector()
+        log.info("[INFO] 装备检测器初始化成功")
+        
+        # 加载装备模板（从 templates 文件夹）
+        log.info("[INFO] 模板目录: %s", self.template_dir)
+        
+        if not self.template_dir_available():
+            log.error("[ERROR] 模板目录不存在: %s", self.template_dir)
+            return
+        
+        log.info("[INFO] 正在加载装备模板...")
+        loaded_count = detector.load_templates_from_folder(str(self.template_dir))
+        log.info("[INFO] 成功加载 %s 个装备模板", loaded_count)
+        
+        if loaded_count == 0:
+            log.warning("[WARNING] 未加载到任何装备模板！")
+            return
+        
+        self.detector = detector
+        
+    def template_dir_available(self):
+        """模板目录是否存在（使用缓存结果，不存在时按间隔重新检查，目录可能稍后才创建）"""
+        if not self._template_dir_ok:
+            now = time.monotonic()
+            if now - self._template_dir_checked_at >= self.template_dir_recheck_interval:
+                self._template_dir_ok = self.template_dir.is_dir()
+                self._template_dir_checked_at = now
+        return self._template_dir_ok
+    
     def _equipment_monitor_loop(self):
         """装备监控循环（后台线程）"""
         try:
-            print(f"[MONITOR] 启动装备检测线程...")
-            print(f"[MONITOR] 检测器初始状态: is_running={self.detector.is_running}")
-            print(f"[MONITOR] 游戏控制器状态: is_running={self.is_running}")
+            log.info("[MONITOR] 启动装备检测线程...")
+            log.info("[MONITOR] 检测器初始状态: is_running=%s", self.detector.is_running)
+            log.info("[MONITOR] 游戏控制器状态: is_running=%s", self.is_running)
+            
+            # 检测线程退出时立即唤醒本线程
+            self.detector.set_stop_callback(self._detector_died.set)
             
             # 启动检测器（非阻塞调用）
-            print(f"[MONITOR] 正在调用 start_realtime_detection...")
+            log.info("[MONITOR] 正在调用 start_realtime_detection...")
             self.detector.start_realtime_detection(
                 callback=self.equipment_detected_callback,
                 fps=20  # 20FPS高频检测
             )
-            print(f"[MONITOR] start_realtime_detection 调用完成，检测器已启动")
+            log.info("[MONITOR] start_realtime_detection 调用完成，检测器已启动")
             
             # 监控线程保持运行，直到游戏系统停止
-            print(f"[MONITOR] 监控线程开始保持运行...")
-            while self.is_running:
-                # 检查检测器状态
-                if not self.detector.is_running:
-                    print(f"[MONITOR] 检测器已停止，尝试重启...")
+            log.info("[MONITOR] 监控线程开始保持运行...")
+            while self.is_running and not self.should_stop.is_set():
+                # 等待检测线程退出的通知；超时后兜底检查一次状态
+                if self._detector_died.wait(timeout=self.watchdog_interval):
+                    self._detector_died.clear()
+                if not self.is_running or self.should_stop.is_set():
+                    break
+                
+                # 检查检测器状态（其他地方可能已经重启或替换了检测器，每轮取一次当前实例）
+                detector = self.detector
+                if not detector.is_running:
+                    log.info("[MONITOR] 检测器已停止，尝试重启...")
                     try:
-                        self.detector.start_realtime_detection(
+                        detector.start_realtime_detection(
                             callback=self.equipment_detected_callback,
                             fps=20
                         )
-                        print(f"[MONITOR] 检测器重启成功")
+                        log.info("[MONITOR] 检测器重启成功")
                     except Exception as restart_error:
-                        print(f"[MONITOR] 检测器重启失败: {restart_error}")
-                        time.sleep(5)  # 等待5秒后再试
-                
-                time.sleep(1)  # 每秒检查一次
+                        log.warning("[MONITOR] 检测器重启失败: %s", restart_error)
+                        self.should_stop.wait(timeout=5)  # 等待5秒后再试
+                        self._detector_died.set()  # 立即再检查一次
             
-            print(f"[MONITOR] 游戏系统停止，退出监控循环")
+            log.info("[MONITOR] 游戏系统停止，退出监控循环")
                 
         except Exception as e:
-            print(f"[ERROR] 装备监控异常: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("[ERROR] 装备监控异常: %s", e)
         finally:
             # 确保停止检测
             try:
                 if self.detector:
-                    print(f"[MONITOR] finally块: 检测器状态 is_running={self.detector.is_running}")
+                    log.info("[MONITOR] finally块: 检测器状态 is_running=%s", self.detector.is_running)
                     self.detector.stop_realtime_detection()
-                    print(f"[MONITOR] 装备监控已停止")
+                    log.info("[MONITOR] 装备监控已停止")
             except Exception as e:
-                print(f"[WARNING] 停止装备检测异常: {e}")
+                log.warning("[WARNING] 停止装备检测异常: %s", e)
             
     def start_fighting(self):
         """启动打怪线程"""
-        print(f"[COMBAT] 启动自动打怪...")
+        log.info("[COMBAT] 启动自动打怪...")
         
         self.is_fighting = True
         self.fight_thread = threading.Thread(
@@ -272,114 +395,155 @@ class GameController:
         )
         self.fight_thread.start()
         
+    def _release_combat_inputs(self):
+        """释放打怪时可能按住的按键和鼠标键"""
+        try:
+            pyautogui.keyUp('ctrl')  # 释放可能按下的Ctrl键
+            pyautogui.mouseUp(button='left')  # 释放可能按下的鼠标左键
+            pyautogui.mouseUp(button='right')  # 释放可能按下的鼠标右键
+            log.debug("[COMBAT] ✅ 已释放所有按键，确保攻击完全停止")
+        except Exception as key_release_error:
+            log.warning("[COMBAT] ⚠️ 释放按键异常: %s", key_release_error)
+    
     def _fighting_loop(self):
-        """打怪循环（后台线程）"""
-        last_move_time = 0
-        last_attack_time = 0
-        last_monitor_check = 0
+        """打怪循环（start() 中在主线程运行，start_fighting() 中在后台线程运行）"""
+        # 各动作的下一次执行时间点（单调时钟，不受系统时间调整影响），首轮立即执行
+        # 循环内频繁调用的函数和方法绑定为局部变量
+        clock = time.monotonic
+        stop_requested = self.should_stop.is_set
+        wait_for_equipment = self._equipment_event.wait
+        clear_equipment_event = self._equipment_event.clear
+        pickup_idle = self._pickup_idle.is_set
+        # Windows 上主线程阻塞在锁等待中时不会处理 SIGINT，循环中的所有等待都限制在 1 秒以内
+        max_wait = 1.0 if os.name == 'nt' else float('inf')
+        random_position = self.get_random_combat_position
+        move_character = self.controller.move_character
+        attack_skill = self.controller.attack_skill
+        next_move_time = next_attack_time = next_status_time = clock()
+        # 持续出错时限制异常堆栈的输出频率
+        last_error_log_time = float('-inf')
+        suppressed_errors = 0
         
         while self.is_running and self.is_fighting:
             try:
+                # 每轮开始先清除唤醒事件，再检查停止信号和装备标志：之后置位的事件一定对应
+                # 尚未处理的新状态，事件不会一直保持置位而让下面的等待立即返回（空转）
+                clear_equipment_event()
+                
+                # 每轮只读一次时钟（装备拾取分支结束后直接进入下一轮，会重新读取）
+                now = clock()
+                
                 # 检查Ctrl+Q停止信号
-                with self.stop_lock:
-                    if self.should_stop:
-                        print(f"[COMBAT] 收到停止信号，退出打怪循环...")
-                        break
+                if stop_requested():
+                    log.info("[COMBAT] 收到停止信号，退出打怪循环...")
+                    break
                 
-                # 每10秒检查一次装备监控状态
-                current_time = time.time()
-                if current_time - last_monitor_check >= 10:
-                    detector_status = self.detector.is_running if self.detector else False
-                    monitor_status = self.monitor_thread.is_alive() if self.monitor_thread else False
+                # 定期检查一次装备监控状态
+                if now >= next_status_time:
+                    detector = self.detector
+                    monitor_thread = self.monitor_thread
+                    detector_status = detector.is_running if detector else False
+                    monitor_status = monitor_thread.is_alive() if monitor_thread else False
                     # 系统状态显示
                     if detector_status and monitor_status:
-                        print(f"✅ [系统状态] 装备检测正常 | 自动打怪正常 | 自动拾取就绪")
+                        log.info(STATUS_OK)
                     else:
-                        print(f"⚠️  [系统状态] 装备检测={detector_status}, 监控线程={monitor_status}")
-                    last_monitor_check = current_time
+                        log.warning("⚠️  [系统状态] 装备检测=%s, 监控线程=%s", detector_status, monitor_status)
+                        self._ensure_detector_running()
+                    next_status_time = now + self.status_check_interval
                         
+                # 其他线程正在拾取装备（_handle_equipment_pickup）时不移动也不攻击，
+                # 阻塞到拾取结束再继续，最长等到下一次状态检查
+                if not pickup_idle():
+                    self._pickup_idle.wait(timeout=min(max_wait, max(0.0, next_status_time - now)))
+                    continue
+                
                 # 检查是否需要暂停打怪（发现装备）
-                if self.equipment_found and not self.is_picking_up:
-                    print(f"[COMBAT] 🛑 暂停所有战斗行为，开始装备拾取流程...")
+                if self.equipment_found:
+                    log.info("[COMBAT] 🛑 暂停所有战斗行为，开始装备拾取流程...")
                     
                     # 立即停止所有攻击动作
-                    try:
-                        import pyautogui
-                        pyautogui.keyUp('ctrl')  # 释放可能按下的Ctrl键
-                        pyautogui.mouseUp(button='left')  # 释放可能按下的鼠标左键
-                        pyautogui.mouseUp(button='right')  # 释放可能按下的鼠标右键
-                        print(f"[COMBAT] ✅ 已释放所有按键，确保攻击完全停止")
-                    except Exception as key_release_error:
-                        print(f"[COMBAT] ⚠️ 释放按键异常: {key_release_error}")
-                    
-                    # 设置拾取状态，防止重复进入
-                    with self.pickup_lock:
-                        self.is_picking_up = True
+                    self._release_combat_inputs()
                     
                     # 执行装备拾取流程
                     self._process_equipment_queue()
                     
-                    # 拾取完成，恢复战斗
+                    # 拾取完成，恢复战斗（拾取期间队列又有新装备时保留标志，下一轮继续拾取）
                     with self.pickup_lock:
-                        self.is_picking_up = False
-                        self.equipment_found = False
+                        self.equipment_found = bool(self.equipment_queue)
                     
-                    print(f"[COMBAT] ✅ 装备拾取流程完成，恢复战斗状态")
+                    log.info("[COMBAT] ✅ 装备拾取流程完成，恢复战斗状态")
                     continue
-                    
-                current_time = time.time()
                 
                 # 移动角色（每3秒移动一次）
-                if current_time - last_move_time >= self.move_interval:
+                if now >= next_move_time:
                     # 检查是否需要回到初始位置
                     if self.random_move_count >= self.max_random_moves:
-                        print(f"[MOVE] 已完成 {self.random_move_count} 次随机移动，回到游戏世界初始位置")
+                        log.debug("[MOVE] 已完成 %d 次随机移动，回到游戏世界初始位置", self.random_move_count)
                         move_pos = self.return_to_center()
                         self.random_move_count = 0  # 重置计数
-                        print(f"[MOVE] 回到中心位置: ({move_pos[0]}, {move_pos[1]})")
+                        log.debug("[MOVE] 回到中心位置: (%d, %d)", move_pos[0], move_pos[1])
                     else:
                         # 在固定半径圆环内随机移动
-                        move_pos = self.get_random_combat_position()
+                        move_pos = random_position()
                         self.random_move_count += 1
-                        print(f"[MOVE] 随机移动: ({move_pos[0]}, {move_pos[1]}) [计数: {self.random_move_count}/{self.max_random_moves}]")
+                        log.debug("[MOVE] 随机移动: (%d, %d) [计数: %d/%d]", move_pos[0], move_pos[1],
+                                  self.random_move_count, self.max_random_moves)
                     
-                    move_result = self.controller.move_character(
+                    move_result = move_character(
                         move_pos[0], move_pos[1], 0.5
                     )
                     
                     if move_result.success:
-                        print(f"[MOVE] 移动成功")
+                        log.debug("[MOVE] 移动成功")
                     else:
-                        print(f"[MOVE] 移动失败: {move_result.error_message}")
+                        log.warning("[MOVE] 移动失败: %s", move_result.error_message)
                         
-                    last_move_time = current_time
+                    next_move_time = now + self.move_interval
                 
                 # 攻击技能（每1.5秒攻击一次）
-                if current_time - last_attack_time >= self.fight_interval:
+                if now >= next_attack_time:
                     # 在屏幕70%-80%范围内随机攻击
-                    attack_pos = self.get_random_combat_position()
+                    attack_pos = random_position()
                     
-                    print(f"[ATTACK] 攻击技能: ({attack_pos[0]}, {attack_pos[1]})")
-                    attack_result = self.controller.attack_skill(
+                    log.debug("[ATTACK] 攻击技能: (%d, %d)", attack_pos[0], attack_pos[1])
+                    attack_result = attack_skill(
                         attack_pos[0], attack_pos[1]
                     )
                     
                     if attack_result.success:
-                        print(f"[ATTACK] 攻击成功")
+                        log.debug("[ATTACK] 攻击成功")
                     else:
-                        print(f"[ATTACK] 攻击失败: {attack_result.error_message}")
+                        log.warning("[ATTACK] 攻击失败: %s", attack_result.error_message)
                         
-                    last_attack_time = current_time
+                    next_attack_time = now + self.fight_interval
                 
-                # 短暂休息
-                time.sleep(0.1)
+                # 等到下一次移动/攻击/状态检查的时间点，发现装备或停止时立即唤醒
+                next_deadline = min(next_move_time, next_attack_time, next_status_time)
+                wait_for_equipment(timeout=min(max_wait, max(0.0, next_deadline - clock())))
                 
             except Exception as e:
-                print(f"[ERROR] 打怪循环异常: {e}")
-                time.sleep(1)
+                now = clock()
+                if now - last_error_log_time >= self.error_log_interval:
+                    last_error_log_time = now
+                    log.exception("[ERROR] 打怪循环异常: %s（此前 %s 次异常未输出）", e, suppressed_errors)
+                    suppressed_errors = 0
+                else:
+                    suppressed_errors += 1
+                # 出错后稍等再继续，收到停止信号时立即退出
+                if self.should_stop.wait(1):
+                    break
                 
     def _process_equipment_queue(self):
-        """处理装备队列 - 逐一拾取所有装备"""
+        """处理装备队列 - 逐一拾取所有装备（期间清除 _pickup_idle，异常退出时也会恢复）"""
+        self._pickup_idle.clear()
+        try:
+            self._drain_equipment_queue()
+        finally:
+            self._pickup_idle.set()
+    
+    def _drain_equipment_queue(self):
+        """逐一拾取队列中的装备，直到队列为空或收到停止信号"""
         processed_count = 0
         
         while True:
@@ -388,14 +552,15 @@ class GameController:
             with self.pickup_lock:
                 if not self.equipment_queue:
                     break
-                current_equipment = self.equipment_queue.pop(0)  # 取出队列第一个（最近的）
+                _, _, current_equipment = heapq.heappop(self.equipment_queue)  # 取出最近的装备
+                self._remove_queue_position(current_equipment.position)
             
             if not current_equipment:
                 break
                 
             processed_count += 1
-            print(f"\n[PICKUP] 🎯 处理装备 {processed_count}: {current_equipment['name']}")
-            print(f"[PICKUP] 位置: {current_equipment['position']}, 距离: {current_equipment['distance']:.1f}")
+            log.info("\n[PICKUP] 🎯 处理装备 %s: %s", processed_count, current_equipment.name)
+            log.debug("[PICKUP] 位置: %s, 距离: %.1f", current_equipment.position, current_equipment.distance_sq ** 0.5)
             
             # 检查装备是否还存在（拾取前验证）
             if self._verify_equipment_exists(current_equipment):
@@ -403,42 +568,50 @@ class GameController:
                 success = self._pickup_single_equipment(current_equipment)
                 
                 if success:
-                    print(f"[PICKUP] ✅ 装备 {current_equipment['name']} 拾取成功")
+                    log.info("[PICKUP] ✅ 装备 %s 拾取成功", current_equipment.name)
                     # 记录拾取时间
                     self.last_pickup_time = time.time()
                 else:
-                    print(f"[PICKUP] ❌ 装备 {current_equipment['name']} 拾取失败")
+                    log.error("[PICKUP] ❌ 装备 %s 拾取失败", current_equipment.name)
             else:
-                print(f"[PICKUP] ⚠️ 装备 {current_equipment['name']} 已消失，跳过")
+                log.warning("[PICKUP] ⚠️ 装备 %s 已消失，跳过", current_equipment.name)
             
-            # 拾取间隔，避免操作过快
-            time.sleep(0.5)
+            # 拾取间隔，避免操作过快；收到停止信号时不再处理剩余装备
+            if self.should_stop.wait(0.5):
+                log.info("[PICKUP] 收到停止信号，中断拾取")
+                break
         
-        print(f"[PICKUP] 📊 装备拾取完成，共处理 {processed_count} 个装备")
+        log.info("[PICKUP] 📊 装备拾取完成，共处理 %s 个装备", processed_count)
     
     def _verify_equipment_exists(self, equipment_info):
+        """验证装备是否还存在，未启用验证时直接视为存在"""
+        if not self._verification_enabled:
+            return True
+        return self._verify_equipment_exists_impl(equipment_info)
+    
+    def _verify_equipment_exists_impl(self, equipment_info):
         """验证装备是否还存在（简单的重新检测）"""
         try:
             # 在装备位置附近进行小范围检测
-            x, y = equipment_info['position']
+            x, y = equipment_info.position
             
             # 简单的存在性检查：截取装备区域并进行模板匹配
             # 这里可以实现更复杂的验证逻辑
-            print(f"[VERIFY] 验证装备是否存在: ({x}, {y})")
+            log.debug("[VERIFY] 验证装备是否存在: (%s, %s)", x, y)
             
             # 暂时返回True，实际项目中可以实现真正的验证
             return True
             
         except Exception as e:
-            print(f"[VERIFY] 装备验证异常: {e}")
+            log.warning("[VERIFY] 装备验证异常: %s", e)
             return False
     
     def _pickup_single_equipment(self, equipment_info):
         """拾取单个装备并验证成功"""
         try:
-            x, y = equipment_info['position']
+            x, y = equipment_info.position
             
-            print(f"[PICKUP] 开始拾取装备: {equipment_info['name']} at ({x}, {y})")
+            log.debug("[PICKUP] 开始拾取装备: %s at (%s, %s)", equipment_info.name, x, y)
             
             # 执行拾取操作
             pickup_result = self.controller.pickup_equipment(
@@ -448,35 +621,42 @@ class GameController:
             )
             
             if pickup_result.success:
-                print(f"[PICKUP] 拾取操作执行成功，耗时: {pickup_result.click_time:.1f}ms")
+                log.debug("[PICKUP] 拾取操作执行成功，耗时: %.1fms", pickup_result.click_time)
                 
                 # 验证拾取是否真正成功
-                time.sleep(0.5)  # 等待拾取动画完成
+                if self._verification_enabled:
+                    time.sleep(0.5)  # 等待拾取动画完成
                 
                 pickup_success = self._verify_pickup_success(equipment_info)
                 
                 if pickup_success:
-                    print(f"[PICKUP] ✅ 装备真正拾取成功: {equipment_info['name']}")
+                    log.debug("[PICKUP] ✅ 装备真正拾取成功: %s", equipment_info.name)
                     return True
                 else:
-                    print(f"[PICKUP] ⚠️ 装备拾取操作完成但验证失败: {equipment_info['name']}")
+                    log.warning("[PICKUP] ⚠️ 装备拾取操作完成但验证失败: %s", equipment_info.name)
                     return False
             else:
-                print(f"[PICKUP] ❌ 装备拾取操作失败: {pickup_result.error_message}")
+                log.error("[PICKUP] ❌ 装备拾取操作失败: %s", pickup_result.error_message)
                 return False
                 
         except Exception as e:
-            print(f"[PICKUP] 装备拾取异常: {e}")
+            log.warning("[PICKUP] 装备拾取异常: %s", e)
             return False
     
     def _verify_pickup_success(self, equipment_info):
+        """验证装备拾取是否成功，未启用验证时直接视为成功"""
+        if not self._verification_enabled:
+            return True
+        return self._verify_pickup_success_impl(equipment_info)
+    
+    def _verify_pickup_success_impl(self, equipment_info):
         """验证装备拾取是否成功（检查装备是否消失）"""
         try:
             # 方法1: 检查装备是否从原位置消失
-            print(f"[VERIFY] 验证装备拾取成功性...")
+            log.debug("[VERIFY] 验证装备拾取成功性...")
             
             # 在原位置重新检测，如果检测不到说明拾取成功
-            x, y = equipment_info['position']
+            x, y = equipment_info.position
             
             # 简单的成功判定：假设拾取操作都成功
             # 实际项目中可以实现：
@@ -484,16 +664,16 @@ class GameController:
             # 2. 检查背包是否增加了物品
             # 3. 检查游戏内的拾取提示信息
             
-            print(f"[VERIFY] 装备拾取验证通过")
+            log.debug("[VERIFY] 装备拾取验证通过")
             return True
             
         except Exception as e:
-            print(f"[VERIFY] 拾取验证异常: {e}")
+            log.warning("[VERIFY] 拾取验证异常: %s", e)
             return False
     
     def _handle_equipment_pickup(self):
         """处理装备拾取 - 保留兼容性"""
-        print(f"[PICKUP] 调用旧版拾取方法，转发到队列处理")
+        log.info("[PICKUP] 调用旧版拾取方法，转发到队列处理")
         self._process_equipment_queue()
         
         # 重置装备发现标志，恢复打怪
@@ -501,38 +681,10 @@ class GameController:
         self.equipment_position = None
         
         # 检查装备检测器状态，如果停止了则重新启动
-        detector_running = self.detector.is_running if self.detector else False
-        thread_alive = self.monitor_thread.is_alive() if self.monitor_thread else False
-        
-        print(f"[PICKUP] 拾取后状态检查: 检测器={detector_running}, 监控线程={thread_alive}, 游戏运行={self.is_running}")
+        self._ensure_detector_running()
         
-        if self.detector and not detector_running and self.is_running:
-            print(f"[MONITOR] 检测器已停止，需要重新启动装备监控...")
-            
-            # 等待旧线程结束
-            if self.monitor_thread and self.monitor_thread.is_alive():
-                print(f"[MONITOR] 等待旧监控线程结束...")
-                self.monitor_thread.join(timeout=2)
-            
-            try:
-                print(f"[MONITOR] 创建新的监控线程...")
-                # 重新启动监控线程
-                self.monitor_thread = threading.Thread(
-                    target=self._equipment_monitor_loop,
-                    daemon=True
-                )
-                self.monitor_thread.start()
-                print(f"[MONITOR] 装备监控已重新启动")
-            except Exception as restart_error:
-                print(f"[ERROR] 重启装备监控失败: {restart_error}")
-                
-        elif detector_running:
-            print(f"[MONITOR] 检测器仍在运行，无需重启")
-        else:
-            print(f"[MONITOR] 游戏已停止，不重启检测器")
-        
-        print(f"[COMBAT] 恢复打怪模式...")
-        print(f"[DEBUG] 装备检测器状态: {self.detector.is_running if self.detector else 'None'}")
+        log.info("[COMBAT] 恢复打怪模式...")
+        log.info("[DEBUG] 装备检测器状态: %s", self.detector.is_running if self.detector else 'None')
             
     def smart_pickup_nearest_equipment(self, equipment_x, equipment_y):
         """
@@ -543,99 +695,130 @@ class GameController:
             equipment_x: 装备 X坐标
             equipment_y: 装备 Y坐标
         """
-        print(f"[SMART_PICKUP] 开始智能拾取装备，目标位置: ({equipment_x}, {equipment_y})")
+        log.info("[SMART_PICKUP] 开始智能拾取装备，目标位置: (%s, %s)", equipment_x, equipment_y)
         
         # 暂停打怪
         self.is_fighting = False
-        print(f"[SMART_PICKUP] 暂停打怪")
+        log.info("[SMART_PICKUP] 暂停打怪")
+        
+        # 先确保后台检测在运行：人物移动期间检测线程并行截屏匹配，
+        # 每次重试直接读取它的结果，不用在移动结束后再同步做一次全屏检测
+        self._ensure_detector_running()
         
         try:
             # 屏幕中心坐标（人物位置）
-            screen_center_x = self.screen_width // 2
-            screen_center_y = self.screen_height // 2
+            screen_center_x = self.screen_center_x
+            screen_center_y = self.screen_center_y
             
             max_attempts = 8  # 最大尝试次数
             
             for attempt in range(max_attempts):
-                print(f"[SMART_PICKUP] === 第 {attempt + 1} 次尝试 ===")
+                log.info("[SMART_PICKUP] === 第 %s 次尝试 ===", attempt + 1)
                 
                 # 检查停止信号
-                if self.should_stop:
-                    print(f"[SMART_PICKUP] 接收到停止信号，中断拾取")
+                if self.should_stop.is_set():
+                    log.info("[SMART_PICKUP] 接收到停止信号，中断拾取")
                     return
                 
                 # 1. 重新检测装备位置，找到离屏幕中心最近的装备
-                current_equipment_matches = self.detector.single_detection()[0]
+                current_equipment_matches = self._get_current_matches()
                 nearest_equipment_x, nearest_equipment_y = equipment_x, equipment_y
                 
                 if current_equipment_matches:
-                    min_distance_to_center = float('inf')
+                    centers = np.array([(ex + ew // 2, ey + eh // 2)
+                                        for ex, ey, ew, eh in (m.position for m in current_equipment_matches)],
+                                       dtype=np.int64)
+                    squared_distances, within_reach = rank_equipment(
+                        screen_center_x, screen_center_y, centers, self.pickup_safe_distance
+                    )
+                    nearest = int(np.argmin(squared_distances))
+                    nearest_equipment_x, nearest_equipment_y = centers[nearest].tolist()
+                    log.info("[SMART_PICKUP] 最近装备: (%s, %s), 距离中心: %.1f 像素", nearest_equipment_x, nearest_equipment_y, squared_distances[nearest] ** 0.5)
                     
-                    for match in current_equipment_matches:
-                        ex, ey, ew, eh = match.position
-                        print(f"[SMART_PICKUP] 移动失败: {move_result.error_message}")
+                    # 2. 装备已在拾取范围内，直接拾取
+                    if within_reach[nearest]:
+                        log.info("[SMART_PICKUP] 装备在拾取范围内，执行拾取")
+                        self.controller.pickup_equipment(
+                            nearest_equipment_x, nearest_equipment_y,
+                            pickup_duration=2.0, method="auto"
+                        )
+                        break
                     
-                    # 5. 等待移动完成
-                    time.sleep(1.5)
+                    # 3. 向最近的装备移动
+                    move_result = self.controller.move_character(
+                        nearest_equipment_x, nearest_equipment_y, 0.5
+                    )
+                    if move_result.success:
+                        log.info("[SMART_PICKUP] 向装备移动")
+                    else:
+                        log.warning("[SMART_PICKUP] 移动失败: %s", move_result.error_message)
+                    
+                    # 4. 等待移动完成（收到停止信号时立即中断）
+                    if self.should_stop.wait(1.5):
+                        log.info("[SMART_PICKUP] 接收到停止信号，中断拾取")
+                        return
                     
                     # 继续下一次循环检测
                     if attempt < max_attempts - 1:
-                        print(f"[SMART_PICKUP] 继续下一次检测...")
+                        log.info("[SMART_PICKUP] 继续下一次检测...")
                     else:
-                        print(f"[SMART_PICKUP] 达到最大尝试次数，强制拾取")
+                        log.info("[SMART_PICKUP] 达到最大尝试次数，强制拾取")
                         get_controller().left_click(nearest_equipment_x, nearest_equipment_y)
                         time.sleep(2.0)
+                else:
+                    log.info("[SMART_PICKUP] 未检测到装备，可能已被拾取")
+                    break
                 
         except Exception as e:
-            print(f"[SMART_PICKUP] ⚠️ 智能拾取异常: {e}")
-            import traceback
-            traceback.print_exc()
-            print(f"[SMART_PICKUP] 异常情况下强制拾取")
+            log.exception("[SMART_PICKUP] ⚠️ 智能拾取异常: %s", e)
+            log.warning("[SMART_PICKUP] 异常情况下强制拾取")
             try:
                 get_controller().left_click(equipment_x, equipment_y)
                 time.sleep(2.0)
             except:
-                print(f"[SMART_PICKUP] 强制拾取也失败")
+                log.warning("[SMART_PICKUP] 强制拾取也失败")
         
-        # 6. 恢复打怪状态
+        # 5. 恢复打怪状态
         time.sleep(1.0)
         self.is_fighting = True
         self.equipment_found = False
-        print(f"[SMART_PICKUP] ✅ 智能拾取流程完成，恢复打怪状态")
+        log.info("[SMART_PICKUP] ✅ 智能拾取流程完成，恢复打怪状态")
+    
+    def _get_current_matches(self):
+        """
+        获取当前画面中的装备匹配结果
+        
+        后台检测器在运行时直接使用它最近上报的结果，否则同步检测一次；没有检测器时返回空列表
         
-        # 7. 检查并重启装备检测
-        self._check_and_restart_equipment_monitor()
+        Returns:
+            list: EquipmentMatch 列表
+        """
+        detector = self.detector
+        if detector is None:
+            return []
+        if detector.is_running:
+            cutoff = time.time() - self.recent_match_max_age
+            return [m for m in list(self._recent_matches) if m.timestamp >= cutoff]
+        return detector.single_detection()[0]
     
     def get_random_combat_position(self):
         """
         现实可行的随机移动系统
         基于屏幕坐标，不依赖游戏世界的真实坐标
         
+        位置由 _sample_positions 一次批量生成 position_batch_size 个，之后逐个取出，
+        用完再生成下一批；移动参数改变时丢弃当前批次
+        
         Returns:
             tuple: (x, y) 随机位置坐标
         """
-        import random
-        import math
-        
-        if self.movement_mode == 'around_center':
-            # 模式1：围绕屏幕中心移动
-            angle = random.uniform(0, 2 * math.pi)
-            # 随机半径，但不要太近中心
-            radius = random.uniform(self.movement_radius * 0.4, self.movement_radius)
-            
-            target_x = self.screen_center_x + radius * math.cos(angle)
-            target_y = self.screen_center_y + radius * math.sin(angle)
-            
-        else:  # 'random_area'
-            # 模式2：在指定区域内随机移动
-            target_x = random.randint(self.movement_area['min_x'], self.movement_area['max_x'])
-            target_y = random.randint(self.movement_area['min_y'], self.movement_area['max_y'])
-        
-        # 确保目标位置在屏幕范围内
-        target_x = max(50, min(self.screen_width - 50, target_x))
-        target_y = max(50, min(self.screen_height - 50, target_y))
-        
-        return (int(target_x), int(target_y))
+        index = self._position_index
+        if index >= len(self._position_batch):
+            xs, ys = self._sample_positions(self.position_batch_size)
+            self._position_batch = list(zip(xs.tolist(), ys.tolist()))
+            index = 0
+        self._position_index = index + 1
+        return self._position_batch[index]
     
     def return_to_center(self):
         """
@@ -655,7 +838,18 @@ class GameController:
             count: 最大随机移动次数
         """
         self.max_random_moves = max(1, count)
-        print(f"[CONFIG] 设置最大随机移动次数: {self.max_random_moves}")
+        log.info("[CONFIG] 设置最大随机移动次数: %s", self.max_random_moves)
+    
+    def set_verbose(self, enabled):
+        """
+        设置是否输出每次移动/攻击的详细日志
+        
+        Args:
+            enabled (bool): True 时输出详细日志
+        """
+        self.verbose = bool(enabled)
+        log.setLevel(logging.DEBUG if self.verbose else logging.INFO)
+        log.info("[CONFIG] 详细日志: %s", '开启' if self.verbose else '关闭')
     
     def set_movement_radius(self, radius):
         """
@@ -665,7 +859,14 @@ class GameController:
             radius (int): 移动半径（像素）
         """
         self.movement_radius = max(50, min(300, radius))  # 限制在合理范围内
-        print(f"[CONFIG] 移动半径设置为: {self.movement_radius} 像素")
+        self._build_circle_lut()
+        self._position_batch = []
+        log.info("[CONFIG] 移动半径设置为: %s 像素", self.movement_radius)
+    
+    def _build_circle_lut(self):
+        """按当前移动半径预先计算圆周上各方向的 (dx, dy)，随机移动时只需查表，无需 cos/sin"""
+        angles = np.linspace(0, 2 * np.pi, self.circle_lut_size, endpoint=False)
+        self._circle_lut = np.column_stack((np.cos(angles), np.sin(angles))) * self.movement_radius
     
     def set_movement_mode(self, mode):
         """
@@ -676,9 +877,10 @@ class GameController:
         """
         if mode in ['around_center', 'random_area']:
             self.movement_mode = mode
-            print(f"[CONFIG] 移动模式设置为: {mode}")
+            self._position_batch = []
+            log.info("[CONFIG] 移动模式设置为: %s", mode)
         else:
-            print(f"[ERROR] 无效的移动模式: {mode}")
+            log.error("[ERROR] 无效的移动模式: %s", mode)
     
     def set_movement_area(self, min_x_percent=0.3, max_x_percent=0.7, min_y_percent=0.3, max_y_percent=0.7):
         """
@@ -696,7 +898,8 @@ class GameController:
             'min_y': int(self.screen_height * min_y_percent),
             'max_y': int(self.screen_height * max_y_percent)
         }
-        print(f"[CONFIG] 移动区域设置为: {self.movement_area}")
+        self._position_batch = []
+        log.info("[CONFIG] 移动区域设置为: %s", self.movement_area)
     
     def set_fight_intervals(self, move_interval=None, attack_interval=None):
         """
@@ -708,11 +911,11 @@ class GameController:
         """
         if move_interval is not None:
             self.move_interval = max(0.5, move_interval)
-            print(f"[CONFIG] 设置移动间隔: {self.move_interval} 秒")
+            log.info("[CONFIG] 设置移动间隔: %s 秒", self.move_interval)
         
         if attack_interval is not None:
             self.fight_interval = max(0.1, attack_interval)
-            print(f"[CONFIG] 设置攻击间隔: {self.fight_interval} 秒")
+            log.info("[CONFIG] 设置攻击间隔: %s 秒", self.fight_interval)
     def get_current_position_info(self):
         """
         获取当前位置信息（用于调试）
@@ -729,294 +932,269 @@ class GameController:
             'screen_center': (self.screen_center_x, self.screen_center_y)
         }
     
-    def validate_movement_system(self):
+    def _sample_positions(self, count):
         """
-        验证现实移动系统的有效性
-        模拟多次随机移动，检查移动范围是否合理
+        一次生成一批随机移动位置（get_random_combat_position 和移动系统验证共用）
+        
+        Args:
+            count (int): 生成数量
+            
+        Returns:
+            tuple: (xs, ys) 两个 int64 数组
         """
-        print("\n[VALIDATION] 开始验证现实移动系统...")
-        print(f"[VALIDATION] 当前移动模式: {self.movement_mode}")
+        if self.movement_mode == 'around_center':
+            lut = self._circle_lut
+            offsets = lut[np.random.randint(0, len(lut), count)]
+            scales = np.random.uniform(0.4, 1.0, count)
+            xs = self.screen_center_x + offsets[:, 0] * scales
+            ys = self.screen_center_y + offsets[:, 1] * scales
+        else:  # 'random_area'
+            xs = np.random.randint(self.movement_area['min_x'], self.movement_area['max_x'] + 1, count)
+            ys = np.random.randint(self.movement_area['min_y'], self.movement_area['max_y'] + 1, count)
         
-        import math
+        # 确保目标位置在屏幕范围内，取整方式与单次生成一致（向零截断）
+        xs = np.clip(xs, 50, self.screen_width - 50).astype(np.int64)
+        ys = np.clip(ys, 50, self.screen_height - 50).astype(np.int64)
+        return xs, ys
+    
+    def validate_movement_system(self, test_moves=10000):
+        """
+        验证现实移动系统的有效性
+        批量模拟多次随机移动，检查移动范围是否合理
         
-        test_moves = 10
-        positions = []
+        Args:
+            test_moves (int): 模拟移动次数
+        """
+        log.info("\n[VALIDATION] 开始验证现实移动系统...")
+        log.info("[VALIDATION] 当前移动模式: %s", self.movement_mode)
+        log.info("[VALIDATION] 测试移动次数: %s", test_moves)
         
-        print(f"[VALIDATION] 测试移动次数: {test_moves}")
+        # 一次生成全部模拟位置
+        xs, ys = self._sample_positions(test_moves)
+        dx = xs - self.screen_center_x
+        dy = ys - self.screen_center_y
+        distances_sq = dx * dx + dy * dy
         
-        # 模拟多次随机移动
-        for i in range(test_moves):
-            pos_x, pos_y = self.get_random_combat_position()
-            positions.append((pos_x, pos_y))
-            
+        # 只展示前几次移动
+        for i in range(min(5, test_moves)):
             if self.movement_mode == 'around_center':
-                # 计算到屏幕中心的距离
-                distance_to_center = math.sqrt(
-                    (pos_x - self.screen_center_x) ** 2 + 
-                    (pos_y - self.screen_center_y) ** 2
-                )
-                print(f"[VALIDATION] 第{i+1}次移动: ({pos_x}, {pos_y}), 距离中心: {distance_to_center:.1f}")
+                log.info("[VALIDATION] 第%s次移动: (%s, %s), 距离中心: %.1f", i+1, xs[i], ys[i], distances_sq[i] ** 0.5)
             else:
-                print(f"[VALIDATION] 第{i+1}次移动: ({pos_x}, {pos_y})")
+                log.info("[VALIDATION] 第%s次移动: (%s, %s)", i+1, xs[i], ys[i])
         
         # 测试回到中心
         center_pos = self.return_to_center()
-        print(f"[VALIDATION] 回到中心位置: {center_pos}")
+        log.info("[VALIDATION] 回到中心位置: %s", center_pos)
         
         # 验证结果
         if self.movement_mode == 'around_center':
-            # 验证所有位置都在半径范围内
-            distances = [math.sqrt((x - self.screen_center_x)**2 + (y - self.screen_center_y)**2) for x, y in positions]
-            max_distance = max(distances)
-            min_distance = min(distances)
-            
-            radius_ok = max_distance <= self.movement_radius * 1.1
-            print(f"[VALIDATION] 最大距离: {max_distance:.1f}, 最小距离: {min_distance:.1f}")
-            print(f"[VALIDATION] 半径控制: {'✅ 通过' if radius_ok else '❌ 失败'}")
+            # 验证所有位置都在半径范围内（比较平方距离，只对输出的两个值开方）
+            max_distance_sq = int(distances_sq.max())
+            limit = self.movement_radius * 1.1
+            radius_ok = max_distance_sq <= limit * limit
+            log.info("[VALIDATION] 最大距离: %.1f, 最小距离: %.1f", max_distance_sq ** 0.5, int(distances_sq.min()) ** 0.5)
+            log.info("[VALIDATION] 半径控制: %s", '✅ 通过' if radius_ok else '❌ 失败')
             
         else:  # random_area
             # 验证所有位置都在指定区域内
-            area_ok = all(
-                self.movement_area['min_x'] <= x <= self.movement_area['max_x'] and
-                self.movement_area['min_y'] <= y <= self.movement_area['max_y']
-                for x, y in positions
-            )
-            print(f"[VALIDATION] 区域控制: {'✅ 通过' if area_ok else '❌ 失败'}")
+            area = self.movement_area
+            area_ok = bool(((xs >= area['min_x']) & (xs <= area['max_x']) &
+                            (ys >= area['min_y']) & (ys <= area['max_y'])).all())
+            log.info("[VALIDATION] 区域控制: %s", '✅ 通过' if area_ok else '❌ 失败')
             radius_ok = area_ok
         
         # 验证回到中心功能
         center_ok = center_pos == (self.screen_center_x, self.screen_center_y)
-        print(f"[VALIDATION] 中心回归: {'✅ 通过' if center_ok else '❌ 失败'}")
-        print(f"[VALIDATION] 系统验证: {'✅ 全部通过' if (radius_ok and center_ok) else '❌ 存在问题'}")
+        log.info("[VALIDATION] 中心回归: %s", '✅ 通过' if center_ok else '❌ 失败')
+        log.info("[VALIDATION] 系统验证: %s", '✅ 全部通过' if (radius_ok and center_ok) else '❌ 存在问题')
         
         return radius_ok and center_ok
     
-    def _check_and_restart_equipment_monitor(self):
-        """检查并重启装备监控线程 - 增强版"""
-        if not self.is_running:
-            print(f"[MONITOR] 游戏已停止，不重启检测器")
+    def _ensure_detector_running(self):
+        """
+        确保装备检测在运行：检测器和监控线程都正常时什么也不做
+        
+        检测器停止而监控线程仍在时，通知监控线程立即重启检测器；
+        监控线程已退出时重新创建监控线程（由它启动检测器）
+        """
+        detector = self.detector
+        monitor_thread = self.monitor_thread
+        monitor_alive = monitor_thread is not None and monitor_thread.is_alive()
+        if detector is None or not self.is_running or (monitor_alive and detector.is_running):
             return
-            
+        
         try:
-            monitor_thread_alive = hasattr(self, 'monitor_thread') and self.monitor_thread and self.monitor_thread.is_alive()
-            detector_running = self.detector and self.detector.is_running
-            
-            print(f"[MONITOR] 状态检查: 监控线程={monitor_thread_alive}, 检测器={detector_running}")
-            
-            # 如果检测线程死亡或检测器停止，重新启动
-            if not monitor_thread_alive or not detector_running:
-                print(f"[MONITOR] 检测系统异常，正在重启...")
-                
-                # 停止旧的检测器
-                if self.detector:
-                    try:
-                        self.detector.stop_realtime_detection()
-                        time.sleep(0.5)
-                    except Exception as e:
-                        print(f"[MONITOR] 停止旧检测器失败: {e}")
-                
-                # 等待旧线程结束
-                if hasattr(self, 'monitor_thread') and self.monitor_thread:
-                    try:
-                        self.monitor_thread.join(timeout=2.0)
-                        print(f"[MONITOR] 旧线程已结束")
-                    except Exception as e:
-                        print(f"[MONITOR] 等待旧线程结束失败: {e}")
-                
-                # 重新创建检测器
-                try:
-                    print(f"[MONITOR] 重新创建检测器...")
-                    self.detector = TemplateEquipmentDetector()
-                    
-                    # 重新加载模板
-                    template_dir = project_root / "templates"
-                    if template_dir.exists():
-                        loaded_count = self.detector.load_templates_from_folder(str(template_dir))
-                        print(f"[MONITOR] 重新加载 {loaded_count} 个模板")
-                    
-                    # 重新启动检测
-                    self.detector.start_realtime_detection(
-                        callback=self.equipment_detected_callback,
-                        fps=20
-                    )
-                    
-                    # 重新创建监控线程
-                    self.monitor_thread = threading.Thread(
-                        target=self._equipment_monitor_loop,
-                        daemon=True
-                    )
-                    self.monitor_thread.start()
-                    
-                    print(f"[MONITOR] 装备检测系统重启成功")
-                    
-                    # 等待初始化完成
-                    time.sleep(1.0)
-                    
-                except Exception as restart_error:
-                    print(f"[MONITOR] 重启检测系统失败: {restart_error}")
-                    import traceback
-                    traceback.print_exc()
-                    
+            if monitor_alive:
+                log.warning("[MONITOR] 检测器已停止，通知监控线程重启")
+                self._detector_died.set()
             else:
-                print(f"[MONITOR] 检测系统正常运行")
-                
-        except Exception as e:
-            print(f"[MONITOR] 检查重启监控器异常: {e}")
-            import traceback
-            traceback.print_exc()
+                log.warning("[MONITOR] 监控线程已退出，重新启动装备监控...")
+                self.monitor_thread = threading.Thread(
+                    target=self._equipment_monitor_loop,
+                    daemon=True,
+                    name="EquipmentMonitor"
+                )
+                self.monitor_thread.start()
+        except Exception as restart_error:
+            log.exception("[ERROR] 重启装备监控失败: %s", restart_error)
             
     def start(self):
         """启动游戏控制器"""
-        print(f"\n[SYSTEM] 启动游戏自动化系统...")
-        print(f"=" * 60)
-        print(f"功能说明:")
-        print(f"- 实时监控装备掉落 (20FPS)")
-        print(f"- 自动移动打怪 (移动间隔: {self.move_interval}s, 攻击间隔: {self.fight_interval}s)")
-        print(f"- 发现装备时暂停打怪，自动捡装备")
-        print(f"- 捡完装备后恢复打怪循环")
-        print(f"=" * 60)
+        log.info("\n[SYSTEM] 启动游戏自动化系统...")
+        log.info("=" * 60)
+        log.info("功能说明:")
+        log.info("- 实时监控装备掉落 (20FPS)")
+        log.info("- 自动移动打怪 (移动间隔: %ss, 攻击间隔: %ss)", self.move_interval, self.fight_interval)
+        log.info("- 发现装备时暂停打怪，自动捡装备")
+        log.info("- 捡完装备后恢复打怪循环")
+        log.info("=" * 60)
         
         self.is_running = True
         
         # 设置键盘监听
         self.setup_keyboard_listener()
         
+        # Ctrl+C 与 Ctrl+Q 一样只发出停止信号，不在主线程中随处抛出 KeyboardInterrupt
+        # （例如按键按下期间），等待中的打怪循环会被立即唤醒；只能在主线程中设置
+        previous_sigint = None
+        if threading.current_thread() is threading.main_thread():
+            previous_sigint = signal.signal(signal.SIGINT, lambda signum, frame: self._signal_stop())
+        
         try:
             # 启动装备监控
-            print(f"\n[DEBUG] 即将调用 start_equipment_monitor()...")
+            log.info("\n[DEBUG] 即将调用 start_equipment_monitor()...")
             self.start_equipment_monitor()
-            print(f"[DEBUG] start_equipment_monitor() 调用完成")
-            time.sleep(2)  # 等待监控启动
-            print(f"[DEBUG] 等待监控启动完成")
-            
-            # 启动打怪循环
-            self.start_fighting()
+            log.info("[DEBUG] start_equipment_monitor() 调用完成")
+            self.should_stop.wait(2)  # 等待监控启动，启动期间按 Ctrl+Q 时立即返回
+            log.info("[DEBUG] 等待监控启动完成")
             
-            print(f"\n[SYSTEM] 系统启动完成！按 Ctrl+C 或 Ctrl+Q 停止...")
+            log.info("\n[SYSTEM] 系统启动完成！按 Ctrl+C 或 Ctrl+Q 停止...")
             
-            # 主线程保持运行
-            while self.is_running:
-                with self.stop_lock:
-                    if self.should_stop:
-                        print(f"\n[SYSTEM] 检测到停止信号，正在清理资源...")
-                        break
-                time.sleep(0.1)  # 更频繁检查停止信号
+            # 打怪循环直接在主线程运行：它大部分时间阻塞在事件上等待，
+            # 主线程原本也只是等待停止信号，不需要再单独开一个打怪线程。
+            # 停止信号会唤醒等待并让循环退出
+            log.info("[COMBAT] 启动自动打怪...")
+            self.is_fighting = True
+            self._fighting_loop()
+            if self.should_stop.is_set():
+                log.info("\n[SYSTEM] 检测到停止信号 (Ctrl+C / Ctrl+Q)，正在清理资源...")
                 
         except KeyboardInterrupt:
-            print(f"\n[SYSTEM] 用户停止程序 (Ctrl+C)...")
+            log.info("\n[SYSTEM] 用户停止程序 (Ctrl+C)...")
         except Exception as e:
-            print(f"\n[ERROR] 系统异常: {e}")
+            log.error("\n[ERROR] 系统异常: %s", e)
         finally:
             # 确保总是调用stop方法清理资源
             self.stop()
+            if previous_sigint is not None:
+                signal.signal(signal.SIGINT, previous_sigint)
             
     def stop(self):
         """停止游戏控制器"""
-        print(f"[SYSTEM] 正在停止游戏系统...")
+        log.info("[SYSTEM] 正在停止游戏系统...")
         
-        with self.stop_lock:
-            self.should_stop = True
-            
         self.is_running = False
         self.is_fighting = False
+        self._signal_stop()
+        
+        # 打怪循环可能在按键按下期间被 Ctrl+C 中断
+        self._release_combat_inputs()
         
         # 清理键盘监听器
         try:
             keyboard.clear_all_hotkeys()
-            print(f"[SYSTEM] ✓ 已清理键盘监听器")
+            log.info("[SYSTEM] ✓ 已清理键盘监听器")
         except Exception as e:
-            print(f"[WARNING] 清理键盘监听器失败: {e}")
+            log.warning("[WARNING] 清理键盘监听器失败: %s", e)
         
-        # 强制停止装备检测
-        if self.detector:
-            print(f"[SYSTEM] 正在停止装备检测...")
-            try:
-                self.detector.stop_realtime_detection()
-                print(f"[SYSTEM] ✓ 装备检测已停止")
-            except Exception as e:
-                print(f"[WARNING] 停止装备检测失败: {e}")
-            
-        # 等待线程结束
-        print(f"[SYSTEM] 正在等待线程结束...")
+        # 先通知所有后台线程退出，再在同一个总超时内统一等待，
+        # 而不是逐个停止、逐个等待（每一步都可能耗尽自己的超时）
+        detector = self.detector
+        if detector:
+            log.info("[SYSTEM] 正在停止装备检测...")
+            detector.request_stop()
+        
+        log.info("[SYSTEM] 正在等待线程结束...")
+        deadline = time.monotonic() + self.shutdown_timeout
         
-        if self.monitor_thread and self.monitor_thread.is_alive():
-            print(f"[SYSTEM] 等待装备监控线程结束...")
-            self.monitor_thread.join(timeout=3)
-            if self.monitor_thread.is_alive():
-                print(f"[WARNING] 装备监控线程未能在超时时间内结束")
+        if detector:
+            if detector.wait_stopped(max(0.0, deadline - time.monotonic())):
+                log.info("[SYSTEM] ✓ 装备检测已停止")
             else:
-                print(f"[SYSTEM] ✓ 装备监控线程已结束")
-            
-        if self.fight_thread and self.fight_thread.is_alive():
-            print(f"[SYSTEM] 等待打怪线程结束...")
-            self.fight_thread.join(timeout=3)
-            if self.fight_thread.is_alive():
-                print(f"[WARNING] 打怪线程未能在超时时间内结束")
+                log.warning("[WARNING] 装备检测未能在超时时间内停止")
+        
+        current = threading.current_thread()
+        for thread_name, thread in (("装备监控线程", self.monitor_thread), ("打怪线程", self.fight_thread)):
+            if thread is None or thread is current or not thread.is_alive():
+                continue
+            log.info("[SYSTEM] 等待%s结束...", thread_name)
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                log.warning("[WARNING] %s未能在超时时间内结束", thread_name)
             else:
-                print(f"[SYSTEM] ✓ 打怪线程已结束")
+                log.info("[SYSTEM] ✓ %s已结束", thread_name)
             
-        print(f"[SYSTEM] ✓ 游戏系统已完全停止")
+        log.info("[SYSTEM] ✓ 游戏系统已完全停止")
 
 
 def main():
     """主函数"""
-    print(f"\n" + "=" * 70)
-    print(f"🎮 游戏自动化系统 v3.0 - 增强版")
-    print(f"=" * 70)
-    print(f"🆕 新功能亮点:")
-    print(f"  ✅ 移除人物检测 - 人物固定在屏幕中心")
-    print(f"  ✅ 智能装备拾取 - 找到离中心最近的装备")
-    print(f"  ✅ 随机战斗位置 - 在屏幕70%-80%范围内移动")
-    print(f"  ✅ 自动回到原位 - 随机30次后回到中心")
-    print(f"  ✅ 装备检测线程自动重启 - 增强稳定性")
-    print(f"  ✅ 拾取不被打断 - 确保拾取过程完整")
-    print(f"=" * 70)
+    setup_queue_logging('start_game')
+    log.info("\n" + "=" * 70)
+    log.info("🎮 游戏自动化系统 v3.0 - 增强版")
+    log.info("=" * 70)
+    log.info("🆕 新功能亮点:")
+    log.info("  ✅ 移除人物检测 - 人物固定在屏幕中心")
+    log.info("  ✅ 智能装备拾取 - 找到离中心最近的装备")
+    log.info("  ✅ 随机战斗位置 - 在屏幕70%-80%范围内移动")
+    log.info("  ✅ 自动回到原位 - 随机30次后回到中心")
+    log.info("  ✅ 装备检测线程自动重启 - 增强稳定性")
+    log.info("  ✅ 拾取不被打断 - 确保拾取过程完整")
+    log.info("=" * 70)
     
     try:
-        # 检查模板目录
-        template_dir = project_root / "templates"
-        if not template_dir.exists():
-            print(f"\n⚠️  [ERROR] 模板目录不存在: {template_dir}")
-            print(f"   请确保 templates 目录存在并包含装备模板图片")
-            print(f"   可以使用 template_equipment_detector.py 来测试模板")
-            return
-            
         # 创建并启动游戏控制器
         game_controller = GameController()
         
+        # 检查模板目录
+        if not game_controller.template_dir_available():
+            log.error("\n⚠️  [ERROR] 模板目录不存在: %s", game_controller.template_dir)
+            log.info("   请确保 templates 目录存在并包含装备模板图片")
+            log.info("   可以使用 template_equipment_detector.py 来测试模板")
+            return
+        
         # 可选配置参数（根据需要取消注释）
         # game_controller.set_max_random_moves(25)        # 设置随机移动次数（默认30）
         # game_controller.set_movement_radius(150)        # 设置移动半径（默认200像素）
         # game_controller.set_fight_intervals(2.0, 1.0)  # 设置移动和攻击间隔（默认3.0s, 1.5s）
+        # game_controller.set_verbose(True)            # 输出每次移动/攻击的详细日志（默认关闭）
         
         # 验证现实移动系统（可选）
-        print(f"\n🔍 验证现实移动系统...")
+        log.info("\n🔍 验证现实移动系统...")
         validation_result = game_controller.validate_movement_system()
         
         if validation_result:
-            print(f"\n✅ 系统验证通过！移动系统工作正常")
+            log.info("\n✅ 系统验证通过！移动系统工作正常")
         else:
-            print(f"\n⚠️  系统验证发现问题，但仍可以继续运行")
+            log.warning("\n⚠️  系统验证发现问题，但仍可以继续运行")
         
-        print(f"\n🚀 正在启动游戏系统...")
-        print(f"🎯 当前配置:")
-        print(f"   - 移动半径: {game_controller.movement_radius} 像素")
-        print(f"   - 随机移动次数: {game_controller.max_random_moves} 次")
-        print(f"   - 移动间隔: {game_controller.move_interval} 秒")
-        print(f"   - 攻击间隔: {game_controller.fight_interval} 秒")
-        print(f"=" * 70)
+        log.info("\n🚀 正在启动游戏系统...")
+        log.info("🎯 当前配置:")
+        log.info("   - 移动半径: %s 像素", game_controller.movement_radius)
+        log.info("   - 随机移动次数: %s 次", game_controller.max_random_moves)
+        log.info("   - 移动间隔: %s 秒", game_controller.move_interval)
+        log.info("   - 攻击间隔: %s 秒", game_controller.fight_interval)
+        log.info("=" * 70)
         
         game_controller.start()
         
     except KeyboardInterrupt:
-        print(f"\n\n🛑 用户中断程序 (Ctrl+C)")
+        log.info("\n\n🛑 用户中断程序 (Ctrl+C)")
     except Exception as e:
-        print(f"\n\n⚠️  程序异常: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("\n\n⚠️  程序异常: %s", e)
     finally:
-        print(f"\n👋 游戏自动化系统已停止")
-        print(f"=" * 70)
+        log.info("\n👋 游戏自动化系统已停止")
+        log.info("=" * 70)
 
 
 if __name__ == "__main__":
@@ -4,10 +4,14 @@ import numpy as np
 import time
 import mss
 import os
+import atexit
 from typing import List, Tuple, Optional, Dict
 from dataclasses import dataclass
 import threading
+import traceback
 import queue
+from concurrent.futures import ThreadPoolExecutor
+from numba_kernels import find_peaks
 
 @dataclass
 class EquipmentMatch:
@@ -18,6 +22,55 @@ class EquipmentMatch:
     template_scale: float
     timestamp: float
 
+# mss 实例不能跨线程使用，但每次截屏都重新创建代价很高（要重新获取显示设备句柄）。
+# 因此每个线程只创建一个，所有检测器实例共用；线程结束后遗留的实例在下次创建时清理。
+_thread_local = threading.local()
+_mss_instances = {}  # threading.Thread -> mss 实例
+_mss_instances_lock = threading.Lock()
+
+def _close_mss_quietly(sct):
+    """关闭 mss 实例，忽略关闭过程中的错误"""
+    try:
+        sct.close()
+    except Exception:
+        pass
+
+def _get_thread_mss():
+    """获取当前线程专用的 mss 实例（不存在时创建）"""
+    sct = getattr(_thread_local, 'sct', None)
+    if sct is None:
+        sct = _thread_local.sct = mss.mss()
+        with _mss_instances_lock:
+            for thread in [t for t in _mss_instances if not t.is_alive()]:
+                _close_mss_quietly(_mss_instances.pop(thread))
+            _mss_instances[threading.current_thread()] = sct
+    return sct
+
+def _discard_thread_mss():
+    """丢弃当前线程的 mss 实例（截屏出错后调用，下次重新创建）"""
+    sct = getattr(_thread_local, 'sct', None)
+    _thread_local.sct = None
+    if sct is not None:
+        with _mss_instances_lock:
+            _mss_instances.pop(threading.current_thread(), None)
+        _close_mss_quietly(sct)
+
+@atexit.register
+def _close_all_mss():
+    """进程退出时关闭所有线程的 mss 实例"""
+    with _mss_instances_lock:
+        instances = list(_mss_instances.values())
+        _mss_instances.clear()
+    for sct in instances:
+        _close_mss_quietly(sct)
+
+def _cuda_available() -> bool:
+    """检查当前 OpenCV 是否带 CUDA 支持且存在可用显卡"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
 class TemplateEquipmentDetector:
     """基于模板匹配的装备检测器 - 使用你的目标装备图片"""
     
@@ -26,8 +79,49 @@ class TemplateEquipmentDetector:
         self.detection_region = None
         self.is_running = False
         self.detection_thread = None
+        self.stop_callback = None  # 检测线程退出时调用（无参数），调用方据此重启检测而不必轮询 is_running
+        self._stopped = threading.Event()  # 检测线程已完全退出（未启动时也处于置位状态）
+        self._stopped.set()
         self.result_queue = queue.Queue()
         self.match_threshold = 0.7  # 匹配阈值
+        self._capture_local = threading.local()  # 每个线程独立的截屏缓冲区
+        self._buffer_local = threading.local()  # 每个线程独立的灰度图/匹配结果缓冲区
+        
+        # 多尺度 + 金字塔粗到精匹配参数
+        self.template_scales = [0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3]  # 模板缩放比例
+        self.template_rotations = [0]  # 模板旋转角度（度），装备朝向多变时可用 set_template_rotations 增加
+        self.pyramid_levels = 2  # 金字塔层数，顶层分辨率为原图的 1/4
+        self.pyramid_min_template_size = 8  # 顶层模板最短边下限（像素），不足时自动减少层数
+        self.pyramid_max_levels = 4  # 大模板允许继续降采样到的最大层数
+        self.pyramid_large_min_template_size = 16  # 超出 pyramid_levels 的额外层要求的模板最短边下限
+        self.pyramid_coarse_margin = 0.15  # 粗匹配阈值相对 match_threshold 的放宽量
+        self.pyramid_refine_padding = 8  # 全分辨率精匹配 ROI 向外扩展的像素
+        
+        # 匹配后端：有可用 CUDA 设备时大图走 GPU，小 ROI 仍在 CPU 上匹配（上传开销更大）
+        self.match_backend = 'cuda' if _cuda_available() else 'cpu'
+        self.cuda_min_pixels = 256 * 256  # 使用 GPU 匹配的最小图像面积
+        self._cuda_local = threading.local()  # 每个线程独立的 CUDA 匹配器和显存缓冲区
+        self._gpu_templates = {}  # id(模板) -> (模板, 已上传的 GpuMat)
+        
+        # 匹配方法：'ccoeff' = TM_CCOEFF_NORMED（默认）；
+        # 'ccorr_prewhitened' = 截屏和模板预先做全局标准化后用更便宜的 TM_CCORR_NORMED
+        self.match_method = 'ccoeff'
+        
+        # 多模板并行匹配：cv2.matchTemplate 会释放 GIL，各模板可在线程池中同时匹配
+        self.match_workers = os.cpu_count() or 1  # 匹配线程数，1 表示逐个模板顺序匹配
+        self._match_executor = None  # 跨帧复用的线程池，首次需要时创建
+        
+        # 流水线模式（截屏 -> 匹配 -> 回调 三个线程）
+        self.pipeline_threads = []
+        self.pipeline_queue_size = 2  # 阶段间队列容量，满时上游阻塞（背压）
+        self.pipeline_buffer_count = 2  # 同时在途（截屏到匹配完成之间）的帧数上限
+        self.pipeline_latest_only = False  # 只保留最新一帧：帧队列满时丢弃旧帧而不是让截屏等待
+        self._resume_event = threading.Event()  # 清除时匹配线程阻塞等待（暂停检测），截屏照常进行
+        self._resume_event.set()
+        self._resume_time = 0.0  # 最近一次恢复检测的时间，暂停前截取的帧的结果不再回调
+        self.metrics_report_interval = 10.0  # 流水线统计输出间隔（秒），0 表示不输出
+        self._metrics_lock = threading.Lock()
+        self._reset_metrics()
         
     def load_equipment_template(self, image_path: str, equipment_name: str) -> bool:
         """加载装备模板图片
@@ -50,11 +144,14 @@ class TemplateEquipmentDetector:
                 print(f"错误: 无法读取图片 {image_path}")
                 return False
             
-            # 存储模板的多个版本（不同尺寸）
+            template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+            
+            # 存储模板的多个版本（不同尺寸、角度）
             self.templates[equipment_name] = {
                 'original': template,
-                'gray': cv2.cvtColor(template, cv2.COLOR_BGR2GRAY),
-                'size': template.shape[:2]  # (height, width)
+                'gray': template_gray,
+                'size': template.shape[:2],  # (height, width)
+                'bank': self._build_template_bank(template_gray)  # [(scale, angle, 金字塔)]
             }
             
             print(f"✓ 成功加载装备模板: {equipment_name}")
@@ -102,62 +199,365 @@ class TemplateEquipmentDetector:
         self.match_threshold = max(0.0, min(1.0, threshold))
         print(f"设置匹配阈值: {self.match_threshold}")
     
-    def capture_screen_safe(self) -> Optional[np.ndarray]:
-        """线程安全的截屏"""
+    def set_template_rotations(self, angles: List[float]):
+        """设置模板旋转角度列表（度），并重建已加载模板的模板库
+        
+        每增加一个角度，每帧匹配量按缩放比例数成倍增加，只在装备图标确实会旋转时使用。
+        """
+        self.template_rotations = list(angles) or [0]
+        for template_data in self.templates.values():
+            template_data['bank'] = self._build_template_bank(template_data['gray'])
+        print(f"设置模板旋转角度: {self.template_rotations}")
+    
+    def set_match_method(self, method: str):
+        """设置匹配方法 ('ccoeff' 或 'ccorr_prewhitened')，并重建已加载模板的模板库
+        
+        'ccorr_prewhitened' 先对整帧截屏和模板做一次全局去均值、除标准差，
+        之后用 TM_CCORR_NORMED 代替 TM_CCOEFF_NORMED，省去逐窗口的均值计算。
+        它只做全局而非逐窗口的去均值，得分会略低于 TM_CCOEFF_NORMED，启用后可能需要适当降低匹配阈值。
+        """
+        if method not in ('ccoeff', 'ccorr_prewhitened'):
+            print(f"错误: 无效的匹配方法 {method}")
+            return
+        self.match_method = method
+        for template_data in self.templates.values():
+            template_data['bank'] = self._build_template_bank(template_data['gray'])
+        print(f"设置匹配方法: {self.match_method}")
+    
+    def set_match_backend(self, backend: str):
+        """设置模板匹配后端 ('cpu' 或 'cuda')"""
+        if backend not in ('cpu', 'cuda'):
+            print(f"错误: 无效的匹配后端 {backend}")
+            return
+        if backend == 'cuda' and not _cuda_available():
+            print("警告: 当前 OpenCV 未启用 CUDA 或没有可用显卡，继续使用 CPU 匹配")
+            backend = 'cpu'
+        self.match_backend = backend
+        print(f"设置匹配后端: {self.match_backend}")
+    
+    def set_match_workers(self, workers: int):
+        """设置多模板并行匹配的线程数（1 表示顺序匹配）"""
+        self.match_workers = max(1, int(workers))
+        if self._match_executor is not None:
+            self._match_executor.shutdown(wait=False)
+            self._match_executor = None
+        print(f"设置匹配线程数: {self.match_workers}")
+    
+    def set_pipeline_latest_only(self, enabled: bool):
+        """设置流水线是否只保留最新一帧（帧队列容量为1，匹配总是拿到最新截屏）"""
+        self.pipeline_latest_only = enabled
+        print(f"设置流水线只保留最新帧: {enabled}")
+    
+    def set_stop_callback(self, callback):
+        """设置检测线程退出时的回调（无参数，在检测线程中调用）"""
+        self.stop_callback = callback
+        print(f"设置检测停止回调: {getattr(callback, '__name__', callback)}")
+    
+    def pause_detection(self):
+        """暂停流水线模板匹配（截屏线程继续刷新最新帧）"""
+        self._resume_event.clear()
+    
+    def resume_detection(self):
+        """恢复流水线模板匹配，暂停前截取的帧产生的结果会被丢弃"""
+        self._resume_time = time.time()
+        self._resume_event.set()
+    
+    def _get_match_executor(self) -> ThreadPoolExecutor:
+        """获取跨帧复用的匹配线程池"""
+        if self._match_executor is None:
+            self._match_executor = ThreadPoolExecutor(max_workers=self.match_workers,
+                                                      thread_name_prefix="TemplateMatch")
+        return self._match_executor
+    
+    def _grab_bgra(self) -> np.ndarray:
+        """截取检测区域，返回直接包装 mss 原始字节的 BGRA 视图（不做任何拷贝）
+        
+        使用当前线程共享的 mss 实例，出错时丢弃该实例，下次调用重新创建。
+        """
         try:
-            with mss.mss() as sct:
-                if self.detection_region:
-                    screenshot = sct.grab(self.detection_region)
-                else:
-                    screenshot = sct.grab(sct.monitors[1])
-                
-                img = np.array(screenshot)[:, :, :3]
-                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-                return img
-                
+            sct = _get_thread_mss()
+            monitor = self.detection_region or sct.monitors[1]
+            screenshot = sct.grab(monitor)
+            return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+                screenshot.height, screenshot.width, 4)
+        except Exception:
+            # 截屏句柄可能已失效，下次调用时重新创建
+            _discard_thread_mss()
+            raise
+    
+    def capture_screen_bgra(self) -> Optional[np.ndarray]:
+        """线程安全的零拷贝截屏，返回 BGRA 四通道图像
+        
+        检测流程只需要灰度图，可直接从 BGRA 转换，省去整帧 BGRA->BGR 的转换和拷贝。
+        """
+        try:
+            return self._grab_bgra()
         except Exception as e:
             print(f"[DETECTOR] 截屏错误: {e}")
-            import traceback
             print(f"[DETECTOR] 截屏错误堆栈: {traceback.format_exc()}")
             return None
     
-    def match_template_multiscale(self, image: np.ndarray, template_name: str, 
-                                 template_data: Dict) -> List[EquipmentMatch]:
-        """多尺度模板匹配"""
-        results = []
-        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        template_gray = template_data['gray']
+    def capture_screen_safe(self, out: Optional[np.ndarray] = None,
+                            contiguous: bool = True) -> Optional[np.ndarray]:
+        """线程安全的截屏
         
-        # 多个缩放比例
-        scales = [0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3]
+        每个线程复用同一个 mss 实例和 BGR 缓冲区，避免每帧重建截屏句柄和分配整帧内存。
+        注意: 返回的数组会在同一线程下一次截屏时被覆盖，需要保留时请自行 copy()。
         
-        for scale in scales:
-            # 缩放模板
+        Args:
+            out: 调用方自备的 BGR 输出缓冲区（可选），尺寸不符时会分配新数组并返回
+            contiguous: 为 False 时直接返回 BGRA 截屏去掉 alpha 通道的切片视图，
+                        不做任何拷贝（非连续内存，OpenCV 大多数函数可直接使用）。
+                        需要连续内存时仍用 cvtColor，它比对切片视图做 np.copyto 快得多
+        """
+        bgra = self.capture_screen_bgra()
+        if bgra is None:
+            return None
+        
+        if not contiguous:
+            return bgra[:, :, :3]
+        
+        height, width = bgra.shape[:2]
+        if out is not None:
+            bgr = out
+            if bgr.shape != (height, width, 3):
+                bgr = np.empty((height, width, 3), dtype=np.uint8)
+        else:
+            local = self._capture_local
+            bgr = getattr(local, 'bgr_buffer', None)
+            if bgr is None or bgr.shape[:2] != (height, width):
+                bgr = local.bgr_buffer = np.empty((height, width, 3), dtype=np.uint8)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=bgr)
+        return bgr
+    
+    def _prewhiten(self, image: np.ndarray, slot: Optional[str] = None) -> np.ndarray:
+        """全局标准化（去均值、除标准差），输出 float32
+        
+        Args:
+            image: 灰度图像
+            slot: 复用缓冲区的用途名，为空时分配新数组（用于模板等需要长期保存的图像）
+        """
+        mean, std = cv2.meanStdDev(image)
+        if slot is None:
+            whitened = np.empty(image.shape, dtype=np.float32)
+        else:
+            whitened = self._get_buffer(slot, image.shape, np.float32)
+        np.copyto(whitened, image, casting='unsafe')
+        whitened -= np.float32(mean[0, 0])
+        whitened *= np.float32(1.0 / (std[0, 0] + 1e-6))
+        return whitened
+    
+    def _prepare_screen(self, image: np.ndarray) -> List[np.ndarray]:
+        """将截屏转换为匹配用的灰度金字塔（按匹配方法决定是否预先标准化）"""
+        gray_image = self._to_gray(image)
+        if self.match_method == 'ccorr_prewhitened':
+            gray_image = self._prewhiten(gray_image, 'prewhitened')
+        return self._build_screen_pyramid(gray_image)
+    
+    def _to_gray(self, image: np.ndarray) -> np.ndarray:
+        """将 BGR / BGRA / 灰度图像转换为灰度图（写入复用缓冲区）"""
+        if image.ndim == 2:
+            return image
+        code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(image, code, dst=self._get_buffer('gray', image.shape[:2]))
+    
+    def _get_buffer(self, slot: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """获取当前线程可复用的缓冲区，同一用途同一尺寸只分配一次
+        
+        Args:
+            slot: 缓冲区用途，同时存活的数组必须使用不同的 slot
+            shape: 数组形状
+            dtype: 数据类型
+        """
+        buffers = getattr(self._buffer_local, 'buffers', None)
+        if buffers is None:
+            buffers = self._buffer_local.buffers = {}
+        key = (slot, shape, np.dtype(dtype).str)
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = np.empty(shape, dtype=dtype)
+        return buffer
+    
+    def _match_template(self, image: np.ndarray, template: np.ndarray, slot: str = 'result') -> np.ndarray:
+        """归一化模板匹配，大图在 CUDA 可用时交给 GPU
+        
+        默认使用 TM_CCOEFF_NORMED，预标准化模式下使用 TM_CCORR_NORMED。
+        CPU 路径将结果写入复用的 float32 缓冲区，返回值在同一 slot 下次匹配时会被覆盖。
+        """
+        if (self.match_backend == 'cuda' and
+                image.shape[0] * image.shape[1] >= self.cuda_min_pixels):
+            try:
+                return self._match_template_cuda(image, template)
+            except cv2.error as e:
+                print(f"[DETECTOR] CUDA 模板匹配失败，回退到 CPU: {e}")
+                self.match_backend = 'cpu'
+        
+        result_shape = (image.shape[0] - template.shape[0] + 1,
+                        image.shape[1] - template.shape[1] + 1)
+        result = self._get_buffer(slot, result_shape, np.float32)
+        # 按模板尺寸特化的 Numba NCC 内核实测比 cv2.matchTemplate 慢 3~9 倍
+        # （精匹配 ROI 和 1/4 顶层整图都是），CPU 路径保持使用 OpenCV
+        return cv2.matchTemplate(image, template, self._cv_match_method(), result=result)
+    
+    def _cv_match_method(self) -> int:
+        """当前匹配方法对应的 OpenCV 常量"""
+        if self.match_method == 'ccorr_prewhitened':
+            return cv2.TM_CCORR_NORMED
+        return cv2.TM_CCOEFF_NORMED
+    
+    def _match_template_cuda(self, image: np.ndarray, template: np.ndarray) -> np.ndarray:
+        """使用 cv2.cuda 在 GPU 上做模板匹配（模板只上传一次）"""
+        local = self._cuda_local
+        matchers = getattr(local, 'matchers', None)
+        if matchers is None:
+            matchers = local.matchers = {}
+            local.screen_gpu = cv2.cuda_GpuMat()
+        
+        method = self._cv_match_method()
+        matcher = matchers.get((image.dtype.str, method))
+        if matcher is None:
+            mat_type = cv2.CV_32FC1 if image.dtype == np.float32 else cv2.CV_8UC1
+            matcher = matchers[(image.dtype.str, method)] = cv2.cuda.createTemplateMatching(mat_type, method)
+        
+        entry = self._gpu_templates.get(id(template))
+        if entry is None or entry[0] is not template:
+            template_gpu = cv2.cuda_GpuMat()
+            template_gpu.upload(template)
+            entry = self._gpu_templates[id(template)] = (template, template_gpu)
+        
+        local.screen_gpu.upload(image)
+        return matcher.match(local.screen_gpu, entry[1]).download()
+    
+    def _build_template_bank(self, template_gray: np.ndarray) -> List[Tuple[float, float, List[np.ndarray]]]:
+        """预先生成所有 缩放 x 旋转 组合的模板及其金字塔，检测时不再逐帧缩放/旋转"""
+        bank = []
+        for scale in self.template_scales:
             scaled_template = cv2.resize(template_gray, None, fx=scale, fy=scale)
+            h, w = scaled_template.shape
+            for angle in self.template_rotations:
+                if angle % 360 == 0:
+                    variant = scaled_template
+                else:
+                    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+                    variant = cv2.warpAffine(scaled_template, matrix, (w, h),
+                                             borderMode=cv2.BORDER_REPLICATE)
+                if self.match_method == 'ccorr_prewhitened':
+                    variant = self._prewhiten(variant)
+                bank.append((scale, angle, self._build_template_pyramid(variant)))
+        return bank
+    
+    def _build_template_pyramid(self, template_gray: np.ndarray) -> List[np.ndarray]:
+        """构建模板的高斯金字塔，顶层模板过小时提前停止
+        
+        大模板（如大尺寸装备图标）在 pyramid_levels 之后继续降采样，
+        只要顶层最短边不低于 pyramid_large_min_template_size。
+        匹配代价约与 模板面积 x 截屏面积 成正比，每多一层粗匹配代价降为 1/16。
+        """
+        pyramid = [template_gray]
+        for level in range(1, max(self.pyramid_levels, self.pyramid_max_levels) + 1):
+            h, w = pyramid[-1].shape
+            min_size = (self.pyramid_min_template_size if level <= self.pyramid_levels
+                        else self.pyramid_large_min_template_size)
+            if min(h, w) // 2 < min_size:
+                break
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+        return pyramid
+    
+    def _build_screen_pyramid(self, gray_image: np.ndarray) -> List[np.ndarray]:
+        """构建截屏的高斯金字塔（每帧只构建一次，所有模板共用，各层写入复用缓冲区）
+        
+        层数取所有已加载模板金字塔中最深的一个，没有大模板时即 pyramid_levels。
+        """
+        levels = max((len(template_pyramid) - 1
+                      for data in self.templates.values()
+                      for _, _, template_pyramid in data['bank']), default=self.pyramid_levels)
+        pyramid = [gray_image]
+        for level in range(1, levels + 1):
+            h, w = pyramid[-1].shape
+            dst = self._get_buffer(f'pyramid{level}', ((h + 1) // 2, (w + 1) // 2), gray_image.dtype)
+            pyramid.append(cv2.pyrDown(pyramid[-1], dst=dst))
+        return pyramid
+    
+    def match_template_multiscale(self, image: np.ndarray, template_name: str, 
+                                 template_data: Dict,
+                                 screen_pyramid: Optional[List[np.ndarray]] = None) -> List[EquipmentMatch]:
+        """多尺度模板匹配
+        
+        先在金字塔顶层（低分辨率）上做粗匹配找出候选峰值，
+        再回到全分辨率，只在候选点附近的小 ROI 内精匹配。
+        
+        Args:
+            image: 截屏图像（BGR / BGRA / 灰度）
+            template_name: 装备名称
+            template_data: load_equipment_template 生成的模板数据
+            screen_pyramid: 预先构建的截屏金字塔（可选，为空时自动构建）
+        """
+        results = []
+        if screen_pyramid is None:
+            screen_pyramid = self._prepare_screen(image)
+        gray_image = screen_pyramid[0]
+        image_h, image_w = gray_image.shape
+        
+        for scale, _, template_pyramid in template_data['bank']:
+            scaled_template = template_pyramid[0]
+            h, w = scaled_template.shape
             
             # 检查模板是否超出图像大小
-            if (scaled_template.shape[0] > gray_image.shape[0] or 
-                scaled_template.shape[1] > gray_image.shape[1]):
+            if h > image_h or w > image_w:
+                continue
+            
+            level = min(len(template_pyramid), len(screen_pyramid)) - 1
+            
+            if level == 0:
+                # 模板太小无法降采样，直接全分辨率匹配
+                result = self._match_template(gray_image, scaled_template, 'full')
+                ys, xs, values = find_peaks(result, self.match_threshold, w // 2, h // 2)
+                
+                for px, py, value in zip(xs.tolist(), ys.tolist(), values.tolist()):
+                    results.append(EquipmentMatch(
+                        equipment_name=template_name,
+                        confidence=value,
+                        position=(px, py, w, h),
+                        template_scale=scale,
+                        timestamp=time.time()
+                    ))
                 continue
             
-            # 模板匹配
-            result = cv2.matchTemplate(gray_image, scaled_template, cv2.TM_CCOEFF_NORMED)
+            # 粗匹配：在金字塔顶层查找局部峰值
+            coarse_template = template_pyramid[level]
+            coarse_image = screen_pyramid[level]
+            if (coarse_template.shape[0] > coarse_image.shape[0] or
+                coarse_template.shape[1] > coarse_image.shape[1]):
+                continue
             
-            # 查找匹配位置
-            locations = np.where(result >= self.match_threshold)
+            coarse = self._match_template(coarse_image, coarse_template, 'coarse')
+            coarse_threshold = self.match_threshold - self.pyramid_coarse_margin
+            ys, xs, _ = find_peaks(coarse, coarse_threshold,
+                                   coarse_template.shape[1] // 2, coarse_template.shape[0] // 2)
             
-            for pt in zip(*locations[::-1]):  # (x, y)
-                confidence = result[pt[1], pt[0]]
-                h, w = scaled_template.shape
+            # 精匹配：映射回全分辨率，在候选点附近的 ROI 内重新匹配
+            factor = 2 ** level
+            pad = self.pyramid_refine_padding
+            for cx, cy in zip(xs.tolist(), ys.tolist()):
+                x0 = max(0, cx * factor - pad)
+                y0 = max(0, cy * factor - pad)
+                x1 = min(image_w, cx * factor + w + pad)
+                y1 = min(image_h, cy * factor + h + pad)
+                if x1 - x0 < w or y1 - y0 < h:
+                    continue
                 
-                match = EquipmentMatch(
+                roi_result = self._match_template(gray_image[y0:y1, x0:x1], scaled_template, 'roi')
+                _, max_val, _, max_loc = cv2.minMaxLoc(roi_result)
+                if max_val < self.match_threshold:
+                    continue
+                
+                results.append(EquipmentMatch(
                     equipment_name=template_name,
-                    confidence=confidence,
-                    position=(pt[0], pt[1], w, h),
+                    confidence=float(max_val),
+                    position=(x0 + max_loc[0], y0 + max_loc[1], w, h),
                     template_scale=scale,
                     timestamp=time.time()
-                )
-                results.append(match)
+                ))
         
         return results
     
@@ -167,9 +567,23 @@ class TemplateEquipmentDetector:
         all_matches = []
         
         try:
-            for template_name, template_data in self.templates.items():
-                matches = self.match_template_multiscale(image, template_name, template_data)
-                all_matches.extend(matches)
+            # 灰度转换（及预标准化）和截屏金字塔每帧只做一次，所有模板共用
+            screen_pyramid = self._prepare_screen(image)
+            
+            templates = list(self.templates.items())
+            if self.match_workers > 1 and len(templates) > 1:
+                # 截屏金字塔只读共享；匹配结果缓冲区按线程区分，各工作线程互不干扰
+                executor = self._get_match_executor()
+                futures = [executor.submit(self.match_template_multiscale, image,
+                                           template_name, template_data, screen_pyramid)
+                           for template_name, template_data in templates]
+                for future in futures:
+                    all_matches.extend(future.result())
+            else:
+                for template_name, template_data in templates:
+                    matches = self.match_template_multiscale(image, template_name, template_data,
+                                                             screen_pyramid)
+                    all_matches.extend(matches)
             
             # 去除重叠的匹配结果
             filtered_matches = self._remove_overlapping_matches(all_matches)
@@ -224,7 +638,7 @@ class TemplateEquipmentDetector:
     
     def single_detection(self) -> Tuple[List[EquipmentMatch], float]:
         """单次检测"""
-        image = self.capture_screen_safe()
+        image = self.capture_screen_bgra()
         if image is None:
             return [], 0.0
         
@@ -241,8 +655,9 @@ class TemplateEquipmentDetector:
             return
         
         self.is_running = True
+        self._stopped.clear()
         self.detection_thread = threading.Thread(
-            target=self._detection_loop,
+            target=self._run_detection_loop,
             args=(callback, fps),
             daemon=True
         )
@@ -250,13 +665,238 @@ class TemplateEquipmentDetector:
         print(f"实时模板检测已启动 (FPS: {fps})")
         print(f"正在监控 {len(self.templates)} 种装备")
     
+    def run_pipeline(self, callback=None, fps: int = 10):
+        """以流水线方式启动实时检测
+        
+        截屏、模板匹配、回调分别在三个线程中运行，阶段间用有界队列连接，
+        整体吞吐由最慢的阶段决定，而不是三个阶段耗时之和。
+        截屏直接把 BGRA 原始画面交给匹配线程（匹配只需要灰度图），不做 BGR 转换和拷贝；
+        帧名额在截屏线程和匹配线程之间循环，限制同时在途的帧数。
+        
+        Args:
+            callback: 发现装备时的回调函数，参数为 EquipmentMatch
+            fps: 截屏帧率上限
+        """
+        if not self.templates:
+            print("错误: 没有加载任何模板，请先加载装备图片")
+            return
+        
+        if self.is_running:
+            print("检测已在运行中")
+            return
+        
+        if self.pipeline_latest_only:
+            # 截屏线程、帧队列中、匹配线程各占一个名额
+            frame_queue_size = 1
+            slot_count = max(self.pipeline_buffer_count, 3)
+        else:
+            frame_queue_size = self.pipeline_queue_size
+            slot_count = self.pipeline_buffer_count
+        frame_slots = queue.Queue()
+        for _ in range(slot_count):
+            frame_slots.put(None)
+        frame_queue = queue.Queue(maxsize=frame_queue_size)
+        match_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        
+        self._reset_metrics()
+        self._resume_event.set()
+        self.is_running = True
+        self.pipeline_threads = [
+            threading.Thread(target=self._pipeline_capture_loop,
+                             args=(fps, frame_slots, frame_queue),
+                             daemon=True, name="PipelineCapture"),
+            threading.Thread(target=self._pipeline_match_loop,
+                             args=(frame_slots, frame_queue, match_queue),
+                             daemon=True, name="PipelineMatch"),
+            threading.Thread(target=self._pipeline_alert_loop,
+                             args=(callback, match_queue),
+                             daemon=True, name="PipelineAlert"),
+        ]
+        for thread in self.pipeline_threads:
+            thread.start()
+        print(f"流水线模板检测已启动 (FPS: {fps})")
+        print(f"正在监控 {len(self.templates)} 种装备")
+    
+    def _reset_metrics(self):
+        """重置流水线统计"""
+        with self._metrics_lock:
+            self._metrics = {
+                'captures': 0,  # 截屏帧数
+                'matches': 0,  # 完成匹配的帧数
+                'dropped': 0,  # 截屏时帧队列已满的次数（匹配跟不上，截屏被迫等待）
+                'q_hw': 0,  # 帧队列深度的高水位
+                'cap_ms_ewma': 0.0,  # 截屏耗时的指数滑动平均（毫秒）
+                'match_ms_ewma': 0.0,  # 匹配耗时的指数滑动平均（毫秒）
+            }
+            self._metrics_start_ns = time.perf_counter_ns()
+    
+    def _update_stage_metrics(self, count_key: str, ewma_key: str, elapsed_ms: float):
+        """累加阶段计数并更新耗时 EWMA"""
+        with self._metrics_lock:
+            metrics = self._metrics
+            metrics[ewma_key] = (elapsed_ms if metrics[count_key] == 0
+                                 else 0.9 * metrics[ewma_key] + 0.1 * elapsed_ms)
+            metrics[count_key] += 1
+    
+    def get_metrics(self) -> Dict[str, float]:
+        """获取流水线统计
+        
+        Returns:
+            统计字典的副本，另附 capture_fps / match_fps（自启动以来的平均帧率）
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+            elapsed = (time.perf_counter_ns() - self._metrics_start_ns) / 1e9
+        metrics['capture_fps'] = metrics['captures'] / elapsed if elapsed > 0 else 0.0
+        metrics['match_fps'] = metrics['matches'] / elapsed if elapsed > 0 else 0.0
+        return metrics
+    
+    def print_metrics(self):
+        """打印流水线统计"""
+        m = self.get_metrics()
+        print(f"[PIPELINE] 截屏 {m['capture_fps']:.1f}fps ({m['cap_ms_ewma']:.2f}ms) | "
+              f"匹配 {m['match_fps']:.1f}fps ({m['match_ms_ewma']:.2f}ms) | "
+              f"队列高水位 {m['q_hw']}/{self.pipeline_queue_size} | 队列满 {m['dropped']}次")
+    
+    def _pipeline_put(self, target_queue: queue.Queue, item) -> bool:
+        """向流水线队列放入数据，队列满时阻塞等待，检测停止时放弃"""
+        while self.is_running:
+            try:
+                target_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _pipeline_capture_loop(self, fps, frame_slots: queue.Queue, frame_queue: queue.Queue):
+        """流水线阶段1: 截屏（BGRA 零拷贝视图，mss 每次截屏都返回新的内存，不会被下一帧覆盖）"""
+        frame_time = 1.0 / fps
+        
+        while self.is_running:
+            loop_start = time.time()
+            try:
+                frame_slots.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            start_ns = time.perf_counter_ns()
+            frame = self.capture_screen_bgra()
+            if frame is None:
+                frame_slots.put(None)
+                time.sleep(0.5)  # 截屏失败后稍微等待长一些
+                continue
+            self._update_stage_metrics('captures', 'cap_ms_ewma',
+                                       (time.perf_counter_ns() - start_ns) / 1e6)
+            
+            item = (frame, time.time())
+            try:
+                frame_queue.put_nowait(item)
+            except queue.Full:
+                # 匹配跟不上截屏（或检测已暂停）：记一次
+                with self._metrics_lock:
+                    self._metrics['dropped'] += 1
+                if self.pipeline_latest_only:
+                    # 丢弃队列中的旧帧（名额交还），放入最新帧；只有本线程放入，取出后必有空位
+                    try:
+                        frame_queue.get_nowait()
+                        frame_slots.put(None)
+                    except queue.Empty:
+                        pass
+                    frame_queue.put_nowait(item)
+                elif not self._pipeline_put(frame_queue, item):
+                    # 照常阻塞等待（背压）
+                    break
+            depth = frame_queue.qsize()
+            with self._metrics_lock:
+                if depth > self._metrics['q_hw']:
+                    self._metrics['q_hw'] = depth
+            
+            sleep_time = frame_time - (time.time() - loop_start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+    
+    def _pipeline_match_loop(self, frame_slots: queue.Queue, frame_queue: queue.Queue,
+                             match_queue: queue.Queue):
+        """流水线阶段2: 模板匹配"""
+        while self.is_running:
+            # 暂停期间阻塞在这里，不占用CPU
+            if not self._resume_event.wait(timeout=0.5):
+                continue
+            try:
+                frame, capture_time = frame_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            matches, detection_time = self.detect_equipment_templates(frame)
+            self._update_stage_metrics('matches', 'match_ms_ewma', detection_time)
+            # 匹配结束后交还名额，截屏线程即可截取下一帧
+            frame_slots.put(None)
+            
+            if matches and not self._pipeline_put(match_queue, (matches, capture_time, detection_time)):
+                break
+    
+    def _pipeline_alert_loop(self, callback, match_queue: queue.Queue):
+        """流水线阶段3: 结果分发与回调，并定期输出流水线统计"""
+        last_report = time.time()
+        while self.is_running:
+            if self.metrics_report_interval > 0 and time.time() - last_report >= self.metrics_report_interval:
+                self.print_metrics()
+                last_report = time.time()
+            
+            try:
+                matches, capture_time, detection_time = match_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            latency = (time.time() - capture_time) * 1000
+            print(f"\n🎯 [装备发现] 发现{len(matches)}个装备! 匹配耗时: {detection_time:.2f}ms 端到端延迟: {latency:.2f}ms")
+            for match in matches:
+                if capture_time < self._resume_time:
+                    break  # 画面截取于上次暂停之前（回调期间），结果已过时
+                self.result_queue.put(match)
+                if callback:
+                    try:
+                        callback(match)
+                    except Exception as callback_error:
+                        print(f"[DETECTOR] 回调函数错误: {callback_error}")
+    
+    def request_stop(self):
+        """通知检测线程退出，立即返回不等待；需要确认退出时配合 wait_stopped 使用"""
+        self.is_running = False
+        self._resume_event.set()
+    
     def stop_realtime_detection(self):
         """停止实时检测"""
-        self.is_running = False
-        if self.detection_thread and self.detection_thread.is_alive():
+        self.request_stop()
+        # 可能在回调中（检测线程自身）调用，不能等待当前线程
+        current = threading.current_thread()
+        if self.detection_thread and self.detection_thread.is_alive() and self.detection_thread is not current:
             self.detection_thread.join(timeout=2.0)
+        for thread in self.pipeline_threads:
+            if thread.is_alive() and thread is not current:
+                thread.join(timeout=2.0)
+        self.pipeline_threads = []
         print("实时检测已停止")
     
+    def wait_stopped(self, timeout: Optional[float] = None) -> bool:
+        """等待检测线程完全退出，返回是否已退出（超时返回 False）"""
+        return self._stopped.wait(timeout)
+    
+    def _run_detection_loop(self, callback, fps):
+        """检测线程入口：无论循环如何退出，都会通知 stop_callback"""
+        try:
+            self._detection_loop(callback, fps)
+        finally:
+            # 已被新的检测线程取代时不要改动运行状态
+            if self.detection_thread is threading.current_thread():
+                self.is_running = False
+                self._stopped.set()
+            if self.stop_callback:
+                try:
+                    self.stop_callback()
+                except Exception as callback_error:
+                    print(f"[DETECTOR] 停止回调错误: {callback_error}")
+    
     def _detection_loop(self, callback, fps):
         """检测循环 - 增强版，具有自动重启机制"""
         frame_time = 1.0 / fps
@@ -294,7 +934,7 @@ class TemplateEquipmentDetector:
                     
                     for match in matches:
                         try:
-                            print(f"📦 [装备拾取] 发现装备: {match.template_name} 位置: ({match.x}, {match.y}) 置信度: {match.confidence:.2f}")
+                            print(f"📦 [装备拾取] 发现装备: {match.equipment_name} 位置: {match.position[:2]} 置信度: {match.confidence:.2f}")
                             self.result_queue.put(match)
                             if callback:
                                 callback(match)
@@ -302,10 +942,10 @@ class TemplateEquipmentDetector:
                             print(f"[DETECTOR] 回调函数错误: {callback_error}")
                             # 回调错误不影响检测继续
                             
-                    # 检查回调后状态，防止被意外停止
+                    # 回调期间收到停止请求（stop_realtime_detection / request_stop）时正常退出
                     if not self.is_running:
-                        print(f"[DETECTOR] 警告: 回调后 is_running 被设置为 False，强制恢复为 True")
-                        self.is_running = True
+                        print(f"[DETECTOR] 回调期间收到停止请求，退出检测循环")
+                        break
                 
                 # 控制帧率
                 elapsed = time.time() - loop_start
@@ -316,7 +956,6 @@ class TemplateEquipmentDetector:
             except Exception as e:
                 consecutive_errors += 1
                 print(f"[DETECTOR] 检测循环错误 ({consecutive_errors}/{max_consecutive_errors}): {e}")
-                import traceback
                 print(f"[DETECTOR] 错误堆栈: {traceback.format_exc()}")
                 
                 # 如果连续错误太多，尝试重启